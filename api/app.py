@@ -1,23 +1,58 @@
-import pathlib
-import sys
+import asyncio
 import os
-from fastapi import FastAPI, Path, Body, Depends, Query
-from fastapi.responses import JSONResponse
+import uuid
+from fastapi import FastAPI, Path, Body, Depends, Query, Header, Request, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict
-
-# Adds root of repo to path to ensure correct module imports
-root_path = pathlib.Path(__file__).resolve().parents[1]
-sys.path.insert(1, str(root_path.absolute()))
-os.chdir(str(root_path.absolute()))
-
-from api.modules.data_classes import *
-from api.modules.database import *
+from typing import Any, List, Dict, Optional
+
+from api.modules.data_classes import BaseUser, InUser, UpdateUser, BaseTeam, UpdateTeam, UserWithCount, \
+    TeamWithCount, TeamRoster, RosterSyncResult, BulkDelete, MembershipStats, ChangesPage, ImportSummary, JobInfo, \
+    BackupInfo, FaultSettings, TeammatesPage, TeamsPage, UsersPage, init_BaseUser, init_BaseTeam, \
+    init_TeamWithCount, init_ChangeRecord, init_Teammate
+from api.modules.database import DBHandler, DBHandlerException, SQLiteDBHandler, DBHandlerRegistry, \
+    SingleFlightDBHandler, TracingDBHandler, BusyRetryDBHandler, CoordinatedDBHandler, FaultInjectionDBHandler, \
+    SharedCacheDBHandler
+from api.modules.database.config import CONFIG_SINGLE_FLIGHT, CONFIG_BUSY_RETRY, CONFIG_WRITE_COORDINATION, \
+    CONFIG_FAULT_INJECTION, CONFIG_SHARED_CACHE
+from api.modules.config import CONFIG_ADMISSION, CONFIG_ADMIN, CONFIG_JOBS, CONFIG_CAPTURE, CONFIG_LOOP_MONITOR, \
+    CONFIG_PROFILING, CONFIG_TENANTS, CONFIG_RELATIONSHIPS, CONFIG_DEADLINES, CONFIG_STARTUP
+from api.modules.database import sqlite_database_handler
+from api.modules.database.backup import BackupManager
+from api.modules.admission import AdmissionControlMiddleware, AdmissionRejected
+from api.modules.metrics import metrics
+from api.modules.bulk import parse_csv, parse_ndjson, import_records, export_records, write_file_chunks
+from api.modules.database.job_store import SQLiteJobStore
+from api.modules.jobs import JobManager
+from api.modules.tracing import tracer, TracedRoute, TracingMiddleware
+from api.modules.capture import CaptureMiddleware, CaptureWriter
+from api.modules.loop_monitor import LoopLagMonitor
+from api.modules.profiling import ProfilingMiddleware, StackSampler, list_profiles, load_profile
+from api.modules.database.tenant_router import TenantRouter
+from api.modules.database.write_coordinator import WriterUnavailable
+from api.modules.database.shared_record_cache import SharedRecordCache
+from api.modules.tenants import TenantMiddleware
+from api.modules.deadlines import DeadlineMiddleware, DeadlineExceeded
+from api.modules.startup import use_prebuilt_openapi
 
 
 # API config----------------------------------------------------------
 
 app = FastAPI()
+# Split sampled requests in validation, endpoint and serialization spans. Must be set before declaring routes
+app.router.route_class = TracedRoute
+
+# Workers started in startup-optimized mode serve the OpenAPI document generated at build time
+if CONFIG_STARTUP["optimized"]:
+    use_prebuilt_openapi(app, CONFIG_STARTUP["openapi_file"])
+
+# Give every request the deadline of its endpoint, cancelled when the client disconnects. Innermost, so routes are
+# matched without the tenant path prefix
+app.add_middleware(DeadlineMiddleware, config=CONFIG_DEADLINES, router=app.router)
+
+# Find the tenant of every request and strip the tenant path prefix. Inside the other middlewares, so the prefix is
+# still seen by traces and traffic captures
+app.add_middleware(TenantMiddleware, config=CONFIG_TENANTS)
 
 # Enable cross-origin requests from any domain for potential dev needs
 app.add_middleware(
@@ -27,12 +62,226 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile single requests on demand for admins, inside admission control so queueing time isn't profiled
+app.add_middleware(ProfilingMiddleware, config=CONFIG_PROFILING, admin_config=CONFIG_ADMIN)
+
+# Bound the amount of concurrent reads and writes, shedding load with 503 responses when the DB can't keep up
+app.add_middleware(AdmissionControlMiddleware, config=CONFIG_ADMISSION, tenant_path_prefix=CONFIG_TENANTS["path_prefix"])
+
+# Open a trace for sampled requests, outermost so time spent queued by admission control is included
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Record incoming traffic for load tests when enabled, see api/modules/replay.py for playing it back
+app.state.capture_writer = CaptureWriter(CONFIG_CAPTURE["file"], CONFIG_CAPTURE["flush_interval"])
+app.add_middleware(CaptureMiddleware, config=CONFIG_CAPTURE, router=app.router, writer=app.state.capture_writer)
+
+
+# Records of the main DB file cached in a file mapped by every worker process, None when disabled
+app.state.shared_cache = SharedRecordCache(CONFIG_SHARED_CACHE) if CONFIG_SHARED_CACHE["enabled"] else None
+
+
+# Available database backends. Each one is built once and kept in the app state for the whole life of the app
+def build_sqlite_backend(db_handler: DBHandler = None):
+    # Worker processes of the main DB file elect a single writer and share a record cache, tenant files are written
+    # by every process
+    main_db = db_handler is None
+    db_handler = BusyRetryDBHandler(db_handler or SQLiteDBHandler(), CONFIG_BUSY_RETRY)
+    if main_db and CONFIG_WRITE_COORDINATION["enabled"]:
+        db_handler = CoordinatedDBHandler(db_handler, CONFIG_WRITE_COORDINATION)
+    if CONFIG_SINGLE_FLIGHT["enabled"]:
+        db_handler = SingleFlightDBHandler(db_handler)
+    if main_db and app.state.shared_cache is not None:
+        db_handler = SharedCacheDBHandler(db_handler, app.state.shared_cache)
+    if tracer.exporter is not None:
+        db_handler = TracingDBHandler(db_handler, tracer)
+    return db_handler
+
+
+def build_fault_injection_backend():
+    # Slow or failing storage on top of the sqlite backend, for capacity tests. Inert until faults are configured
+    return FaultInjectionDBHandler(app.state.db_registry.get("sqlite"),
+                                   {method: FaultSettings(**settings)
+                                    for method, settings in CONFIG_FAULT_INJECTION["methods"].items()})
+
+
+database_backends = {"sqlite": build_sqlite_backend}
+if CONFIG_FAULT_INJECTION["enabled"]:
+    database_backends["faults"] = build_fault_injection_backend
+app.state.db_registry = DBHandlerRegistry(database_backends)
+
+# Tenant databases, opened on demand. Requests with a tenant use the backend named TENANT_BACKEND_PREFIX + tenant id
+TENANT_BACKEND_PREFIX = "tenant:"
+app.state.tenant_router = TenantRouter(CONFIG_TENANTS, lambda db_file: build_sqlite_backend(
+    SQLiteDBHandler(db_file=db_file, pool_max_size=CONFIG_TENANTS["max_connections"])))
+
+
+def get_backend(db_choice: str) -> Optional[DBHandler]:
+    """
+    :return: The DBHandler of a registered backend or of a tenant, None if there is no backend with that name
+    """
+    if db_choice.startswith(TENANT_BACKEND_PREFIX):
+        try:
+            return app.state.tenant_router.get(db_choice[len(TENANT_BACKEND_PREFIX):])
+        except ValueError:
+            return None
+    return app.state.db_registry.get(db_choice)
+
+
+# Online backups of the SQLite DB file, optionally taken on a schedule
+app.state.backup_manager = BackupManager(sqlite_database_handler.connection_config)
+
+# Background jobs for long-running operations, stored in the SQLite DB file and resumed on startup
+app.state.job_manager = JobManager(SQLiteJobStore(sqlite_database_handler.connection_config),
+                                   get_backend,
+                                   CONFIG_JOBS["max_concurrency"], CONFIG_JOBS["chunk_pause"])
+
+# Event loop lag metrics and stacks of the callbacks that block the loop
+app.state.loop_monitor = LoopLagMonitor(CONFIG_LOOP_MONITOR)
+
+# Continuous low-rate sampling of the event loop stack, written as flame graph input
+app.state.stack_sampler = StackSampler(CONFIG_PROFILING)
+
+
+@app.on_event("startup")
+async def start_database_backends():
+    app.state.loop_monitor.start()
+    if CONFIG_PROFILING["sampler_enabled"]:
+        app.state.stack_sampler.start()
+    await app.state.db_registry.startup()
+    await app.state.tenant_router.startup()
+    app.state.backup_manager.start_schedule()
+    await app.state.job_manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_database_backends():
+    await app.state.job_manager.stop()
+    await app.state.backup_manager.stop()
+    await app.state.db_registry.shutdown()
+    await app.state.tenant_router.shutdown()
+    await app.state.loop_monitor.stop()
+    await asyncio.get_running_loop().run_in_executor(None, app.state.stack_sampler.stop)
+    if tracer.exporter is not None:
+        await tracer.exporter.close()
+    await app.state.capture_writer.close()
+
+
+# Name of the backend of a request: the database of its tenant if it has one, otherwise the chosen backend
+async def backend_choice(request: Request,
+                         db_choice: Optional[str] = Query("sqlite", description="Dependency for resolving the type of DB to use")):
+    tenant_id = request.scope.get("tenant")
+    if tenant_id is not None:
+        if db_choice != "sqlite":
+            raise HTTPException(status_code=400, detail="Requests of tenants can only use the sqlite backend")
+        return f"{TENANT_BACKEND_PREFIX}{tenant_id}"
+    return db_choice
+
 
 # Enable decoupling of database implementation via FastAPI Dependency that returns objects of supertype DBHandler
-async def database_dependency(db_choice: Optional[str] = Query("sqlite", description="Dependency for resolving the type of DB to use")):
-    if db_choice == "sqlite":
-        return SQLiteDBHandler()
-    return None
+async def database_dependency(db_choice: str = Depends(backend_choice)):
+    db_handler = get_backend(db_choice)
+    if db_handler is None:
+        raise HTTPException(status_code=400, detail=f"Unknown database backend '{db_choice}'")
+    return db_handler
+
+
+# Tenants at their concurrency cap shed load like admission control does
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, e: AdmissionRejected):
+    return JSONResponse(status_code=503, content={"detail": f"Tenant overloaded ({e.reason}), retry later"},
+                        headers={"retry-after": str(e.retry_after)})
+
+
+# Writes that can't reach the elected writer process are retried by the client once a writer takes over
+@app.exception_handler(WriterUnavailable)
+async def writer_unavailable_handler(request: Request, e: WriterUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"retry-after": "1"})
+
+
+# DB calls of requests past their deadline, or whose client is gone, are interrupted
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, e: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": f"Request cancelled before completion ({e.reason})"})
+
+
+# Guard for administrative endpoints, which are disabled unless an admin token is configured
+async def admin_dependency(x_admin_token: Optional[str] = Header(None, description="Token for administrative endpoints")):
+    if CONFIG_ADMIN["token"] is None or x_admin_token != CONFIG_ADMIN["token"]:
+        raise HTTPException(status_code=403, detail="Administrative endpoints require a valid X-Admin-Token header")
+
+
+# Helper for answering requests that run as background jobs
+async def submit_job(kind: str, parameters: dict, db_choice: str):
+    job_id = await app.state.job_manager.submit(kind, parameters, db_choice)
+    return JSONResponse(status_code=202, content={"job_id": job_id}, headers={"location": f"/jobs/{job_id}"})
+
+
+# Helpers for attaching the materialized membership counts to responses
+async def with_team_counts(users: List[BaseUser], db_handler: DBHandler):
+    team_counts = await db_handler.select_team_counts(user_ids=[user.id for user in users])
+    return [UserWithCount(**user.dict(), team_count=team_counts.get(user.id, 0)) for user in users]
+
+
+async def with_member_counts(teams: List[BaseTeam], db_handler: DBHandler):
+    member_counts = await db_handler.select_member_counts(team_ids=[team.id for team in teams])
+    return [TeamWithCount(**team.dict(), member_count=member_counts.get(team.id, 0)) for team in teams]
+
+
+# Relationship Query Endpoints definition------------------------------------------------
+# Declared before the CRUD endpoints so /teams/members isn't matched as the team with id "members"
+
+def relationship_limit(description: str):
+    return Query(CONFIG_RELATIONSHIPS["default_limit"], ge=1, le=CONFIG_RELATIONSHIPS["max_limit"], description=description)
+
+
+@app.get("/users/{user_id}/teammates", response_model=TeammatesPage)
+async def read_user_teammates(user_id: str = Path(..., description="ID value of the desired user"),
+                              limit: int = relationship_limit("Maximum amount of teammates to return"),
+                              db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for retrieving the users that share at least one team with a user, with the most shared teams first.
+    A successful call returns a JSON object with the total amount of teammates and the teammates up to the limit
+    """
+    total, records = await db_handler.select_teammates(user_id=user_id, limit=limit)
+
+    return TeammatesPage(total=total, teammates=[init_Teammate(record) for record in records])
+
+
+@app.get("/users/{user_id}/shared-teams/{other_user_id}", response_model=TeamsPage)
+async def read_shared_teams(user_id: str = Path(..., description="ID value of one of the desired users"),
+                            other_user_id: str = Path(..., description="ID value of the other desired user"),
+                            limit: int = relationship_limit("Maximum amount of teams to return"),
+                            db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for retrieving the teams where two users are members. A successful call returns a JSON object with the
+    total amount of shared teams and the teams up to the limit
+    """
+    total, records = await db_handler.select_shared_teams(user_id=user_id, other_user_id=other_user_id, limit=limit)
+
+    return TeamsPage(total=total, teams=[init_BaseTeam(record) for record in records])
+
+
+@app.get("/teams/members", response_model=UsersPage, responses={400: {"description": "Invalid combination of teams"}})
+async def read_team_set_members(union: List[str] = Query([], description="Ids of teams whose members are combined"),
+                                intersect: List[str] = Query([], description="Ids of teams where every returned user must be a member"),
+                                exclude: List[str] = Query([], alias="except", description="Ids of teams where no returned user can be a member"),
+                                limit: int = relationship_limit("Maximum amount of users to return"),
+                                db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for combining the members of several teams with set operations: members of any union team and of
+    every intersect team, except the members of any except team. A successful call returns a JSON object with the
+    total amount of matching users and the users up to the limit
+    """
+    if not union and not intersect:
+        raise HTTPException(status_code=400, detail="At least one union or intersect team is required")
+    if len(union) + len(intersect) + len(exclude) > CONFIG_RELATIONSHIPS["max_set_teams"]:
+        raise HTTPException(status_code=400,
+                            detail=f"Set operations accept at most {CONFIG_RELATIONSHIPS['max_set_teams']} teams")
+
+    total, records = await db_handler.select_team_set_members(union=union, intersect=intersect, exclude=exclude,
+                                                              limit=limit)
+
+    return UsersPage(total=total, users=[init_BaseUser(record) for record in records])
 
 
 # Basic CRUD Endpoints definition------------------------------------------------
@@ -52,24 +301,31 @@ async def create_user(new_user: InUser, db_handler: DBHandler = Depends(database
     return inserted_record
 
 
-@app.get("/users", response_model=List[BaseUser])
-async def read_all_users(db_handler: DBHandler = Depends(database_dependency)):
+@app.get("/users", response_model=List[UserWithCount], response_model_exclude_none=True)
+async def read_all_users(include_counts: bool = Query(False, description="Include the amount of teams of every user"),
+                         db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving all user records from DB. A successful call returns a list of JSON objects with the existing records
     """
     all_user_records = await db_handler.select_users()
     all_user_records = [init_BaseUser(record) for record in all_user_records]
+    if include_counts:
+        all_user_records = await with_team_counts(all_user_records, db_handler)
 
     return all_user_records
 
 
-@app.get("/users/{user_id}", response_model=BaseUser)
-async def read_user(user_id: str = Path(..., description="ID value of the desired user"), db_handler: DBHandler = Depends(database_dependency)):
+@app.get("/users/{user_id}", response_model=UserWithCount, response_model_exclude_none=True)
+async def read_user(user_id: str = Path(..., description="ID value of the desired user"),
+                    include_counts: bool = Query(False, description="Include the amount of teams of the user"),
+                    db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving a single user record from DB. A successful call returns JSON object with the desired record
     """
     user_record = await db_handler.select_user(user_id=user_id)
     user_record = init_BaseUser(user_record)
+    if include_counts:
+        user_record = (await with_team_counts([user_record], db_handler))[0]
 
     return user_record
 
@@ -102,6 +358,25 @@ async def delete_user(user_id: str = Path(..., description="ID value of the desi
     return deleted_record
 
 
+@app.post("/users/bulk-delete", response_model=List[BaseUser], responses={202: {"description": "Background job started"}})
+async def delete_users(bulk_delete: BulkDelete,
+                       background: bool = Query(False, description="Run as a background job, deleting the users in chunks"),
+                       db_choice: str = Depends(backend_choice), db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for deleting many user records in a single transaction. Also cascade deletes all team member records
+    associated with the users. Unknown ids are ignored. A successful call returns a list of JSON objects with the deleted records,
+    or the id of the background job
+    """
+    if background:
+        return await submit_job("delete_records", {"entity": "user", "ids": bulk_delete.ids,
+                                                   "chunk_size": CONFIG_JOBS["chunk_size"]}, db_choice)
+
+    deleted_records = await db_handler.delete_users(user_ids=bulk_delete.ids)
+    deleted_records = [init_BaseUser(record) for record in deleted_records]
+
+    return deleted_records
+
+
 @app.post("/teams", response_model=BaseTeam, responses={400: {"description": "Constraint conflict with the database"}})
 async def create_team(new_team: BaseTeam, db_handler: DBHandler = Depends(database_dependency)):
     """
@@ -116,24 +391,31 @@ async def create_team(new_team: BaseTeam, db_handler: DBHandler = Depends(databa
     return inserted_record
 
 
-@app.get("/teams", response_model=List[BaseTeam])
-async def read_all_teams(db_handler: DBHandler = Depends(database_dependency)):
+@app.get("/teams", response_model=List[TeamWithCount], response_model_exclude_none=True)
+async def read_all_teams(include_counts: bool = Query(False, description="Include the amount of members of every team"),
+                         db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving all team records from DB. A successful call returns a list of JSON objects with the existing records
     """
     all_team_records = await db_handler.select_teams()
     all_team_records = [init_BaseTeam(record) for record in all_team_records]
+    if include_counts:
+        all_team_records = await with_member_counts(all_team_records, db_handler)
 
     return all_team_records
 
 
-@app.get("/teams/{team_id}", response_model=BaseTeam)
-async def read_team(team_id: str = Path(..., description="ID value of the desired team"), db_handler: DBHandler = Depends(database_dependency)):
+@app.get("/teams/{team_id}", response_model=TeamWithCount, response_model_exclude_none=True)
+async def read_team(team_id: str = Path(..., description="ID value of the desired team"),
+                    include_counts: bool = Query(False, description="Include the amount of members of the team"),
+                    db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving a single team record from DB. A successful call returns JSON object with the desired record
     """
     team_record = await db_handler.select_team(team_id=team_id)
     team_record = init_BaseTeam(team_record)
+    if include_counts:
+        team_record = (await with_member_counts([team_record], db_handler))[0]
 
     return team_record
 
@@ -166,28 +448,53 @@ async def delete_team(team_id: str = Path(..., description="ID value of the desi
     return deleted_record
 
 
+@app.post("/teams/bulk-delete", response_model=List[BaseTeam], responses={202: {"description": "Background job started"}})
+async def delete_teams(bulk_delete: BulkDelete,
+                       background: bool = Query(False, description="Run as a background job, deleting the teams in chunks"),
+                       db_choice: str = Depends(backend_choice), db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for deleting many team records in a single transaction. Also cascade deletes all team member records
+    associated with the teams. Unknown ids are ignored. A successful call returns a list of JSON objects with the deleted records,
+    or the id of the background job
+    """
+    if background:
+        return await submit_job("delete_records", {"entity": "team", "ids": bulk_delete.ids,
+                                                   "chunk_size": CONFIG_JOBS["chunk_size"]}, db_choice)
+
+    deleted_records = await db_handler.delete_teams(team_ids=bulk_delete.ids)
+    deleted_records = [init_BaseTeam(record) for record in deleted_records]
+
+    return deleted_records
+
+
 # Team Maintenance Endpoints definition------------------------------------------------
 
-@app.get("/users/{user_id}/teams", response_model=List[BaseTeam])
+@app.get("/users/{user_id}/teams", response_model=List[TeamWithCount], response_model_exclude_none=True)
 async def read_user_teams(user_id: str = Path(..., description="ID value of the desired user"),
+                          include_counts: bool = Query(False, description="Include the amount of members of every team"),
                           db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving all team records associated with a user. A successful call returns a list of JSON objects with the existing records
     """
     all_records = await db_handler.select_user_teams(user_id=user_id)
     all_records = [init_BaseTeam(record) for record in all_records]
+    if include_counts:
+        all_records = await with_member_counts(all_records, db_handler)
 
     return all_records
 
 
-@app.get("/teams/{team_id}/members", response_model=List[BaseUser])
+@app.get("/teams/{team_id}/members", response_model=List[UserWithCount], response_model_exclude_none=True)
 async def read_team_members(team_id: str = Path(..., description="ID value of the desired team"),
+                            include_counts: bool = Query(False, description="Include the amount of teams of every user"),
                             db_handler: DBHandler = Depends(database_dependency)):
     """
     Endpoint for retrieving all user records associated with a team. A successful call returns a list of JSON objects with the existing records
     """
     all_records = await db_handler.select_team_members(team_id=team_id)
     all_records = [init_BaseUser(record) for record in all_records]
+    if include_counts:
+        all_records = await with_team_counts(all_records, db_handler)
 
     return all_records
 
@@ -208,6 +515,21 @@ async def add_team_member(team_id: str = Path(..., description="ID value of the
     return inserted_record
 
 
+@app.put("/teams/{team_id}/members", response_model=RosterSyncResult, responses={400: {"description": "Constraint conflict with the database"}})
+async def sync_team_members(roster: TeamRoster, team_id: str = Path(..., description="ID value of the desired team"),
+                            db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for setting the whole member list of a team. Only the differences with the current members are written,
+    in a single transaction. A successful call returns JSON object with the ids of the added and removed members
+    """
+    try:
+        added, removed = await db_handler.sync_team_members(team_id=team_id, user_ids=roster.user_ids)
+    except DBHandlerException as e:
+        return JSONResponse(status_code=400)
+
+    return RosterSyncResult(added=added, removed=removed)
+
+
 @app.delete("/teams/{team_id}/members/{user_id}", response_model=Dict[str, str])
 async def delete_team_member(team_id: str = Path(..., description="ID value of the desired team"),
                              user_id: str = Path(..., description="ID value of the desired user"),
@@ -221,3 +543,277 @@ async def delete_team_member(team_id: str = Path(..., description="ID value of t
     return deleted_record
 
 
+@app.get("/stats", response_model=MembershipStats)
+async def read_stats(top: int = Query(10, ge=1, le=1000, description="Amount of largest teams to return"),
+                     db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for retrieving membership statistics, served from the materialized membership counts.
+    A successful call returns a JSON object with the largest teams and the distributions of team sizes and teams per user
+    """
+    largest_teams, team_size_distribution, user_team_count_distribution = await db_handler.select_stats(top=top)
+
+    return MembershipStats(largest_teams=[init_TeamWithCount(record) for record in largest_teams],
+                           team_size_distribution=dict(team_size_distribution),
+                           user_team_count_distribution=dict(user_team_count_distribution))
+
+
+# Bulk Import and Export Endpoints definition------------------------------------------------
+
+@app.post("/import", response_model=ImportSummary, responses={202: {"description": "Background job started"},
+                                                                 415: {"description": "Unsupported import format"}})
+async def import_data(request: Request,
+                      format: Optional[str] = Query(None, regex="^(ndjson|csv)$", description="Format of the body, defaults to the one of the Content-Type header"),
+                      batch_size: int = Query(1000, ge=1, le=100000, description="Amount of rows written per transaction"),
+                      background: bool = Query(False, description="Store the body and import it in a background job"),
+                      db_choice: str = Depends(backend_choice), db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for importing users, teams and memberships from a streamed NDJSON or CSV body. Every row has a "type"
+    field ("user", "team" or "membership") and the fields of its record; users take either "password" or "password_hash".
+    The body is parsed incrementally and written in batches. A successful call returns a summary with per-row errors,
+    or the id of the background job, whose result is the summary
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson" if "json" in content_type else None
+    if format is None:
+        return JSONResponse(status_code=415, content={"detail": "Use the format parameter or a CSV/NDJSON Content-Type"})
+
+    if background:
+        os.makedirs(CONFIG_JOBS["spool_directory"], exist_ok=True)
+        path = os.path.join(CONFIG_JOBS["spool_directory"], f"{uuid.uuid4().hex}.{format}")
+        await write_file_chunks(request.stream(), path)
+        return await submit_job("import", {"path": path, "format": format, "batch_size": batch_size}, db_choice)
+
+    parse = parse_csv if format == "csv" else parse_ndjson
+    return await import_records(parse(request.stream()), db_handler, batch_size)
+
+
+@app.get("/export", response_class=StreamingResponse, responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}})
+async def export_data(format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Format of the exported data"),
+                      include_password_hashes: bool = Query(False, description="Include the hashed password of every user, needed for importing them back. Requires an admin token"),
+                      x_admin_token: Optional[str] = Header(None, description="Token for administrative endpoints"),
+                      db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for exporting every user, team and membership, streamed in the same format accepted by the import endpoint.
+    Password hashes are only exported for admins
+    """
+    if include_password_hashes:
+        await admin_dependency(x_admin_token)
+
+    return StreamingResponse(export_records(db_handler, format, include_password_hashes),
+                             media_type="text/csv" if format == "csv" else "application/x-ndjson")
+
+
+# Background Jobs Endpoints definition------------------------------------------------
+
+@app.get("/jobs/{job_id}", response_model=JobInfo, responses={404: {"description": "Job not found"}})
+async def read_job(job_id: str = Path(..., description="ID value of the desired job")):
+    """
+    Endpoint for retrieving the status, progress and result of a background job
+    """
+    job = await app.state.job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": f"Job '{job_id}' not found"})
+
+    return JobInfo(**job)
+
+
+# Change Feed Endpoints definition------------------------------------------------
+
+@app.get("/changes", response_model=ChangesPage)
+async def read_changes(since: int = Query(0, ge=0, description="Sequence number of the last change already processed"),
+                       limit: int = Query(100, ge=1, le=1000, description="Maximum amount of changes to return"),
+                       wait: float = Query(0, ge=0, le=60, description="Seconds to wait for new changes when there are none (long-polling)"),
+                       db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for retrieving the changes made to users, teams and memberships after a given sequence number.
+    A successful call returns a JSON object with the changes and the sequence number to use in the next call
+    """
+    change_records = await db_handler.select_changes(since=since, limit=limit, wait=wait)
+    change_records = [init_ChangeRecord(record) for record in change_records]
+
+    return ChangesPage(changes=change_records,
+                       last_seq=change_records[-1].seq if change_records else since,
+                       resync_required=bool(change_records) and change_records[0].seq > since + 1)
+
+
+@app.get("/changes/stream", response_class=StreamingResponse, responses={200: {"content": {"text/event-stream": {}}}})
+async def stream_changes(since: int = Query(0, ge=0, description="Sequence number of the last change already processed"),
+                         last_event_id: Optional[int] = Header(None, description="Sent by SSE clients when reconnecting, takes precedence over 'since'"),
+                         db_handler: DBHandler = Depends(database_dependency)):
+    """
+    Endpoint for following the change feed as Server-Sent Events. Every event carries one change record and uses its
+    sequence number as event id, so clients resume from the last received change when reconnecting
+    """
+    async def event_stream(last_seq: int):
+        while True:
+            change_records = await db_handler.select_changes(since=last_seq, limit=100, wait=15)
+            if not change_records:
+                yield ": keep-alive\n\n"
+                continue
+
+            for record in change_records:
+                change = init_ChangeRecord(record)
+                last_seq = change.seq
+                yield f"id: {change.seq}\nevent: change\ndata: {change.json()}\n\n"
+
+    return StreamingResponse(event_stream(last_event_id if last_event_id is not None else since),
+                             media_type="text/event-stream")
+
+
+# Monitoring Endpoints definition------------------------------------------------
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Endpoint for retrieving the service metrics in the Prometheus text exposition format
+    """
+    return metrics.render()
+
+
+# Administrative Endpoints definition------------------------------------------------
+
+@app.post("/admin/backups", status_code=202, response_model=Dict[str, str], dependencies=[Depends(admin_dependency)],
+          responses={409: {"description": "A backup is already running"}})
+async def create_backup():
+    """
+    Endpoint for starting an online backup of the SQLite DB file. Pages are copied in small steps without blocking writers,
+    then compressed into a timestamped snapshot. A successful call returns immediately, while the backup runs in the background
+    """
+    if app.state.backup_manager.start_backup() is None:
+        return JSONResponse(status_code=409, content={"detail": "A backup is already running"})
+
+    return {"status": "started"}
+
+
+@app.get("/admin/backups", response_model=List[BackupInfo], dependencies=[Depends(admin_dependency)])
+async def read_backups():
+    """
+    Endpoint for listing the available backup snapshots, from oldest to newest
+    """
+    return [BackupInfo(name=os.path.basename(snapshot), size=os.path.getsize(snapshot))
+            for snapshot in app.state.backup_manager.snapshots()]
+
+
+@app.post("/admin/backups/{snapshot_name}/restore", response_model=BackupInfo, dependencies=[Depends(admin_dependency)],
+          responses={404: {"description": "Snapshot not found"}})
+async def restore_backup(snapshot_name: str = Path(..., description="File name of the snapshot to restore")):
+    """
+    Endpoint for replacing the content of the SQLite DB file with a backup snapshot. A successful call returns the restored snapshot
+    """
+    try:
+        await app.state.backup_manager.restore(snapshot_name)
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"detail": f"Snapshot '{snapshot_name}' not found"})
+    SQLiteDBHandler().reload_caches()
+    if app.state.shared_cache is not None:
+        app.state.shared_cache.invalidate()
+
+    snapshot = os.path.join(app.state.backup_manager.config["directory"], os.path.basename(snapshot_name))
+    return BackupInfo(name=os.path.basename(snapshot), size=os.path.getsize(snapshot))
+
+
+@app.get("/admin/maintenance", response_model=Dict[str, Any], dependencies=[Depends(admin_dependency)])
+async def read_maintenance_status():
+    """
+    Endpoint for retrieving the status of the background maintenance of the SQLite DB file: last run time, duration and
+    details of every operation, and the WAL and freelist sizes seen by the last check
+    """
+    return SQLiteDBHandler().maintenance_status()
+
+
+@app.post("/admin/maintenance", response_model=Dict[str, Any], dependencies=[Depends(admin_dependency)])
+async def run_maintenance(force: bool = Query(False, description="Run even under load and refresh table statistics regardless of their age")):
+    """
+    Endpoint for running the due maintenance operations of the SQLite DB file right away. A successful call returns the
+    maintenance status after the run
+    """
+    return await SQLiteDBHandler().run_maintenance(force=force)
+
+
+# Fault injection settings are only exposed while fault injection is enabled
+async def fault_injection_dependency():
+    if not CONFIG_FAULT_INJECTION["enabled"]:
+        raise HTTPException(status_code=404, detail="Fault injection is disabled")
+    return app.state.db_registry.get("faults")
+
+
+@app.get("/admin/faults", response_model=Dict[str, FaultSettings], dependencies=[Depends(admin_dependency)])
+async def read_faults(fault_handler: FaultInjectionDBHandler = Depends(fault_injection_dependency)):
+    """
+    Endpoint for retrieving the faults injected into the calls of the "faults" backend, indexed by DBHandler method
+    ("*" applies to every method without settings of its own)
+    """
+    return fault_handler.settings
+
+
+@app.put("/admin/faults/{method}", response_model=FaultSettings, dependencies=[Depends(admin_dependency)],
+         responses={404: {"description": "Unknown DBHandler method"}})
+async def update_faults(settings: FaultSettings, method: str = Path(..., description="Name of the DBHandler method, or * for every method"),
+                        fault_handler: FaultInjectionDBHandler = Depends(fault_injection_dependency)):
+    """
+    Endpoint for setting the faults injected into the calls of a DBHandler method. The settings apply to the next calls
+    """
+    try:
+        fault_handler.configure(method, settings)
+    except ValueError as e:
+        return JSONResponse(status_code=404, content={"detail": str(e)})
+
+    return settings
+
+
+@app.delete("/admin/faults", response_model=Dict[str, FaultSettings], dependencies=[Depends(admin_dependency)])
+async def clear_faults(fault_handler: FaultInjectionDBHandler = Depends(fault_injection_dependency)):
+    """
+    Endpoint for removing every injected fault. A successful call returns the removed settings
+    """
+    removed_settings, fault_handler.settings = fault_handler.settings, {}
+
+    return removed_settings
+
+
+@app.get("/admin/loop", response_model=Dict[str, Any], dependencies=[Depends(admin_dependency)])
+async def read_loop_status():
+    """
+    Endpoint for retrieving the event loop lag monitor status: lag of the last heartbeat, amount of times the loop was
+    blocked over the threshold and the stacks of the most recent blocking code
+    """
+    return app.state.loop_monitor.status()
+
+
+@app.get("/admin/profiles", response_model=List[str], dependencies=[Depends(admin_dependency)])
+async def read_profiles():
+    """
+    Endpoint for listing the stored profiles: reports of requests sent with the X-Profile header and folded stacks
+    of the stack sampler. A successful call returns the file names, newest first
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, list_profiles, CONFIG_PROFILING["directory"])
+
+
+@app.get("/admin/profiles/{profile_name}", response_class=PlainTextResponse, dependencies=[Depends(admin_dependency)],
+         responses={404: {"description": "Profile not found"}})
+async def read_profile(profile_name: str = Path(..., description="File name of the desired profile")):
+    """
+    Endpoint for downloading a stored profile as plain text
+    """
+    content = await asyncio.get_running_loop().run_in_executor(None, load_profile, CONFIG_PROFILING["directory"],
+                                                               profile_name)
+    if content is None:
+        return JSONResponse(status_code=404, content={"detail": f"Profile '{profile_name}' not found"})
+
+    return PlainTextResponse(content)
+
+
+@app.post("/admin/profiles/sampler", response_model=Dict[str, Any], dependencies=[Depends(admin_dependency)])
+async def toggle_stack_sampler(enabled: bool = Query(..., description="Start or stop the continuous stack sampler")):
+    """
+    Endpoint for starting or stopping the continuous stack sampler. Stopping it writes the pending samples; a
+    successful call returns whether the sampler is running and the name of the file written, if any
+    """
+    written_file = None
+    if enabled:
+        app.state.stack_sampler.start()
+    else:
+        written_file = await asyncio.get_running_loop().run_in_executor(None, app.state.stack_sampler.stop)
+
+    return {"running": app.state.stack_sampler.running, "file": written_file}
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import math
+import re
+
+from collections import deque
+from typing import Dict
+from .metrics import metrics
+
+queue_depth_gauge = metrics.gauge("admission_queue_depth", "Requests waiting for admission")
+active_gauge = metrics.gauge("admission_active_requests", "Requests currently admitted")
+queue_time_histogram = metrics.histogram("admission_queue_seconds", "Time spent waiting for admission")
+rejected_counter = metrics.counter("admission_rejected_total", "Requests rejected by admission control")
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request can't be admitted, either because the wait queue is full or because
+    it waited longer than the queue deadline
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limiter with a bounded FIFO wait queue and a deadline for the time spent in it.
+    Released slots are handed over directly to the oldest waiter, so they can't be stolen by newcomers.
+    Limiters that share a name with many others (e.g. one per tenant) can skip the active and queue gauges,
+    whose values would overwrite each other
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 track_gauges: bool = True):
+        self.name = name
+        self.track_gauges = track_gauges
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+
+    def _reject(self, reason: str):
+        rejected_counter.inc(endpoint_class=self.name, reason=reason)
+        raise AdmissionRejected(reason, retry_after=max(1, math.ceil(self.queue_timeout)))
+
+    async def acquire(self):
+        """
+        Wait for a free slot
+
+        :raises AdmissionRejected: If the queue is full or the queue deadline passes before a slot is free
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            if self.track_gauges:
+                active_gauge.set(self.active, endpoint_class=self.name)
+            queue_time_histogram.observe(0, endpoint_class=self.name)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        started_at = loop.time()
+        self._waiters.append(waiter)
+        if self.track_gauges:
+            queue_depth_gauge.set(len(self._waiters), endpoint_class=self.name)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            # The slot could have been handed over right before the cancellation arrived
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if self.track_gauges:
+                queue_depth_gauge.set(len(self._waiters), endpoint_class=self.name)
+            queue_time_histogram.observe(loop.time() - started_at, endpoint_class=self.name)
+
+    def release(self):
+        """
+        Free a slot, handing it over to the oldest waiter if there is any
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.active -= 1
+        if self.track_gauges:
+            active_gauge.set(self.active, endpoint_class=self.name)
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that applies admission control to every HTTP request, using a separate
+    limiter for reads (GET/HEAD) and writes (every other method)
+    """
+
+    def __init__(self, app, config: Dict, tenant_path_prefix: str = None):
+        """
+        :param config: Admission configuration, see CONFIG_ADMISSION
+        :param tenant_path_prefix: Path prefix of tenant requests (see TenantMiddleware), which is still part of
+                                   the path here, so exempt paths also match after /{prefix}/{tenant_id}
+        """
+        self.app = app
+        self.enabled = config["enabled"]
+        self.exempt_pattern = None
+        if config["exempt_paths"]:
+            tenant_pattern = f"(?:{re.escape(tenant_path_prefix.rstrip('/'))}/[^/]+)?" if tenant_path_prefix else ""
+            self.exempt_pattern = re.compile(tenant_pattern + "(?:" + "|".join(map(re.escape, config["exempt_paths"])) + ")")
+        self.limiters = {name: AdmissionLimiter(name, **limits) for name, limits in config["classes"].items()}
+
+    def _is_exempt(self, path: str):
+        return self.exempt_pattern is not None and self.exempt_pattern.match(path) is not None
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or self._is_exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters["read" if scope["method"] in ("GET", "HEAD") else "write"]
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", str(e.retry_after).encode())]
+            })
+            await send({"type": "http.response.body",
+                        "body": json.dumps({"detail": f"Service overloaded ({e.reason}), retry later"}).encode()})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+
+# Append-only text files written off the event loop, for logs produced while serving requests------------
+
+
+class BufferedLineWriter:
+    """
+    Appends lines to a file without blocking the event loop. Lines are buffered in memory and a background task
+    writes them through the default executor flush_interval seconds after the first buffered line. Lines written
+    outside of an event loop go to the file right away. The file is opened on the first flush
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        """
+        :param path: File the lines are appended to, its directory is created if needed
+        :param flush_interval: Seconds lines stay in memory before being written
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._buffer_lock = threading.Lock()  # Held by the event loop only while it appends to the buffer
+        self._file_lock = threading.Lock()  # Keeps flushes in order
+        self._file = None
+        self._task = None
+
+    def write(self, lines: str):
+        """
+        :param lines: One or more lines, each one ending with a newline
+        """
+        with self._buffer_lock:
+            self._lines.append(lines)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        # Tasks of loops that are already closed never run, their lines are taken by the next flush
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def flush(self):
+        """
+        Write every buffered line to the file. Blocks on disk I/O, so the event loop runs it through an executor
+        """
+        with self._file_lock:
+            with self._buffer_lock:
+                lines, self._lines = self._lines, []
+            if not lines:
+                return
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write("".join(lines))
+            self._file.flush()
+
+    def _close_file(self):
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    async def close(self):
+        """
+        Write the buffered lines and close the file. Later lines open it again
+        """
+        if self._task is not None and self._task.get_loop() is asyncio.get_running_loop():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self._close_file)
@@ -0,0 +1,273 @@
+import asyncio
+import csv
+import io
+import json
+import os
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from api.modules.data_classes import BaseTeam, ImportUser, ImportRowError, ImportSummary
+from api.modules.database import DBHandler
+
+# Streaming parsers, validation and serializers for bulk import and export------------------------------
+
+CSV_COLUMNS = ["type", "id", "name", "email", "password", "password_hash", "description", "id_team", "id_user"]
+RECORD_TYPES = ("user", "team", "membership")
+MAX_REPORTED_ERRORS = 1000
+
+
+def _decode_line(line: bytes):
+    try:
+        return line.decode("utf-8").rstrip("\r"), None
+    except UnicodeDecodeError as e:
+        return None, f"Invalid UTF-8: {e}"
+
+
+async def iterate_lines(chunks: AsyncIterator[bytes]):
+    """
+    Split a stream of bytes in decoded lines, without holding more than one line in memory
+
+    :param chunks: Async iterator of arbitrary chunks of the stream
+    :return: An async generator of tuples with format (line number, line, decode error). Lines that aren't valid
+             UTF-8 are None and come with their error, so a single bad line doesn't stop the stream
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            line_number += 1
+            yield (line_number, *_decode_line(line))
+
+    if buffer:
+        yield (line_number + 1, *_decode_line(buffer))
+
+
+async def read_file_chunks(path: str, chunk_size: int = 64 * 1024):
+    """
+    Read a file in chunks without blocking the event loop
+
+    :return: An async generator of chunks of bytes
+    """
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as file:
+        while True:
+            chunk = await loop.run_in_executor(None, file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def write_file_chunks(chunks: AsyncIterator[bytes], path: str, buffer_size: int = 64 * 1024):
+    """
+    Write a stream of chunks to a file without blocking the event loop. Small chunks are gathered up to buffer_size
+    bytes, so each write hands a sizeable block to the executor. The file is removed if the stream fails
+    """
+    loop = asyncio.get_running_loop()
+    file = await loop.run_in_executor(None, open, path, "wb")
+    try:
+        buffer = bytearray()
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= buffer_size:
+                await loop.run_in_executor(None, file.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await loop.run_in_executor(None, file.write, bytes(buffer))
+    except BaseException:
+        file.close()
+        os.remove(path)
+        raise
+    await loop.run_in_executor(None, file.close)
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]):
+    """
+    Parse a stream of newline-delimited JSON objects
+
+    :return: An async generator of tuples with format (line number, raw record, parse error)
+    """
+    async for line_number, line, decode_error in iterate_lines(chunks):
+        if decode_error is not None:
+            yield line_number, None, decode_error
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+
+        if isinstance(record, dict):
+            yield line_number, record, None
+        else:
+            yield line_number, None, "Invalid JSON: expected an object"
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]):
+    """
+    Parse a stream of CSV rows whose first line is the header. Empty fields are treated as missing.
+    Quoted fields can't contain line breaks, since rows are parsed one line at a time
+
+    :return: An async generator of tuples with format (line number, raw record, parse error)
+    """
+    header = None
+    async for line_number, line, decode_error in iterate_lines(chunks):
+        if decode_error is not None:
+            yield line_number, None, decode_error
+            continue
+        if not line.strip():
+            continue
+        try:
+            values = next(csv.reader([line]))
+        except csv.Error as e:
+            yield line_number, None, f"Invalid CSV: {e}"
+            continue
+
+        if header is None:
+            header = values
+        elif len(values) != len(header):
+            yield line_number, None, f"Invalid CSV: expected {len(header)} fields, got {len(values)}"
+        else:
+            yield line_number, {key: value for key, value in zip(header, values) if value != ""}, None
+
+
+def validate_record(record: Dict):
+    """
+    Validate a raw import record with the pydantic model of its type
+
+    :param record: Dict with a "type" key and the fields of the record
+    :return: Tuple with format ("type", validated value). Memberships use tuples ("id_team", "id_user")
+    :raises ValueError: If the record is not valid
+    """
+    record_type = record.get("type")
+    fields = {key: value for key, value in record.items() if key != "type"}
+    try:
+        if record_type == "user":
+            return record_type, ImportUser(**fields)
+        if record_type == "team":
+            return record_type, BaseTeam(**fields)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+    if record_type == "membership":
+        if not isinstance(fields.get("id_team"), str) or not isinstance(fields.get("id_user"), str):
+            raise ValueError("id_team and id_user are required strings")
+        return record_type, (fields["id_team"], fields["id_user"])
+
+    raise ValueError(f"type must be one of {', '.join(RECORD_TYPES)}")
+
+
+async def import_records(parsed_rows: AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]],
+                         db_handler: DBHandler, batch_size: int, summary: ImportSummary = None,
+                         on_flush: Callable[[int, ImportSummary], Awaitable] = None):
+    """
+    Validate parsed rows and write them through the DB handler in batches, each batch in a single transaction.
+    Only the current batch and the first reported errors are kept in memory
+
+    :param parsed_rows: Async iterator of tuples with format (line number, raw record, parse error)
+    :param db_handler: Handler that writes the batches
+    :param batch_size: Maximum amount of rows of every batch
+    :param summary: Summary of a previous partial import of the same file, for resuming it
+    :param on_flush: Coroutine function called after every written batch with the last line number that is
+                     fully processed and the summary so far
+    :return: ImportSummary of the whole import
+    """
+    if summary is None:
+        summary = ImportSummary(processed=0, imported={record_type: 0 for record_type in RECORD_TYPES}, failed=0,
+                                errors=[])
+    batch = {record_type: [] for record_type in RECORD_TYPES}
+    batch_lines = {record_type: [] for record_type in RECORD_TYPES}
+
+    def report_error(line_number: int, error: str):
+        summary.failed += 1
+        if len(summary.errors) < MAX_REPORTED_ERRORS:
+            summary.errors.append(ImportRowError(line=line_number, error=error))
+
+    async def flush(line_number: int):
+        batch_errors = await db_handler.import_batch(users=batch["user"], teams=batch["team"],
+                                                     memberships=batch["membership"])
+        for record_type, errors in zip(RECORD_TYPES, batch_errors):
+            for row_line, error in zip(batch_lines[record_type], errors):
+                if error is None:
+                    summary.imported[record_type] += 1
+                else:
+                    report_error(row_line, error)
+            batch[record_type].clear()
+            batch_lines[record_type].clear()
+
+        if on_flush is not None:
+            await on_flush(line_number, summary)
+
+    batch_length = 0
+    line_number = 0
+    async for line_number, record, parse_error in parsed_rows:
+        summary.processed += 1
+        try:
+            if parse_error is not None:
+                raise ValueError(parse_error)
+            record_type, value = validate_record(record)
+        except ValueError as e:
+            report_error(line_number, str(e))
+            continue
+
+        batch[record_type].append(value)
+        batch_lines[record_type].append(line_number)
+        batch_length += 1
+        if batch_length >= batch_size:
+            await flush(line_number)
+            batch_length = 0
+
+    if batch_length:
+        await flush(line_number)
+
+    return summary
+
+
+def _serialize(record: Dict, output_format: str, writer=None, buffer: io.StringIO = None):
+    if output_format == "ndjson":
+        return json.dumps(record) + "\n"
+
+    writer.writerow([record.get(column, "") for column in CSV_COLUMNS])
+    line = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return line
+
+
+async def export_records(db_handler: DBHandler, output_format: str, include_password_hashes: bool,
+                         page_size: int = 1000):
+    """
+    Serialize every user, team and membership, reading them page by page. Users come first, then teams,
+    then memberships, so the output can be imported back as is
+
+    :param db_handler: Handler that reads the pages
+    :param output_format: Either "ndjson" or "csv"
+    :param include_password_hashes: Whether to include the hashed password of every user
+    :param page_size: Amount of records read per query
+    :return: An async generator of serialized lines
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if output_format == "csv":
+        yield ",".join(CSV_COLUMNS) + "\n"
+
+    columns = {"user": ("id", "name", "email", "password_hash"), "team": ("id", "name", "description"),
+               "membership": ("id_team", "id_user")}
+    for record_type in RECORD_TYPES:
+        after = None
+        while True:
+            rows = await db_handler.select_export_page(entity=record_type, after=after, limit=page_size)
+            if not rows:
+                break
+
+            # Membership rows end with the row id of their team, which is only the page cursor and isn't exported
+            for row in rows:
+                record = {"type": record_type, **dict(zip(columns[record_type], row))}
+                if not include_password_hashes:
+                    record.pop("password_hash", None)
+                yield _serialize(record, output_format, writer, buffer)
+            after = rows[-1]
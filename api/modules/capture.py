@@ -0,0 +1,123 @@
+import json
+import time
+
+from typing import Dict
+from starlette.routing import Match
+from api.modules.buffered_writer import BufferedLineWriter
+
+# Capture of incoming traffic, read back by api/modules/replay.py---------------------------------------
+
+SCRUBBED_FIELDS = {"password", "password_hash"}
+SCRUBBED_VALUE = "<scrubbed>"
+
+
+def scrub(value):
+    """
+    Replace the value of every sensitive field of a decoded JSON document, at any depth
+
+    :return: A copy of the document without secrets
+    """
+    if isinstance(value, dict):
+        return {key: SCRUBBED_VALUE if key in SCRUBBED_FIELDS else scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+class CaptureWriter:
+    """
+    Appends capture records to a file as compact JSON lines. Records are buffered in memory and written every
+    flush_interval seconds off the event loop, so captured requests never wait on the file
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self._writer = BufferedLineWriter(path, flush_interval)
+
+    def write(self, record: Dict):
+        self._writer.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    async def close(self):
+        """
+        Write the buffered records and close the file
+        """
+        await self._writer.close()
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware that records every HTTP request when capture is enabled. Requests are matched against
+    the routes of the router, so the log keeps route templates and path parameters apart
+    """
+
+    def __init__(self, app, config: Dict, router, writer: CaptureWriter = None):
+        self.app = app
+        self.enabled = config["enabled"]
+        self.max_body_bytes = config["max_body_bytes"]
+        self.router = router
+        self.writer = writer if writer is not None else CaptureWriter(config["file"], config["flush_interval"])
+
+    def _match_route(self, scope):
+        for route in self.router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return route.path, child_scope.get("path_params", {})
+        return None, {}
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at, started = time.time(), time.perf_counter()
+        body = bytearray()
+        body_size = 0
+        status = None
+
+        async def capturing_receive():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if body_size <= self.max_body_bytes:
+                    body.extend(chunk)
+            return message
+
+        async def capturing_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capturing_receive, capturing_send)
+        finally:
+            self._record(scope, started_at, time.perf_counter() - started, body, body_size, status)
+
+    def _record(self, scope, started_at: float, duration: float, body: bytearray, body_size: int, status: int):
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        json_body = None
+        if body and body_size <= self.max_body_bytes and "json" in content_type and "ndjson" not in content_type:
+            try:
+                json_body = scrub(json.loads(body))
+            except ValueError:
+                pass
+
+        route, path_params = self._match_route(scope)
+        query = [(key.decode("latin-1"), value.decode("latin-1"))
+                 for key, _, value in (pair.partition(b"=") for pair in scope["query_string"].split(b"&") if pair)]
+        self.writer.write({
+            "ts": started_at,
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"] if route is None else None,
+            "path_params": path_params,
+            "query": [[key, SCRUBBED_VALUE if key in SCRUBBED_FIELDS else value] for key, value in query],
+            "content_type": content_type or None,
+            "body": json_body,
+            "body_size": body_size,
+            "status": status,
+            "duration": duration
+        })
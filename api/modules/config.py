@@ -0,0 +1,150 @@
+import os
+import pathlib
+
+# Module for saving configuration of the API service itself
+# Database related configuration lives in api/modules/database/config.py
+
+# Root of the repository. Relative paths of every config are resolved against it, so the service works from any
+# working directory
+ROOT_PATH = pathlib.Path(__file__).resolve().parents[2]
+
+
+def root_path(relative_path: str) -> str:
+    return str(ROOT_PATH / relative_path)
+
+
+# Admission control per endpoint class. Reads are GET/HEAD requests, every other method is a write.
+# Requests over max_concurrency wait in a queue of at most max_queue requests, for up to queue_timeout
+# seconds; otherwise they are rejected with 503 and a Retry-After header.
+# Requests whose path starts with any of exempt_paths, with or without a tenant path prefix, skip admission control
+CONFIG_ADMISSION = {
+    "enabled": True,
+    "classes": {
+        "read": {
+            "max_concurrency": 64,
+            "max_queue": 256,
+            "queue_timeout": 2.0
+        },
+        "write": {
+            "max_concurrency": 8,
+            "max_queue": 128,
+            "queue_timeout": 2.0
+        }
+    },
+    "exempt_paths": ["/metrics", "/docs", "/redoc", "/openapi.json", "/changes"]
+}
+
+# Token required in the X-Admin-Token header by administrative endpoints. Admin endpoints are
+# disabled when no token is configured
+CONFIG_ADMIN = {
+    "token": os.environ.get("API_ADMIN_TOKEN")
+}
+
+# Background jobs for long-running operations. At most max_concurrency jobs run at any given time; every job
+# works in chunks of chunk_size items, sleeping chunk_pause seconds between chunks so interactive requests
+# keep being served. Uploaded files of background imports are stored in spool_directory until the job ends
+CONFIG_JOBS = {
+    "max_concurrency": 2,
+    "chunk_size": 500,
+    "chunk_pause": 0.01,
+    "spool_directory": root_path("database/jobs")
+}
+
+# Request tracing. A trace is recorded for sample_rate of the requests (0 disables tracing); when
+# honor_parent_sampling is set, incoming W3C traceparent headers decide sampling instead. Finished traces
+# are written by the exporter, "jsonl" appends one JSON object per span to file, buffering the spans for up to
+# flush_interval seconds so they are written off the event loop
+CONFIG_TRACING = {
+    "sample_rate": 0.0,
+    "honor_parent_sampling": True,
+    "exporter": "jsonl",
+    "file": root_path("logs/traces.jsonl"),
+    "flush_interval": 1.0
+}
+
+# Opt-in capture of incoming traffic for replaying it in load tests. Every request is appended to file as a
+# JSON line with its route template, parameters, body (passwords scrubbed) and timing. Bodies larger than
+# max_body_bytes or that aren't JSON are only recorded by size. Records are buffered for up to flush_interval
+# seconds so they are written off the event loop
+CONFIG_CAPTURE = {
+    "enabled": False,
+    "file": root_path("logs/capture.jsonl"),
+    "max_body_bytes": 64 * 1024,
+    "flush_interval": 1.0
+}
+
+# Event loop lag monitor. A heartbeat task wakes up every interval seconds and publishes its delay as a metric;
+# when the loop doesn't run the heartbeat for block_threshold seconds, a watchdog thread logs the stack of the
+# blocking code (at most stack_limit frames) and keeps it among the last max_reports reports
+CONFIG_LOOP_MONITOR = {
+    "enabled": True,
+    "interval": 0.1,
+    "block_threshold": 0.25,
+    "stack_limit": 30,
+    "max_reports": 20
+}
+
+# Profiling. Requests with a valid admin token and the header "X-Profile: cpu" or "X-Profile: alloc" are profiled
+# and their report (top_entries functions or lines, allocations traced with alloc_frames frames) is stored in
+# directory. The stack sampler reads the event loop stack every sampler_interval seconds and writes the counts of
+# every stack in folded format every sampler_flush_interval seconds; it can also be toggled through the admin API
+CONFIG_PROFILING = {
+    "directory": root_path("logs/profiles"),
+    "top_entries": 50,
+    "alloc_frames": 10,
+    "sampler_enabled": False,
+    "sampler_interval": 0.05,
+    "sampler_flush_interval": 60
+}
+
+# Database per tenant. Requests select their tenant with the header or a path prefix (path_prefix/{tenant_id}/...)
+# and their DB calls go to directory/{tenant_id}.db. At most max_open_tenants tenant databases are kept open, least
+# recently used first out, and tenants idle for idle_timeout seconds are closed (checked every idle_check_interval).
+# Every tenant gets a pool of max_connections connections and runs at most max_concurrency DB calls at once; further
+# calls wait in a queue of max_queue calls for up to queue_timeout seconds or are rejected with 503
+CONFIG_TENANTS = {
+    "header": "X-Tenant-Id",
+    "path_prefix": "/tenants",
+    "directory": root_path("database/tenants"),
+    "max_open_tenants": 256,
+    "max_connections": 2,
+    "max_concurrency": 4,
+    "max_queue": 64,
+    "queue_timeout": 2.0,
+    "idle_timeout": 600.0,
+    "idle_check_interval": 60.0
+}
+
+# Relationship queries (teammates, shared teams and team set operations). Results are limited to default_limit
+# records unless the request asks for up to max_limit, and set operations accept at most max_set_teams team ids
+CONFIG_RELATIONSHIPS = {
+    "default_limit": 100,
+    "max_limit": 1000,
+    "max_set_teams": 50
+}
+
+# Deadlines of requests, in seconds, for their DB calls. Endpoints are keyed by method and route template, others get
+# default; None disables the deadline, as needed by long-polling, streaming and bulk endpoints. When the deadline
+# expires or the client disconnects, the running SQLite statement is interrupted and the request fails with 504
+CONFIG_DEADLINES = {
+    "enabled": True,
+    "default": 30.0,
+    "endpoints": {
+        "GET /users": 10.0,
+        "GET /teams": 10.0,
+        "GET /changes": None,
+        "GET /changes/stream": None,
+        "GET /export": None,
+        "POST /import": None
+    }
+}
+
+# Startup of worker processes. In optimized mode (API_STARTUP_OPTIMIZED=1), the OpenAPI document is read from
+# openapi_file, generated at build time with python -m api.modules.startup build-openapi, instead of being built from
+# the routes by the first request that needs it. budget_seconds bounds the import of the app plus its first request,
+# as measured by python -m api.modules.startup benchmark
+CONFIG_STARTUP = {
+    "optimized": os.environ.get("API_STARTUP_OPTIMIZED") == "1",
+    "openapi_file": root_path("docs/openapi.json"),
+    "budget_seconds": 2.0
+}
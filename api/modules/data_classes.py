@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Tuple
+import json
+from pydantic import BaseModel, Field, root_validator
+from typing import Optional, Tuple, List, Dict, Any
 
 # Pydantic data classes definition------------------------------------
 
@@ -90,3 +91,274 @@ class UpdateTeam(BaseModel):
                 "description": "Very efficient team"
             }
         }
+
+
+# Data class for change log records returned by the change feed
+class ChangeRecord(BaseModel):
+    seq: int = Field(..., description="Monotonic sequence number of the change")
+    entity: str = Field(..., description="Kind of the changed record, one of 'user', 'team' or 'membership'")
+    entity_id: str = Field(..., description="Id of the changed record, memberships use the format 'id_team:id_user'")
+    operation: str = Field(..., description="One of 'insert', 'update' or 'delete'")
+    data: Optional[Dict[str, Any]] = Field(None, description="Public state of the record after the change, null for deletions")
+    created_at: float = Field(..., description="Unix timestamp of the change")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry a single change log record",
+            "example": {
+                "seq": 42,
+                "entity": "user",
+                "entity_id": "myUserID01",
+                "operation": "update",
+                "data": {"id": "myUserID01", "name": "John Doe", "email": "jd@gmail.com"},
+                "created_at": 1634567890.123
+            }
+        }
+
+
+def init_ChangeRecord(values: Tuple[int, str, str, str, Optional[str], float]):
+    return ChangeRecord(seq=values[0], entity=values[1], entity_id=values[2], operation=values[3],
+                        data=json.loads(values[4]) if values[4] is not None else None, created_at=values[5])
+
+
+# Data class for pages of the change feed
+class ChangesPage(BaseModel):
+    changes: List[ChangeRecord] = Field(..., description="Changes appended after the requested sequence number")
+    last_seq: int = Field(..., description="Sequence number to use as 'since' in the next request")
+    resync_required: bool = Field(..., description="True if older changes were compacted and a full resync is needed")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses of the change feed"
+        }
+
+
+# Data class for User responses that may carry the materialized amount of teams of the user
+class UserWithCount(BaseUser):
+    team_count: Optional[int] = Field(None, description="Amount of teams where the user is a member, only present when requested")
+
+
+# Data class for Team responses that may carry the materialized amount of members of the team
+class TeamWithCount(BaseTeam):
+    member_count: Optional[int] = Field(None, description="Amount of members of the team, only present when requested")
+
+
+def init_TeamWithCount(values: Tuple[str, str, str, int]):
+    return TeamWithCount(id=values[0], name=values[1], description=values[2], member_count=values[3])
+
+
+# Data class for membership statistics responses
+class MembershipStats(BaseModel):
+    largest_teams: List[TeamWithCount] = Field(..., description="Teams with the most members, in descending order")
+    team_size_distribution: Dict[int, int] = Field(..., description="Amount of teams per team size")
+    user_team_count_distribution: Dict[int, int] = Field(..., description="Amount of users per amount of teams they belong to")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry membership statistics",
+            "example": {
+                "largest_teams": [{"id": "myTeamID01", "name": "Legends", "description": "Very efficient team", "member_count": 12}],
+                "team_size_distribution": {"0": 3, "12": 1},
+                "user_team_count_distribution": {"0": 5, "1": 12}
+            }
+        }
+
+
+# Data class for user records of bulk imports. Takes either a plain password or the hash of a previous export
+class ImportUser(BaseUser):
+    password: Optional[str] = Field(None, description="Password string of the user")
+    password_hash: Optional[str] = Field(None, description="Already hashed password, as produced by the export")
+
+    @root_validator(skip_on_failure=True)
+    def check_password(cls, values):
+        if values.get("password") is None and values.get("password_hash") is None:
+            raise ValueError("either password or password_hash is required")
+        return values
+
+
+# Data class for per-row errors of bulk imports
+class ImportRowError(BaseModel):
+    line: int = Field(..., description="Line number of the failed row in the imported file")
+    error: str = Field(..., description="Reason why the row was not imported")
+
+
+# Data class for bulk import responses
+class ImportSummary(BaseModel):
+    processed: int = Field(..., description="Amount of rows read from the imported file")
+    imported: Dict[str, int] = Field(..., description="Amount of imported records per type")
+    failed: int = Field(..., description="Amount of rows that were not imported")
+    errors: List[ImportRowError] = Field(..., description="Per-row errors, truncated to the first ones")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses of bulk imports",
+            "example": {
+                "processed": 3,
+                "imported": {"user": 1, "team": 1, "membership": 0},
+                "failed": 1,
+                "errors": [{"line": 3, "error": "Constraint conflict with the database"}]
+            }
+        }
+
+
+# Data class for requests that delete many users or teams at once
+class BulkDelete(BaseModel):
+    ids: List[str] = Field(..., min_items=1, max_items=10000, description="Ids of the records to delete")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for bulk delete requests",
+            "example": {
+                "ids": ["a0b1c2", "d3e4f5"]
+            }
+        }
+
+
+# Data class for requests that set the whole member list of a team
+class TeamRoster(BaseModel):
+    user_ids: List[str] = Field(..., max_items=10000, description="Ids of every user that must belong to the team")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for team roster sync requests",
+            "example": {
+                "user_ids": ["a0b1c2", "d3e4f5"]
+            }
+        }
+
+
+# Data class for the outcome of a team roster sync
+class RosterSyncResult(BaseModel):
+    added: List[str] = Field(..., description="Ids of the users that were added to the team")
+    removed: List[str] = Field(..., description="Ids of the users that were removed from the team")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses of team roster sync requests",
+            "example": {
+                "added": ["d3e4f5"],
+                "removed": ["g6h7i8"]
+            }
+        }
+
+
+# Data class for users that share teams with another user
+class Teammate(BaseUser):
+    shared_teams: int = Field(..., description="Amount of teams shared with the user of interest")
+
+
+def init_Teammate(values: Tuple[str, str, str, int]):
+    return Teammate(id=values[0], name=values[1], email=values[2], shared_teams=values[3])
+
+
+# Data class for limited lists of teammates
+class TeammatesPage(BaseModel):
+    total: int = Field(..., description="Amount of teammates before applying the limit")
+    teammates: List[Teammate] = Field(..., description="Teammates with the most shared teams first, up to the limit")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry the teammates of a user",
+            "example": {
+                "total": 1,
+                "teammates": [{"id": "myUserID02", "name": "Jane Doe", "email": "jane@gmail.com", "shared_teams": 2}]
+            }
+        }
+
+
+# Data class for limited lists of teams
+class TeamsPage(BaseModel):
+    total: int = Field(..., description="Amount of teams before applying the limit")
+    teams: List[BaseTeam] = Field(..., description="Teams sorted by id, up to the limit")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry a limited list of teams",
+            "example": {
+                "total": 1,
+                "teams": [{"id": "myTeamID01", "name": "Legends", "description": "Very efficient team"}]
+            }
+        }
+
+
+# Data class for limited lists of users
+class UsersPage(BaseModel):
+    total: int = Field(..., description="Amount of users before applying the limit")
+    users: List[BaseUser] = Field(..., description="Users sorted by id, up to the limit")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry a limited list of users",
+            "example": {
+                "total": 1,
+                "users": [{"id": "myUserID01", "name": "John Doe", "email": "jd@gmail.com"}]
+            }
+        }
+
+
+# Data class for the faults injected into the calls of a DBHandler method
+class FaultSettings(BaseModel):
+    latency_distribution: str = Field("none", regex="^(none|fixed|uniform|exponential|lognormal)$",
+                                      description="Distribution of the latency added to every call")
+    latency_ms: float = Field(0, ge=0, description="Fixed latency, upper bound of the uniform distribution, mean of the exponential one or median of the lognormal one, in milliseconds")
+    latency_sigma: float = Field(0.5, ge=0, description="Shape (sigma) of the lognormal distribution")
+    error_rate: float = Field(0, ge=0, le=1, description="Fraction of the calls that fail with a constraint error")
+    stall_rate: float = Field(0, ge=0, le=1, description="Fraction of the calls that stall before running")
+    stall_seconds: float = Field(0, ge=0, description="Duration of the stalls in seconds")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for the fault injection settings of a database method",
+            "example": {
+                "latency_distribution": "lognormal",
+                "latency_ms": 50,
+                "latency_sigma": 0.5,
+                "error_rate": 0.01,
+                "stall_rate": 0.001,
+                "stall_seconds": 5
+            }
+        }
+
+
+# Data class for snapshots of online backups
+class BackupInfo(BaseModel):
+    name: str = Field(..., description="File name of the snapshot")
+    size: int = Field(..., description="Size of the compressed snapshot in bytes")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry information of a backup snapshot",
+            "example": {
+                "name": "MainDB-20211019T120000000000Z.db.gz",
+                "size": 10240
+            }
+        }
+
+
+# Data class for the status of background jobs
+class JobInfo(BaseModel):
+    id: str = Field(..., description="Id of the job")
+    kind: str = Field(..., description="Kind of operation run by the job")
+    status: str = Field(..., description="One of 'queued', 'running', 'succeeded' or 'failed'")
+    progress_done: int = Field(..., description="Amount of items already processed")
+    progress_total: Optional[int] = Field(None, description="Total amount of items to process, if known")
+    result: Optional[Dict[str, Any]] = Field(None, description="Result of the job once it succeeded")
+    error: Optional[str] = Field(None, description="Reason why the job failed")
+    created_at: float = Field(..., description="Unix timestamp of the submission of the job")
+    updated_at: float = Field(..., description="Unix timestamp of the last status or progress change")
+
+    class Config:
+        schema_extra = {
+            "description": "Data model used for responses that carry the status of a background job",
+            "example": {
+                "id": "5f0c6ac2a1b54d0f9c1f6b1b3c9d2e7a",
+                "kind": "delete_records",
+                "status": "running",
+                "progress_done": 500,
+                "progress_total": 2000,
+                "result": None,
+                "error": None,
+                "created_at": 1634644800.0,
+                "updated_at": 1634644801.5
+            }
+        }
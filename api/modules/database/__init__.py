@@ -1,8 +1,24 @@
 from .database_handler import DBHandler, DBHandlerException
 from .sqlite_database_handler import SQLiteDBHandler
+from .registry import DBHandlerRegistry
+from .wrapper_database_handler import DBHandlerWrapper
+from .single_flight_database_handler import SingleFlightDBHandler
+from .tracing_database_handler import TracingDBHandler
+from .busy_retry_database_handler import BusyRetryDBHandler
+from .write_coordinator import CoordinatedDBHandler
+from .fault_injection_database_handler import FaultInjectionDBHandler
+from .shared_cache_database_handler import SharedCacheDBHandler
 
 __all__ = [
     "DBHandler",
     "DBHandlerException",
-    "SQLiteDBHandler"
+    "SQLiteDBHandler",
+    "DBHandlerRegistry",
+    "DBHandlerWrapper",
+    "SingleFlightDBHandler",
+    "TracingDBHandler",
+    "BusyRetryDBHandler",
+    "CoordinatedDBHandler",
+    "FaultInjectionDBHandler",
+    "SharedCacheDBHandler"
 ]
\ No newline at end of file
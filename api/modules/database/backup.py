@@ -0,0 +1,259 @@
+import asyncio
+import datetime
+import gzip
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from typing import List, Optional
+from api.modules.metrics import metrics
+from .config import CONFIG_BACKUP, CONFIG_SQLITE
+
+# Online backups built on the incremental backup API of SQLite--------------------------------------
+
+SNAPSHOT_SUFFIX = ".db.gz"
+
+backup_restarts_counter = metrics.counter("backup_restarts_total",
+                                          "Incremental backups restarted by writes of other connections")
+backup_single_pass_counter = metrics.counter("backup_single_pass_total",
+                                             "Backups finished in a single step after too many restarts")
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy_database(source: sqlite3.Connection, target: sqlite3.Connection, pages_per_step: int, step_sleep: float,
+                   max_restarts: int):
+    """
+    Copy a DB in steps of pages_per_step pages, sleeping step_sleep seconds after every step so other connections
+    get the DB in between. SQLite starts the copy over when another connection writes to the source between steps,
+    so under constant writes it may never finish: after max_restarts restarts the whole DB is copied again in a
+    single step, which holds a read transaction on the source until it is done
+    """
+    restarts = 0
+    copied_pages = 0
+
+    def progress(status, remaining, total):
+        nonlocal restarts, copied_pages
+        if status != sqlite3.SQLITE_OK:
+            return  # Nothing was copied, the backup API retries the step after sleeping
+        # Successful steps copy pages, so fewer copied pages than after the previous step mean the copy started over
+        if total - remaining <= copied_pages:
+            restarts += 1
+            backup_restarts_counter.inc()
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        copied_pages = total - remaining
+        if remaining:
+            time.sleep(step_sleep)  # The backup API itself only sleeps after busy steps
+
+    try:
+        source.backup(target, pages=pages_per_step, progress=progress, sleep=step_sleep)
+    except _TooManyRestarts:
+        backup_single_pass_counter.inc()
+        source.backup(target, pages=-1, sleep=step_sleep)
+
+
+def _snapshot_prefix(db_file: str):
+    return pathlib.Path(db_file).stem + "-"
+
+
+def create_snapshot(db_file: str, directory: str, pages_per_step: int, step_sleep: float,
+                    max_restarts: int = CONFIG_BACKUP["max_restarts"]):
+    """
+    Copy a live DB file to a compressed, timestamped snapshot. Pages are copied in small steps, so other
+    connections keep reading and writing between steps
+
+    :param db_file: Path of the DB file to back up
+    :param directory: Directory where snapshots are written
+    :param pages_per_step: Amount of pages copied per step
+    :param step_sleep: Seconds to sleep between steps
+    :param max_restarts: Restarts caused by writes of other connections before copying the whole DB in a single step
+    :return: Path of the new snapshot
+    """
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    snapshot_path = pathlib.Path(directory) / f"{_snapshot_prefix(db_file)}{timestamp}{SNAPSHOT_SUFFIX}"
+
+    with tempfile.TemporaryDirectory(dir=directory) as temp_directory:
+        temp_copy = os.path.join(temp_directory, "snapshot.db")
+        source = sqlite3.connect(db_file)
+        target = sqlite3.connect(temp_copy)
+        try:
+            _copy_database(source, target, pages_per_step, step_sleep, max_restarts)
+        finally:
+            target.close()
+            source.close()
+
+        # Written under a temporary name first, so a crash never leaves a truncated snapshot behind
+        with open(temp_copy, "rb") as copy_file, gzip.open(snapshot_path.with_suffix(".tmp"), "wb") as snapshot_file:
+            shutil.copyfileobj(copy_file, snapshot_file, length=1024 * 1024)
+        os.replace(snapshot_path.with_suffix(".tmp"), snapshot_path)
+
+    return str(snapshot_path)
+
+
+def list_snapshots(db_file: str, directory: str) -> List[str]:
+    """
+    :return: Paths of the snapshots of a DB file, from oldest to newest
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(str(path) for path in pathlib.Path(directory).glob(f"{_snapshot_prefix(db_file)}*{SNAPSHOT_SUFFIX}"))
+
+
+def apply_retention(db_file: str, directory: str, retention: int):
+    """
+    Delete the oldest snapshots of a DB file, keeping only the newest ones
+
+    :return: Paths of the deleted snapshots
+    """
+    snapshots = list_snapshots(db_file, directory)
+    expired = snapshots[:max(len(snapshots) - retention, 0)]
+    for snapshot in expired:
+        os.remove(snapshot)
+    return expired
+
+
+def restore_snapshot(snapshot: str, db_file: str, pages_per_step: int = -1):
+    """
+    Replace the content of a DB file with a snapshot. The copy goes through the backup API as well, so it is
+    safe while other connections are open; they see the restored content on their next transaction.
+    Change log sequence numbers keep growing from where they were before the restore, and a restore marker
+    is appended to the change log so downstream mirrors know they must resync
+
+    :param snapshot: Path of the compressed snapshot
+    :param db_file: Path of the DB file to overwrite
+    :param pages_per_step: Amount of pages copied per step, -1 copies everything in a single step
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_file))) as temp_directory:
+        temp_copy = os.path.join(temp_directory, "restore.db")
+        with gzip.open(snapshot, "rb") as snapshot_file, open(temp_copy, "wb") as copy_file:
+            shutil.copyfileobj(snapshot_file, copy_file, length=1024 * 1024)
+
+        target = sqlite3.connect(db_file)
+        source = sqlite3.connect(temp_copy)
+        try:
+            last_seq = _last_change_seq(target)
+            source.backup(target, pages=pages_per_step)
+            if last_seq is not None and _last_change_seq(target) is not None:
+                with target:
+                    target.execute("UPDATE sqlite_sequence SET seq = MAX(seq, :seq) WHERE name = 'changes'",
+                                   {"seq": last_seq})
+                    target.execute(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                    "VALUES ('database', :snapshot, 'restore', NULL, :created_at)"),
+                                   {"snapshot": os.path.basename(snapshot), "created_at": time.time()})
+        finally:
+            source.close()
+            target.close()
+
+
+def _last_change_seq(db: sqlite3.Connection) -> Optional[int]:
+    try:
+        row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else 0
+
+
+class BackupManager:
+    """
+    Runs backups of a DB file in a worker thread, so the event loop keeps serving requests, and optionally
+    on a schedule. Only one backup runs at any given time
+    """
+
+    def __init__(self, db_file: str, config: dict = CONFIG_BACKUP):
+        self.db_file = db_file
+        self.config = config
+        self.running = None  # Task of the backup in progress, if any
+        self.last_snapshot = None
+        self.last_duration = None
+        self.last_error = None
+        self._schedule_task = None
+
+    async def _run_backup(self):
+        started_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            snapshot = await loop.run_in_executor(None, create_snapshot, self.db_file, self.config["directory"],
+                                                  self.config["pages_per_step"], self.config["step_sleep"],
+                                                  self.config["max_restarts"])
+            await loop.run_in_executor(None, apply_retention, self.db_file, self.config["directory"],
+                                       self.config["retention"])
+            self.last_snapshot, self.last_error = snapshot, None
+            return snapshot
+        except Exception as e:
+            self.last_error = repr(e)
+            raise
+        finally:
+            self.last_duration = time.monotonic() - started_at
+
+    def start_backup(self):
+        """
+        Start a backup in the background
+
+        :return: The task of the new backup, None if a backup is already running
+        """
+        if self.running is not None and not self.running.done():
+            return None
+        self.running = asyncio.ensure_future(self._run_backup())
+        self.running.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self.running
+
+    def snapshots(self):
+        return list_snapshots(self.db_file, self.config["directory"])
+
+    async def restore(self, snapshot_name: str):
+        """
+        Restore the DB file from one of its snapshots
+
+        :param snapshot_name: File name of the snapshot inside the backups directory
+        :raises FileNotFoundError: If there is no snapshot with that name
+        """
+        snapshot = os.path.join(self.config["directory"], os.path.basename(snapshot_name))
+        if snapshot not in self.snapshots():
+            raise FileNotFoundError(snapshot_name)
+        await asyncio.get_running_loop().run_in_executor(None, restore_snapshot, snapshot, self.db_file)
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.config["interval"])
+            task = self.start_backup()
+            if task is not None:
+                await asyncio.wait([task])
+
+    def start_schedule(self):
+        if self.config["interval"] and self._schedule_task is None:
+            self._schedule_task = asyncio.ensure_future(self._schedule())
+
+    async def stop(self):
+        if self._schedule_task is not None:
+            self._schedule_task.cancel()
+            self._schedule_task = None
+        if self.running is not None:
+            await asyncio.wait([self.running])
+
+
+# Command line interface: python -m api.modules.database.backup {create,list,restore} ...
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Online backup and restore of SQLite DB files")
+    parser.add_argument("action", choices=["create", "list", "restore"])
+    parser.add_argument("--db-file", default=CONFIG_SQLITE["production"]["db_file"])
+    parser.add_argument("--directory", default=CONFIG_BACKUP["directory"])
+    parser.add_argument("--snapshot", help="Path of the snapshot to restore")
+    arguments = parser.parse_args()
+
+    if arguments.action == "create":
+        print(create_snapshot(arguments.db_file, arguments.directory, CONFIG_BACKUP["pages_per_step"],
+                              CONFIG_BACKUP["step_sleep"], CONFIG_BACKUP["max_restarts"]))
+        apply_retention(arguments.db_file, arguments.directory, CONFIG_BACKUP["retention"])
+    elif arguments.action == "list":
+        print("\n".join(list_snapshots(arguments.db_file, arguments.directory)))
+    else:
+        restore_snapshot(arguments.snapshot, arguments.db_file)
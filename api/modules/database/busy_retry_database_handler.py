@@ -0,0 +1,62 @@
+import asyncio
+import random
+
+from sqlite3 import OperationalError
+from api.modules.metrics import metrics
+from .database_handler import DBHandler, WRITE_METHODS
+from .wrapper_database_handler import DBHandlerWrapper
+
+busy_retries_counter = metrics.counter("sqlite_busy_retries_total", "Writes retried because the DB file was locked")
+busy_failures_counter = metrics.counter("sqlite_busy_failures_total", "Writes that stayed locked after every retry")
+
+
+def is_busy_error(error: Exception):
+    """
+    :return: True if the error means the DB file or a table was locked by another connection
+    """
+    return isinstance(error, OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+
+class BusyRetryDBHandler(DBHandlerWrapper):
+    """
+    DB handler wrapper that retries writes failing because the DB file is locked. The busy_timeout pragma doesn't
+    cover every case: in WAL mode a transaction that read a snapshot older than the last commit fails to upgrade to
+    a write right away. Failed writes are rolled back when their connection returns to the pool, so the whole call
+    is retried after a random delay (full jitter exponential backoff), which spreads competing writers apart
+    """
+
+    def __init__(self, inner: DBHandler, config: dict):
+        """
+        :param config: Retry configuration, see CONFIG_BUSY_RETRY
+        """
+        super().__init__(inner)
+        self.config = config
+
+    async def _retry(self, name: str, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await getattr(self.inner, name)(*args, **kwargs)
+            except OperationalError as e:
+                attempt += 1
+                if not is_busy_error(e) or attempt >= self.config["max_attempts"]:
+                    if is_busy_error(e):
+                        busy_failures_counter.inc(method=name)
+                    raise
+
+            busy_retries_counter.inc(method=name)
+            await asyncio.sleep(random.uniform(0, min(self.config["max_delay"],
+                                                      self.config["base_delay"] * 2 ** attempt)))
+
+
+def _retried_method(name: str):
+    async def retried_method(self, *args, **kwargs):
+        return await self._retry(name, *args, **kwargs)
+
+    retried_method.__name__ = name
+    return retried_method
+
+
+# Every write of the DBHandler interface is retried the same way, reads are delegated as they are
+for _name in WRITE_METHODS:
+    setattr(BusyRetryDBHandler, _name, _retried_method(_name))
@@ -1,12 +1,173 @@
+from api.modules.config import root_path
 
 # Module for saving connection configuration of possible database handlers
 # Import appropriately inside each database_handler implementation module
 
 CONFIG_SQLITE = {
     "production": {
-        "db_file": "database/MainDB.db"
+        "db_file": root_path("database/MainDB.db")
     },
     "test": {
-        "db_file": "tests/database/TempDB.db"
+        "db_file": root_path("tests/database/TempDB.db")
     }
-}
\ No newline at end of file
+}
+
+# Retention policy of the change log table. Entries older than retention_seconds, or beyond the
+# newest max_entries, are compacted every compaction_interval logged changes.
+# poll_interval bounds how long a long-polling consumer waits before re-checking the table,
+# so changes committed by other processes are also picked up
+CONFIG_CHANGE_LOG = {
+    "retention_seconds": 7 * 24 * 60 * 60,
+    "max_entries": 100000,
+    "compaction_interval": 1000,
+    "poll_interval": 1.0
+}
+
+
+# Connection pool and warm-up settings of the SQLite handler. The pragmas of the tuning profile (see
+# CONFIG_SQLITE_PROFILES), followed by pragmas, are applied to every connection right after it is opened,
+# and min_size connections are opened on app startup
+CONFIG_SQLITE_POOL = {
+    "max_size": 8,
+    "min_size": 2,
+    "drain_timeout": 10.0,
+    "analyze_on_startup": True,
+    "profile": "balanced",
+    "pragmas": {
+        "busy_timeout": 5000
+    }
+}
+
+
+# Named storage tuning profiles of the SQLite connections, selected with CONFIG_SQLITE_POOL["profile"].
+# mmap_size (bytes) maps the file into memory, shared by every connection of the process; cache_size (negative
+# values are KiB) is the private page cache of each connection; page_size only applies to new files or after a
+# VACUUM outside WAL mode. Run python -m api.modules.database.storage_calibration to find the best profile for a
+# given DB file and machine
+CONFIG_SQLITE_PROFILES = {
+    "balanced": {
+        "page_size": 4096,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -8 * 1024,
+        "temp_store": "MEMORY"
+    },
+    "read_heavy": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 1024 * 1024 * 1024,
+        "cache_size": -32 * 1024,
+        "temp_store": "MEMORY"
+    },
+    "write_heavy": {
+        "page_size": 4096,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000
+    },
+    "low_memory": {
+        "page_size": 4096,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 0,
+        "cache_size": -1024,
+        "temp_store": "FILE"
+    }
+}
+
+
+# Coalescing of identical concurrent reads into a single query (see SingleFlightDBHandler)
+CONFIG_SINGLE_FLIGHT = {
+    "enabled": True
+}
+
+
+# Optional in-memory index of team_members (see MembershipIndex). Only valid when a single process
+# writes to the DB file, since writes made by other processes are not seen by the index. Startup fails
+# if it is enabled along with CONFIG_WRITE_COORDINATION
+CONFIG_MEMBERSHIP_INDEX = {
+    "enabled": False
+}
+
+
+# Online backups of the SQLite DB file. Pages are copied in steps of pages_per_step pages, sleeping
+# step_sleep seconds between steps so writers are never blocked for long. Writes of other connections
+# start the copy over; after max_restarts restarts the DB is copied in a single step. Only the newest
+# retention snapshots are kept. interval enables periodic backups (in seconds), None disables them
+CONFIG_BACKUP = {
+    "directory": root_path("database/backups"),
+    "pages_per_step": 1024,
+    "step_sleep": 0.005,
+    "max_restarts": 3,
+    "retention": 7,
+    "interval": None
+}
+
+
+# Background maintenance of the SQLite file (see SQLiteMaintenance). Every check_interval seconds, if at most
+# busy_threshold pooled connections are in use, the maintenance task runs PRAGMA optimize, runs ANALYZE every
+# analyze_interval seconds, truncates the WAL once it grows over wal_checkpoint_bytes and, once free pages exceed
+# freelist_ratio of the file (and freelist_min_pages), gives them back to the filesystem with incremental vacuum
+# in steps of vacuum_step_pages. Files created without incremental auto-vacuum are skipped by the scheduled checks,
+# a forced maintenance (admin endpoint) converts them with a single VACUUM, which blocks every other connection
+CONFIG_SQLITE_MAINTENANCE = {
+    "enabled": True,
+    "check_interval": 300.0,
+    "busy_threshold": 1,
+    "analyze_interval": 6 * 60 * 60,
+    "analysis_limit": 1000,
+    "wal_checkpoint_bytes": 64 * 1024 * 1024,
+    "freelist_ratio": 0.1,
+    "freelist_min_pages": 256,
+    "vacuum_step_pages": 512,
+    "vacuum_step_sleep": 0.01
+}
+
+
+# Retries of writes that find the SQLite file locked by another connection or process. Besides the busy_timeout
+# pragma, locked writes are retried up to max_attempts times, sleeping a random time between 0 and
+# min(max_delay, base_delay * 2 ** attempt) seconds so retrying writers don't wake up in lockstep
+CONFIG_BUSY_RETRY = {
+    "max_attempts": 8,
+    "base_delay": 0.005,
+    "max_delay": 0.5
+}
+
+
+# Single writer for deployments with several worker processes on the same DB file. The worker holding the lock
+# of lock_file is the writer and serves writes on the Unix socket socket_path; other workers forward their writes
+# to it. Every election_interval seconds the other workers try to take the lock, so the role fails over when the
+# writer dies. Forwarded writes wait up to forward_timeout seconds for a writer to be reachable
+CONFIG_WRITE_COORDINATION = {
+    "enabled": False,
+    "lock_file": root_path("database/MainDB.db.writer.lock"),
+    "socket_path": root_path("database/MainDB.db.writer.sock"),
+    "election_interval": 1.0,
+    "forward_timeout": 10.0
+}
+
+
+# Fault injection for capacity tests (see FaultInjectionDBHandler), served as the "faults" backend on top of the
+# sqlite backend. methods maps DBHandler method names ("*" for every other method) to their initial FaultSettings.
+# The "faults" backend is only registered, and its settings only exposed through the admin API, while enabled
+CONFIG_FAULT_INJECTION = {
+    "enabled": False,
+    "methods": {}
+}
+
+
+# Record cache shared by the worker processes of the main DB file (see SharedCacheDBHandler). Results of select_user
+# and select_team are stored in the memory-mapped file file, made of slots slots of slot_size bytes, so its memory
+# doesn't grow with the amount of workers. Every write bumps a generation counter in the file, which invalidates the
+# cached records of every worker at once. Existing files keep the layout they were created with
+CONFIG_SHARED_CACHE = {
+    "enabled": False,
+    "file": root_path("database/MainDB.db.cache"),
+    "slots": 16384,
+    "slot_size": 512
+}
@@ -1,6 +1,12 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
 from api.modules.data_classes import *
 
+# Names of the DBHandler methods that modify the database
+WRITE_METHODS = ("insert_user", "update_user", "delete_user", "delete_users", "insert_team", "update_team",
+                 "delete_team", "delete_teams", "insert_team_member", "sync_team_members", "delete_team_member",
+                 "delete_team_members", "import_batch")
+
 
 class DBHandler(ABC):
     """
@@ -9,6 +15,20 @@ class DBHandler(ABC):
     with a specific database engine.
     """
 
+    async def startup(self):
+        """
+        Called once when the app starts, before serving requests. Implementations can override it
+        for opening and warming up their resources
+        """
+        pass
+
+    async def shutdown(self):
+        """
+        Called once when the app stops. Implementations can override it for draining in-flight work
+        and releasing their resources
+        """
+        pass
+
     @abstractmethod
     async def select_user(self, user_id: str):
         pass
@@ -29,6 +49,10 @@ class DBHandler(ABC):
     async def delete_user(self, user_id: str):
         pass
 
+    @abstractmethod
+    async def delete_users(self, user_ids: List[str]):
+        pass
+
     @abstractmethod
     async def select_team(self, team_id: str):
         pass
@@ -49,6 +73,10 @@ class DBHandler(ABC):
     async def delete_team(self, team_id: str):
         pass
 
+    @abstractmethod
+    async def delete_teams(self, team_ids: List[str]):
+        pass
+
     @abstractmethod
     async def select_user_teams(self, user_id: str):
         pass
@@ -57,14 +85,58 @@ class DBHandler(ABC):
     async def select_team_members(self, team_id: str):
         pass
 
+    @abstractmethod
+    async def select_teammates(self, user_id: str, limit: int):
+        pass
+
+    @abstractmethod
+    async def select_shared_teams(self, user_id: str, other_user_id: str, limit: int):
+        pass
+
+    @abstractmethod
+    async def select_team_set_members(self, union: List[str], intersect: List[str], exclude: List[str], limit: int):
+        pass
+
     @abstractmethod
     async def insert_team_member(self, team_id: str, user_id: str):
         pass
 
+    @abstractmethod
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        pass
+
     @abstractmethod
     async def delete_team_member(self, team_id: str, user_id: str):
         pass
 
+    @abstractmethod
+    async def delete_team_members(self, team_id: str, limit: int):
+        pass
+
+    @abstractmethod
+    async def select_changes(self, since: int, limit: int, wait: float = 0):
+        pass
+
+    @abstractmethod
+    async def select_member_counts(self, team_ids: List[str]):
+        pass
+
+    @abstractmethod
+    async def select_team_counts(self, user_ids: List[str]):
+        pass
+
+    @abstractmethod
+    async def select_stats(self, top: int):
+        pass
+
+    @abstractmethod
+    async def import_batch(self, users: List[ImportUser], teams: List[BaseTeam], memberships: List[Tuple[str, str]]):
+        pass
+
+    @abstractmethod
+    async def select_export_page(self, entity: str, after: Optional[Tuple], limit: int):
+        pass
+
 
 class DBHandlerException(Exception):
     """
@@ -0,0 +1,96 @@
+import asyncio
+import math
+import random
+
+from typing import Dict, Optional
+from api.modules.data_classes import FaultSettings
+from api.modules.metrics import metrics
+from .database_handler import DBHandler, DBHandlerException
+from .wrapper_database_handler import DBHandlerWrapper
+
+# Key of the settings that apply to the methods without settings of their own
+ANY_METHOD = "*"
+
+injected_faults_counter = metrics.counter("fault_injection_faults_total", "Faults injected into DB calls")
+
+
+class FaultInjectionDBHandler(DBHandlerWrapper):
+    """
+    DB handler wrapper for capacity tests that makes storage slow or unreliable on purpose. Before delegating a
+    call, it sleeps for a latency drawn from the distribution configured for the method, stalls a fraction of the
+    calls and fails another fraction with DBHandlerException. Settings can be changed at any time and apply to the
+    next calls. The wrapped handler is shared with another backend, which starts and stops it
+    """
+
+    def __init__(self, inner: DBHandler, settings: Optional[Dict[str, FaultSettings]] = None, seed: int = None):
+        """
+        :param settings: Initial fault settings indexed by method name, ANY_METHOD for every other method
+        :param seed: Seed of the random generator, for reproducible runs
+        """
+        super().__init__(inner)
+        self.settings = dict(settings or {})
+        self._random = random.Random(seed)
+
+    async def startup(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def configure(self, method: str, settings: Optional[FaultSettings]):
+        """
+        Set the faults of a method, or remove them with None
+
+        :raises ValueError: If the method isn't part of the DBHandler interface
+        """
+        if method != ANY_METHOD and method not in DBHandler.__abstractmethods__:
+            raise ValueError(f"Unknown DBHandler method '{method}'")
+        if settings is None:
+            self.settings.pop(method, None)
+        else:
+            self.settings[method] = settings
+
+    def _latency(self, settings: FaultSettings):
+        """
+        :return: Latency of a call in seconds, drawn from the configured distribution
+        """
+        latency_ms = settings.latency_ms
+        if settings.latency_distribution == "none" or latency_ms == 0:
+            return 0
+        if settings.latency_distribution == "uniform":
+            latency_ms = self._random.uniform(0, latency_ms)
+        elif settings.latency_distribution == "exponential":
+            latency_ms = self._random.expovariate(1 / latency_ms)
+        elif settings.latency_distribution == "lognormal":
+            latency_ms = self._random.lognormvariate(math.log(latency_ms), settings.latency_sigma)
+        return latency_ms / 1000
+
+    async def _inject(self, name: str, *args, **kwargs):
+        settings = self.settings.get(name, self.settings.get(ANY_METHOD))
+        if settings is not None:
+            delay = self._latency(settings)
+            if delay:
+                injected_faults_counter.inc(method=name, fault="latency")
+            if settings.stall_rate and self._random.random() < settings.stall_rate:
+                injected_faults_counter.inc(method=name, fault="stall")
+                delay += settings.stall_seconds
+            if delay:
+                await asyncio.sleep(delay)
+            if settings.error_rate and self._random.random() < settings.error_rate:
+                injected_faults_counter.inc(method=name, fault="error")
+                raise DBHandlerException()
+
+        return await getattr(self.inner, name)(*args, **kwargs)
+
+
+def _faulty_method(name: str):
+    async def faulty_method(self, *args, **kwargs):
+        return await self._inject(name, *args, **kwargs)
+
+    faulty_method.__name__ = name
+    return faulty_method
+
+
+# Faults can be injected into every method of the DBHandler interface
+for _name in DBHandler.__abstractmethods__:
+    setattr(FaultInjectionDBHandler, _name, _faulty_method(_name))
@@ -0,0 +1,93 @@
+import json
+import time
+
+from contextlib import asynccontextmanager
+from typing import Optional
+from .schema import JOBS_SCHEMA
+from .sqlite_pool import SQLiteConnectionPool
+from .utils import generate_sql_update_set_formatted_string
+
+JOB_COLUMNS = ("id", "kind", "status", "parameters", "state", "progress_done", "progress_total", "result", "error",
+               "created_at", "updated_at")
+JSON_COLUMNS = ("parameters", "state", "result")
+
+
+class SQLiteJobStore:
+    """
+    Persistent storage of background jobs in the jobs table of a SQLite file. Parameters, state and result
+    of every job are stored as JSON
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._pool = None
+        self._schema_ready = False
+
+    @asynccontextmanager
+    async def _connect(self):
+        # Job updates are small and infrequent, a single connection serializes them
+        if self._pool is None:
+            self._pool = SQLiteConnectionPool(self.db_file, 1, {"journal_mode": "WAL", "busy_timeout": "5000"})
+
+        async with self._pool.acquire() as db:
+            if not self._schema_ready:
+                for statement in JOBS_SCHEMA:
+                    await db.execute(statement)
+                await db.commit()
+                self._schema_ready = True
+            yield db
+
+    async def insert(self, job_id: str, kind: str, parameters: dict):
+        now = time.time()
+        async with self._connect() as db:
+            await db.execute(("INSERT INTO jobs (id, kind, status, parameters, created_at, updated_at) "
+                              "VALUES (:id, :kind, 'queued', :parameters, :now, :now)"),
+                             {"id": job_id, "kind": kind, "parameters": json.dumps(parameters), "now": now})
+            await db.commit()
+
+    async def update(self, job_id: str, **fields):
+        """
+        Update some columns of a job, JSON columns take any serializable value
+
+        :param job_id: Id of the job of interest
+        :param fields: New values indexed by column name
+        """
+        values = {key: json.dumps(value) if key in JSON_COLUMNS else value for key, value in fields.items()}
+        values["updated_at"] = time.time()
+        async with self._connect() as db:
+            await db.execute(f"UPDATE jobs SET {generate_sql_update_set_formatted_string(list(values))} WHERE id = :id",
+                             {**values, "id": job_id})
+            await db.commit()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """
+        :return: Dict with every column of the job, None if there is no job with that id
+        """
+        async with self._connect() as db:
+            cursor = await db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = :id", {"id": job_id})
+            row = await cursor.fetchone()
+            await cursor.close()
+
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        for key in JSON_COLUMNS:
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    async def unfinished(self):
+        """
+        :return: Ids of the queued and running jobs, from oldest to newest
+        """
+        async with self._connect() as db:
+            cursor = await db.execute(("SELECT id FROM jobs WHERE status IN ('queued', 'running') "
+                                       "ORDER BY created_at"))
+            rows = await cursor.fetchall()
+            await cursor.close()
+
+        return [row[0] for row in rows]
+
+    async def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close(drain_timeout=10.0)
@@ -0,0 +1,173 @@
+import sys
+
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, List, Tuple
+
+
+class _Interner:
+    """
+    Two-way mapping between string ids and dense integers, so adjacency arrays store machine integers.
+    Integers of released ids are reused by the next interned ids, so the tables only grow up to the largest
+    amount of ids held at once
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []  # Released slots hold None until they are reused
+        self._free = []  # Integers of released ids
+
+    def get(self, name: str):
+        return self.ids.get(name)
+
+    def intern(self, name: str):
+        number = self.ids.get(name)
+        if number is None:
+            if self._free:
+                number = self._free.pop()
+                self.names[number] = name
+            else:
+                number = len(self.names)
+                self.names.append(name)
+            self.ids[name] = number
+        return number
+
+    def release(self, name: str):
+        """
+        Forget an id, which must no longer appear in any adjacency array
+        """
+        number = self.ids.pop(name, None)
+        if number is not None:
+            self.names[number] = None
+            self._free.append(number)
+
+
+class MembershipIndex:
+    """
+    In-memory bidirectional graph of the team_members table. Team and user ids are interned to integers
+    and every node keeps the ids of its neighbors in a sorted array of machine integers, which keeps the
+    memory per edge low and makes membership lookups O(log degree). Deleted users and teams release their
+    interned ids, so churn doesn't grow the index.
+    The index is only consistent with the DB file if every membership write goes through the owning handler,
+    which must apply each change right after the transaction that made it is committed
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.edges = 0
+        self.generation = 0  # Incremented by every write, used for detecting writes that race with a load
+        self._teams = _Interner()
+        self._users = _Interner()
+        self._team_users = {}  # Interned team id -> sorted array of interned user ids
+        self._user_teams = {}  # Interned user id -> sorted array of interned team ids
+
+    def load(self, pairs: Iterable[Tuple[str, str]]):
+        """
+        Replace the content of the index with the given memberships
+
+        :param pairs: Iterable of memberships, uses format ("id_team", "id_user")
+        """
+        self._teams, self._users = _Interner(), _Interner()
+        team_users, user_teams = {}, {}
+        edges = 0
+        for team_id, user_id in pairs:
+            team, user = self._teams.intern(team_id), self._users.intern(user_id)
+            team_users.setdefault(team, []).append(user)
+            user_teams.setdefault(user, []).append(team)
+            edges += 1
+
+        self._team_users = {team: array("l", sorted(users)) for team, users in team_users.items()}
+        self._user_teams = {user: array("l", sorted(teams)) for user, teams in user_teams.items()}
+        self.edges = edges
+        self.loaded = True
+
+    @staticmethod
+    def _insert(adjacency: dict, node: int, neighbor: int):
+        neighbors = adjacency.setdefault(node, array("l"))
+        position = bisect_left(neighbors, neighbor)
+        if position < len(neighbors) and neighbors[position] == neighbor:
+            return False
+        neighbors.insert(position, neighbor)
+        return True
+
+    @staticmethod
+    def _remove(adjacency: dict, node: int, neighbor: int):
+        neighbors = adjacency.get(node)
+        if neighbors is None:
+            return
+        position = bisect_left(neighbors, neighbor)
+        if position < len(neighbors) and neighbors[position] == neighbor:
+            del neighbors[position]
+        if not neighbors:
+            del adjacency[node]
+
+    def add(self, team_id: str, user_id: str):
+        self.generation += 1
+        team, user = self._teams.intern(team_id), self._users.intern(user_id)
+        if self._insert(self._team_users, team, user):
+            self._insert(self._user_teams, user, team)
+            self.edges += 1
+
+    def remove(self, team_id: str, user_id: str):
+        self.generation += 1
+        team, user = self._teams.get(team_id), self._users.get(user_id)
+        if team is None or user is None or not self.has(team_id, user_id):
+            return
+        self._remove(self._team_users, team, user)
+        self._remove(self._user_teams, user, team)
+        self.edges -= 1
+
+    def remove_user(self, user_id: str):
+        self.generation += 1
+        user = self._users.get(user_id)
+        for team in self._user_teams.pop(user, ()):
+            self._remove(self._team_users, team, user)
+            self.edges -= 1
+        self._users.release(user_id)
+
+    def remove_team(self, team_id: str):
+        self.generation += 1
+        team = self._teams.get(team_id)
+        for user in self._team_users.pop(team, ()):
+            self._remove(self._user_teams, user, team)
+            self.edges -= 1
+        self._teams.release(team_id)
+
+    def has(self, team_id: str, user_id: str):
+        team, user = self._teams.get(team_id), self._users.get(user_id)
+        neighbors = self._team_users.get(team, ())
+        position = bisect_left(neighbors, user) if user is not None else len(neighbors)
+        return position < len(neighbors) and neighbors[position] == user
+
+    def team_members(self, team_id: str) -> List[str]:
+        """
+        :return: Sorted ids of the users that are members of the team
+        """
+        names = self._users.names
+        return sorted(names[user] for user in self._team_users.get(self._teams.get(team_id), ()))
+
+    def user_teams(self, user_id: str) -> List[str]:
+        """
+        :return: Sorted ids of the teams where the user is a member
+        """
+        names = self._teams.names
+        return sorted(names[team] for team in self._user_teams.get(self._users.get(user_id), ()))
+
+    def memory_usage(self):
+        """
+        Estimate the memory held by the index
+
+        :return: Dict with the amount of edges, the total bytes and the bytes per million edges
+        """
+        total_bytes = sys.getsizeof(self._team_users) + sys.getsizeof(self._user_teams)
+        for adjacency in (self._team_users, self._user_teams):
+            total_bytes += sum(sys.getsizeof(neighbors) for neighbors in adjacency.values())
+        for interner in (self._teams, self._users):
+            total_bytes += sys.getsizeof(interner.ids) + sys.getsizeof(interner.names)
+            total_bytes += sum(sys.getsizeof(name) for name in interner.names if name is not None)
+
+        return {
+            "edges": self.edges,
+            "bytes": total_bytes,
+            "bytes_per_million_edges": total_bytes * 1000000 // self.edges if self.edges else 0
+        }
@@ -1,4 +1,5 @@
-from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser
+from typing import List, Optional, Tuple
+from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser, ImportUser
 from .database_handler import DBHandler, DBHandlerException
 
 
@@ -24,6 +25,9 @@ class MockDBHandler(DBHandler):
     async def delete_user(self, user_id: str):
         return user_id, "my_name", "my_email"
 
+    async def delete_users(self, user_ids: List[str]):
+        return [(user_id, "my_name", "my_email") for user_id in sorted(set(user_ids))]
+
     async def select_team(self, team_id: str):
         return team_id, "my_name", "my_description"
 
@@ -39,18 +43,61 @@ class MockDBHandler(DBHandler):
     async def delete_team(self, team_id: str):
         return team_id, "my_name", "my_description"
 
+    async def delete_teams(self, team_ids: List[str]):
+        return [(team_id, "my_name", "my_description") for team_id in sorted(set(team_ids))]
+
     async def select_user_teams(self, user_id: str):
         return [("my_id_1", "my_name_1", "my_description_1"), ("my_id_2", "my_name_2", "my_description_2")]
 
     async def select_team_members(self, team_id: str):
         return [("my_id_1", "my_name_1", "my_email_1"), ("my_id_2", "my_name_2", "my_email_2")]
 
+    async def select_teammates(self, user_id: str, limit: int):
+        return 2, [("my_id_1", "my_name_1", "my_email_1", 2), ("my_id_2", "my_name_2", "my_email_2", 1)][:limit]
+
+    async def select_shared_teams(self, user_id: str, other_user_id: str, limit: int):
+        return 2, [("my_id_1", "my_name_1", "my_description_1"), ("my_id_2", "my_name_2", "my_description_2")][:limit]
+
+    async def select_team_set_members(self, union: List[str], intersect: List[str], exclude: List[str], limit: int):
+        return 2, [("my_id_1", "my_name_1", "my_email_1"), ("my_id_2", "my_name_2", "my_email_2")][:limit]
+
     async def insert_team_member(self, team_id: str, user_id: str):
         return team_id, user_id
 
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        return sorted(set(user_ids) - {"my_id_1"}), ["my_id_2"]
+
     async def delete_team_member(self, team_id: str, user_id: str):
         return team_id, user_id
 
+    async def delete_team_members(self, team_id: str, limit: int):
+        return []
+
+    async def select_changes(self, since: int, limit: int, wait: float = 0):
+        return [(since + 1, "user", "my_id_1", "insert", '{"id": "my_id_1", "name": "my_name_1", "email": "my_email_1"}', 1.0),
+                (since + 2, "membership", "my_id_2:my_id_1", "delete", None, 2.0)][:limit]
+
+    async def select_member_counts(self, team_ids: List[str]):
+        return {team_id: 2 for team_id in team_ids}
+
+    async def select_team_counts(self, user_ids: List[str]):
+        return {user_id: 2 for user_id in user_ids}
+
+    async def select_stats(self, top: int):
+        return ([("my_id_1", "my_name_1", "my_description_1", 2), ("my_id_2", "my_name_2", "my_description_2", 1)][:top],
+                [(1, 1), (2, 1)], [(0, 1), (1, 1), (2, 1)])
+
+    async def import_batch(self, users: List[ImportUser], teams: List[BaseTeam], memberships: List[Tuple[str, str]]):
+        return [None] * len(users), [None] * len(teams), [None] * len(memberships)
+
+    async def select_export_page(self, entity: str, after: Optional[Tuple], limit: int):
+        if after is not None:
+            return []
+        pages = {"user": [("my_id_1", "my_name_1", "my_email_1", "my_hash_1")],
+                 "team": [("my_id_1", "my_name_1", "my_description_1")],
+                 "membership": [("my_id_1", "my_id_1", 1)]}
+        return pages[entity][:limit]
+
 
 class MockErrorDBHandler(MockDBHandler):
     """
@@ -73,3 +120,6 @@ class MockErrorDBHandler(MockDBHandler):
     async def insert_team_member(self, team_id: str, user_id: str):
         raise DBHandlerException()
 
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        raise DBHandlerException()
+
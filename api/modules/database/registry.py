@@ -0,0 +1,43 @@
+from typing import Callable, Dict, Optional
+from .database_handler import DBHandler
+
+
+class DBHandlerRegistry:
+    """
+    Registry of the DBHandler backends available to the app. Each backend is built from its factory
+    only once, started on app startup and shut down on app shutdown. Backends requested before startup
+    (e.g. by test clients that don't emit lifespan events) are built lazily without warm-up
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], DBHandler]]):
+        self._factories = factories
+        self._handlers = {}
+
+    def get(self, name: str) -> Optional[DBHandler]:
+        """
+        Get the backend registered under the given name
+
+        :param name: Name of the desired backend
+        :return: The DBHandler instance of the backend, None if there is no backend with that name
+        """
+        if name not in self._handlers:
+            if name not in self._factories:
+                return None
+            self._handlers[name] = self._factories[name]()
+
+        return self._handlers[name]
+
+    async def startup(self):
+        """
+        Build every registered backend and open its resources
+        """
+        for name in self._factories:
+            await self.get(name).startup()
+
+    async def shutdown(self):
+        """
+        Shut down every built backend, draining its in-flight work
+        """
+        handlers, self._handlers = self._handlers, {}
+        for handler in handlers.values():
+            await handler.shutdown()
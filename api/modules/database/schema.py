@@ -0,0 +1,149 @@
+
+# Module with the DDL statements used by the SQLite handler. Every statement is idempotent,
+# so it can be applied safely to both new and existing database files
+
+# Users and teams keep their string ids as the public API, while memberships store the integer row ids of both,
+# which keeps team_members and its index small and makes the joins compare integers
+BASE_SCHEMA = [
+    ("CREATE TABLE IF NOT EXISTS users (row_id INTEGER PRIMARY KEY, id VARCHAR UNIQUE NOT NULL, name VARCHAR NOT NULL, "
+     "email VARCHAR NOT NULL, password VARCHAR NOT NULL)"),
+    ("CREATE TABLE IF NOT EXISTS teams (row_id INTEGER PRIMARY KEY, id VARCHAR UNIQUE NOT NULL, "
+     "name VARCHAR UNIQUE NOT NULL, description NOT NULL)"),
+    ("CREATE TABLE IF NOT EXISTS team_members ("
+     "user_row_id INTEGER REFERENCES users (row_id) ON DELETE CASCADE NOT NULL, "
+     "team_row_id INTEGER REFERENCES teams (row_id) ON DELETE CASCADE NOT NULL, "
+     "PRIMARY KEY (user_row_id, team_row_id)) WITHOUT ROWID"),
+    # Serves lookups by team and the cascading deletes of teams, which can't use the (user_row_id, team_row_id) key
+    "CREATE INDEX IF NOT EXISTS team_members_team ON team_members (team_row_id, user_row_id)",
+]
+
+# Rebuild of users, teams and team_members for databases created with string keys in team_members. Orphan
+# memberships are dropped, since they would violate the foreign keys. Must run with foreign keys disabled,
+# otherwise dropping the old tables would cascade to the memberships. The materialized counts are keyed by
+# row id as well, so they are dropped and computed again
+INTEGER_KEYS_MIGRATION = [
+    "BEGIN",
+    ("CREATE TABLE users_migration (row_id INTEGER PRIMARY KEY, id VARCHAR UNIQUE NOT NULL, name VARCHAR NOT NULL, "
+     "email VARCHAR NOT NULL, password VARCHAR NOT NULL)"),
+    "INSERT INTO users_migration (id, name, email, password) SELECT id, name, email, password FROM users ORDER BY id",
+    ("CREATE TABLE teams_migration (row_id INTEGER PRIMARY KEY, id VARCHAR UNIQUE NOT NULL, "
+     "name VARCHAR UNIQUE NOT NULL, description NOT NULL)"),
+    "INSERT INTO teams_migration (id, name, description) SELECT id, name, description FROM teams ORDER BY id",
+    ("CREATE TABLE team_members_migration ("
+     "user_row_id INTEGER REFERENCES users (row_id) ON DELETE CASCADE NOT NULL, "
+     "team_row_id INTEGER REFERENCES teams (row_id) ON DELETE CASCADE NOT NULL, "
+     "PRIMARY KEY (user_row_id, team_row_id)) WITHOUT ROWID"),
+    ("INSERT INTO team_members_migration SELECT users_migration.row_id, teams_migration.row_id FROM team_members "
+     "INNER JOIN users_migration ON users_migration.id = team_members.id_user "
+     "INNER JOIN teams_migration ON teams_migration.id = team_members.id_team"),
+    "DROP TABLE team_members",
+    "DROP TABLE users",
+    "DROP TABLE teams",
+    "DROP TABLE IF EXISTS team_stats",
+    "DROP TABLE IF EXISTS user_stats",
+    "ALTER TABLE users_migration RENAME TO users",
+    "ALTER TABLE teams_migration RENAME TO teams",
+    "ALTER TABLE team_members_migration RENAME TO team_members",
+    "CREATE INDEX team_members_team ON team_members (team_row_id, user_row_id)",
+    "COMMIT",
+]
+
+# Append-only log of every write, used for delta synchronization of downstream mirrors.
+# AUTOINCREMENT guarantees that sequence numbers are never reused, even after compaction
+CHANGE_LOG_SCHEMA = [
+    ("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, entity VARCHAR NOT NULL, "
+     "entity_id VARCHAR NOT NULL, operation VARCHAR NOT NULL, data VARCHAR, created_at REAL NOT NULL)"),
+    "CREATE INDEX IF NOT EXISTS changes_created_at ON changes (created_at)",
+]
+
+# Materialized membership counts, kept up to date by triggers on every write path that touches
+# team_members, users or teams. Indexes on the counts serve the statistics without scanning team_members
+COUNTS_SCHEMA = [
+    ("CREATE TABLE IF NOT EXISTS team_stats (team_row_id INTEGER PRIMARY KEY NOT NULL, "
+     "member_count INTEGER NOT NULL)"),
+    ("CREATE TABLE IF NOT EXISTS user_stats (user_row_id INTEGER PRIMARY KEY NOT NULL, "
+     "team_count INTEGER NOT NULL)"),
+    "CREATE INDEX IF NOT EXISTS team_stats_member_count ON team_stats (member_count)",
+    "CREATE INDEX IF NOT EXISTS user_stats_team_count ON user_stats (team_count)",
+    ("CREATE TRIGGER IF NOT EXISTS users_stats_insert AFTER INSERT ON users BEGIN "
+     "INSERT OR IGNORE INTO user_stats (user_row_id, team_count) VALUES (NEW.row_id, 0); END"),
+    ("CREATE TRIGGER IF NOT EXISTS users_stats_delete AFTER DELETE ON users BEGIN "
+     "DELETE FROM user_stats WHERE user_row_id = OLD.row_id; END"),
+    ("CREATE TRIGGER IF NOT EXISTS teams_stats_insert AFTER INSERT ON teams BEGIN "
+     "INSERT OR IGNORE INTO team_stats (team_row_id, member_count) VALUES (NEW.row_id, 0); END"),
+    ("CREATE TRIGGER IF NOT EXISTS teams_stats_delete AFTER DELETE ON teams BEGIN "
+     "DELETE FROM team_stats WHERE team_row_id = OLD.row_id; END"),
+    ("CREATE TRIGGER IF NOT EXISTS team_members_stats_insert AFTER INSERT ON team_members BEGIN "
+     "INSERT INTO team_stats (team_row_id, member_count) VALUES (NEW.team_row_id, 1) "
+     "ON CONFLICT (team_row_id) DO UPDATE SET member_count = member_count + 1; "
+     "INSERT INTO user_stats (user_row_id, team_count) VALUES (NEW.user_row_id, 1) "
+     "ON CONFLICT (user_row_id) DO UPDATE SET team_count = team_count + 1; END"),
+    ("CREATE TRIGGER IF NOT EXISTS team_members_stats_delete AFTER DELETE ON team_members BEGIN "
+     "UPDATE team_stats SET member_count = member_count - 1 WHERE team_row_id = OLD.team_row_id; "
+     "UPDATE user_stats SET team_count = team_count - 1 WHERE user_row_id = OLD.user_row_id; END"),
+]
+
+# Initial computation of the materialized counts, only run when the count tables are created
+COUNTS_BACKFILL = [
+    "INSERT OR REPLACE INTO team_stats (team_row_id, member_count) SELECT row_id, 0 FROM teams",
+    "INSERT OR REPLACE INTO user_stats (user_row_id, team_count) SELECT row_id, 0 FROM users",
+    ("INSERT OR REPLACE INTO team_stats (team_row_id, member_count) "
+     "SELECT team_row_id, COUNT(*) FROM team_members GROUP BY team_row_id"),
+    ("INSERT OR REPLACE INTO user_stats (user_row_id, team_count) "
+     "SELECT user_row_id, COUNT(*) FROM team_members GROUP BY user_row_id"),
+]
+
+
+# Persistent state of background jobs, so unfinished jobs can be resumed after a restart
+JOBS_SCHEMA = [
+    ("CREATE TABLE IF NOT EXISTS jobs (id VARCHAR PRIMARY KEY NOT NULL, kind VARCHAR NOT NULL, status VARCHAR NOT NULL, "
+     "parameters VARCHAR NOT NULL, state VARCHAR, progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER, "
+     "result VARCHAR, error VARCHAR, created_at REAL NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID"),
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)",
+]
+
+
+async def table_exists(db, table: str):
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", {"name": table})
+    exists = await cursor.fetchone() is not None
+    await cursor.close()
+    return exists
+
+
+async def table_columns(db, table: str):
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = [column[1] for column in await cursor.fetchall()]
+    await cursor.close()
+    return columns
+
+
+async def ensure_schema(db):
+    """
+    Create every missing table, index and trigger used by the SQLite handler, migrating older databases
+
+    :param db: Open aiosqlite connection to the target database
+    """
+    counts_exist = await table_exists(db, "team_stats")
+
+    # Databases with string keys in team_members are rebuilt before anything refers to the new columns
+    if await table_exists(db, "team_members") and "team_row_id" not in await table_columns(db, "team_members"):
+        cursor = await db.execute("PRAGMA foreign_keys")
+        foreign_keys = (await cursor.fetchone())[0]
+        await cursor.close()
+
+        await db.execute("PRAGMA foreign_keys = OFF")
+        try:
+            for statement in INTEGER_KEYS_MIGRATION:
+                await db.execute(statement)
+        finally:
+            await db.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+        counts_exist = False
+
+    for statement in BASE_SCHEMA + CHANGE_LOG_SCHEMA + COUNTS_SCHEMA:
+        await db.execute(statement)
+
+    if not counts_exist:
+        for statement in COUNTS_BACKFILL:
+            await db.execute(statement)
+
+    await db.commit()
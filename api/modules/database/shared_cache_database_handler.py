@@ -0,0 +1,65 @@
+from api.modules.metrics import metrics
+from .database_handler import DBHandler, WRITE_METHODS
+from .shared_record_cache import CACHE_MISS, SharedRecordCache
+from .wrapper_database_handler import DBHandlerWrapper
+
+shared_cache_reads_counter = metrics.counter("shared_cache_reads_total", "Reads of the shared record cache")
+
+
+class SharedCacheDBHandler(DBHandlerWrapper):
+    """
+    DB handler wrapper for worker processes sharing a DB file, that serves select_user and select_team from a
+    SharedRecordCache mapped by every worker. Every write, successful or not, invalidates the cache of all the
+    workers once it returns, so the next reads of every worker see it
+    """
+
+    def __init__(self, inner: DBHandler, cache: SharedRecordCache):
+        super().__init__(inner)
+        self.cache = cache
+
+    async def startup(self):
+        await self.inner.startup()
+        # Entries cached before this worker started could predate changes made while no worker was running
+        self.cache.invalidate()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+        self.cache.close()
+
+    async def _cached(self, kind: str, record_id: str, query):
+        key = f"{kind}:{record_id}"
+        record = self.cache.get(key)
+        if record is not CACHE_MISS:
+            shared_cache_reads_counter.inc(kind=kind, result="hit")
+            return tuple(record) if record is not None else None
+
+        shared_cache_reads_counter.inc(kind=kind, result="miss")
+        generation = self.cache.generation
+        record = await query()
+        self.cache.put(key, list(record) if record is not None else None, generation)
+        return record
+
+    async def select_user(self, user_id: str):
+        return await self._cached("user", user_id, lambda: self.inner.select_user(user_id=user_id))
+
+    async def select_team(self, team_id: str):
+        return await self._cached("team", team_id, lambda: self.inner.select_team(team_id=team_id))
+
+    async def _write(self, name: str, *args, **kwargs):
+        try:
+            return await getattr(self.inner, name)(*args, **kwargs)
+        finally:
+            self.cache.invalidate()
+
+
+def _invalidating_method(name: str):
+    async def invalidating_method(self, *args, **kwargs):
+        return await self._write(name, *args, **kwargs)
+
+    invalidating_method.__name__ = name
+    return invalidating_method
+
+
+# Every write of the DBHandler interface invalidates the cache the same way, other reads are delegated as they are
+for _name in WRITE_METHODS:
+    setattr(SharedCacheDBHandler, _name, _invalidating_method(_name))
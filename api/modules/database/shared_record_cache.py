@@ -0,0 +1,157 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from contextlib import contextmanager
+from api.modules.metrics import metrics
+
+# Returned by SharedRecordCache.get when the key has no valid entry, since None is a valid cached value
+CACHE_MISS = object()
+
+# File header: magic, generation, amount of slots and size of every slot, padded to HEADER_SIZE bytes
+MAGIC = b"RECCACH1"
+HEADER = struct.Struct("<8sQII")
+HEADER_SIZE = 64
+GENERATION_OFFSET = 8
+
+# Slot layout: sequence (odd while the slot is being written), generation of the entry, key length and value length,
+# followed by the key and the JSON value
+SEQUENCE = struct.Struct("<Q")
+SLOT_HEADER = struct.Struct("<QQHI")
+
+# Reads retried while a slot is being rewritten by another process, before giving up with a miss
+READ_ATTEMPTS = 3
+
+shared_cache_invalidations_counter = metrics.counter("shared_cache_invalidations_total",
+                                                     "Generation bumps of the shared record cache")
+shared_cache_skipped_counter = metrics.counter("shared_cache_skipped_total",
+                                               "Records not stored in the shared cache, by reason")
+
+
+class SharedRecordCache:
+    """
+    Key-value cache held in a memory-mapped file that every worker process maps, so it takes the same memory
+    whatever the amount of workers. Keys are hashed to a fixed amount of slots, a new entry replaces the previous
+    one of its slot. A generation counter in the file header tags every entry: entries of older generations are
+    misses, so bumping the counter invalidates the whole cache in every process at once.
+    Readers don't lock, every slot is guarded by a sequence number (seqlock). Writers of entries and of the
+    generation take an exclusive flock of the file
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: Cache configuration, see CONFIG_SHARED_CACHE
+        """
+        self.config = config
+        self.slots = None
+        self.slot_size = None
+        self._fd = None
+        self._map = None
+
+    def open(self):
+        """
+        Map the cache file, creating it if needed. Existing files keep their layout, even if the configuration
+        changed, since other workers may have them mapped
+        """
+        if self._map is not None:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.config["file"])), exist_ok=True)
+        self._fd = os.open(self.config["file"], os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            magic, _, slots, slot_size = HEADER.unpack(os.pread(self._fd, HEADER.size, 0).ljust(HEADER.size, b"\0"))
+            if magic != MAGIC:
+                slots, slot_size = self.config["slots"], self.config["slot_size"]
+                os.ftruncate(self._fd, 0)  # Zeroed slots are empty: their key length never matches
+                os.ftruncate(self._fd, HEADER_SIZE + slots * slot_size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, 0, slots, slot_size), 0)
+
+        self.slots, self.slot_size = slots, slot_size
+        self._map = mmap.mmap(self._fd, HEADER_SIZE + slots * slot_size)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def generation(self) -> int:
+        self.open()
+        return SEQUENCE.unpack_from(self._map, GENERATION_OFFSET)[0]
+
+    def invalidate(self):
+        """
+        Bump the generation, turning every cached entry of every process into a miss
+        """
+        self.open()
+        with self._locked():
+            SEQUENCE.pack_into(self._map, GENERATION_OFFSET, self.generation + 1)
+        shared_cache_invalidations_counter.inc()
+
+    def _slot_offset(self, key: bytes):
+        # Hashes must agree between processes, unlike the randomized hash() of Python
+        return HEADER_SIZE + zlib.crc32(key) % self.slots * self.slot_size
+
+    def get(self, key: str):
+        """
+        :return: The cached value of the key, CACHE_MISS if it has none of the current generation
+        """
+        generation = self.generation
+        key = key.encode()
+        offset = self._slot_offset(key)
+        for _ in range(READ_ATTEMPTS):
+            sequence, entry_generation, key_length, value_length = SLOT_HEADER.unpack_from(self._map, offset)
+            if sequence % 2:
+                continue
+            if entry_generation != generation or key_length != len(key):
+                return CACHE_MISS
+            start = offset + SLOT_HEADER.size
+            data = self._map[start:start + key_length + value_length]
+            if SEQUENCE.unpack_from(self._map, offset)[0] != sequence:
+                continue  # Rewritten while it was being read
+            if data[:key_length] != key:
+                return CACHE_MISS
+            return json.loads(data[key_length:])
+
+        return CACHE_MISS
+
+    def put(self, key: str, value, generation: int):
+        """
+        Store the value of a key, unless the cache was invalidated after generation
+
+        :param value: JSON-serializable value
+        :param generation: Generation read before the value was read from the DB, so values that may predate a
+                           write are never stored as current
+        """
+        self.open()
+        key = key.encode()
+        data = json.dumps(value, separators=(",", ":")).encode()
+        if SLOT_HEADER.size + len(key) + len(data) > self.slot_size:
+            shared_cache_skipped_counter.inc(reason="oversized")
+            return
+
+        offset = self._slot_offset(key)
+        with self._locked():
+            if generation != self.generation:
+                shared_cache_skipped_counter.inc(reason="stale")
+                return
+            sequence = SEQUENCE.unpack_from(self._map, offset)[0]
+            SEQUENCE.pack_into(self._map, offset, sequence + 1)
+            start = offset + SLOT_HEADER.size
+            self._map[start:start + len(key) + len(data)] = key + data
+            SLOT_HEADER.pack_into(self._map, offset, sequence + 1, generation, len(key), len(data))
+            SEQUENCE.pack_into(self._map, offset, sequence + 2)
@@ -0,0 +1,153 @@
+import asyncio
+
+from typing import Callable, List, Tuple
+from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser, ImportUser
+from api.modules.deadlines import Deadline, current_deadline, run_with_deadline, wait_within_deadline
+from .wrapper_database_handler import DBHandlerWrapper
+
+
+class SingleFlightDBHandler(DBHandlerWrapper):
+    """
+    DB handler wrapper that coalesces identical concurrent reads. The first caller of a read starts the
+    underlying query and every identical call made while it is in flight awaits the same result.
+    Writes end the sharing of every read that involves the written entity, both before and after running,
+    so callers never join a query that could miss a write they already observed
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self._in_flight = {}  # Shared query tasks indexed by (method name, argument)
+        self._waiters = {}  # Per shared query task: [deadline of the query, amount of callers waiting for it]
+
+    async def _shared(self, key: Tuple, query: Callable):
+        task = self._in_flight.get(key)
+        if task is None:
+            # The query runs under a deadline of its own, cancelled once every caller gave up on it
+            query_deadline = Deadline()
+            task = asyncio.ensure_future(run_with_deadline(query_deadline, query()))
+            self._in_flight[key] = task
+            self._waiters[task] = [query_deadline, 0]
+            task.add_done_callback(lambda done_task: self._query_done(key, done_task))
+        waiters = self._waiters[task]
+        waiters[1] += 1
+
+        # A waiter that is cancelled or whose deadline expires stops waiting without cancelling the query for the rest
+        try:
+            return await wait_within_deadline(task)
+        finally:
+            waiters[1] -= 1
+            if waiters[1] == 0 and not task.done():
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+                deadline = current_deadline()
+                waiters[0].cancel(deadline.reason if deadline is not None and deadline.cancelled else "cancelled")
+
+    def _query_done(self, key: Tuple, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            task.exception()  # Marks the exception as retrieved when every waiter was cancelled
+
+    def _forget(self, *matches: Tuple):
+        """
+        End the sharing of the in-flight reads that match any of the given keys. A key whose
+        argument is None matches every in-flight read of that method
+        """
+        for key in list(self._in_flight):
+            for method, argument in matches:
+                if key[0] == method and (argument is None or key[1:] == (argument,)):
+                    del self._in_flight[key]
+                    break
+
+    async def _write(self, invalidated_keys: Tuple[Tuple, ...], write: Callable):
+        self._forget(*invalidated_keys)
+        try:
+            return await write()
+        finally:
+            self._forget(*invalidated_keys)
+
+    @staticmethod
+    def _user_keys(user_id: str):
+        return ("select_user", user_id), ("select_users", None), ("select_user_teams", user_id), \
+               ("select_team_members", None)
+
+    @staticmethod
+    def _team_keys(team_id: str):
+        return ("select_team", team_id), ("select_teams", None), ("select_team_members", team_id), \
+               ("select_user_teams", None)
+
+    @staticmethod
+    def _membership_keys(team_id: str, user_id: str):
+        return ("select_team_members", team_id), ("select_user_teams", user_id)
+
+    @staticmethod
+    def _all_keys():
+        return ("select_user", None), ("select_users", None), ("select_team", None), ("select_teams", None), \
+               ("select_user_teams", None), ("select_team_members", None)
+
+    async def select_user(self, user_id: str):
+        return await self._shared(("select_user", user_id), lambda: self.inner.select_user(user_id=user_id))
+
+    async def select_users(self):
+        return await self._shared(("select_users",), self.inner.select_users)
+
+    async def insert_user(self, new_user: InUser):
+        return await self._write(self._user_keys(new_user.id), lambda: self.inner.insert_user(new_user=new_user))
+
+    async def update_user(self, user_id: str, new_data: UpdateUser):
+        return await self._write(self._user_keys(user_id),
+                                 lambda: self.inner.update_user(user_id=user_id, new_data=new_data))
+
+    async def delete_user(self, user_id: str):
+        return await self._write(self._user_keys(user_id), lambda: self.inner.delete_user(user_id=user_id))
+
+    async def delete_users(self, user_ids: List[str]):
+        return await self._write(self._all_keys(), lambda: self.inner.delete_users(user_ids=user_ids))
+
+    async def select_team(self, team_id: str):
+        return await self._shared(("select_team", team_id), lambda: self.inner.select_team(team_id=team_id))
+
+    async def select_teams(self):
+        return await self._shared(("select_teams",), self.inner.select_teams)
+
+    async def insert_team(self, new_team: BaseTeam):
+        return await self._write(self._team_keys(new_team.id), lambda: self.inner.insert_team(new_team=new_team))
+
+    async def update_team(self, team_id: str, new_data: UpdateTeam):
+        return await self._write(self._team_keys(team_id),
+                                 lambda: self.inner.update_team(team_id=team_id, new_data=new_data))
+
+    async def delete_team(self, team_id: str):
+        return await self._write(self._team_keys(team_id), lambda: self.inner.delete_team(team_id=team_id))
+
+    async def delete_teams(self, team_ids: List[str]):
+        return await self._write(self._all_keys(), lambda: self.inner.delete_teams(team_ids=team_ids))
+
+    async def select_user_teams(self, user_id: str):
+        return await self._shared(("select_user_teams", user_id),
+                                  lambda: self.inner.select_user_teams(user_id=user_id))
+
+    async def select_team_members(self, team_id: str):
+        return await self._shared(("select_team_members", team_id),
+                                  lambda: self.inner.select_team_members(team_id=team_id))
+
+    async def insert_team_member(self, team_id: str, user_id: str):
+        return await self._write(self._membership_keys(team_id, user_id),
+                                 lambda: self.inner.insert_team_member(team_id=team_id, user_id=user_id))
+
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        return await self._write(self._membership_keys(team_id, None),
+                                 lambda: self.inner.sync_team_members(team_id=team_id, user_ids=user_ids))
+
+    async def delete_team_member(self, team_id: str, user_id: str):
+        return await self._write(self._membership_keys(team_id, user_id),
+                                 lambda: self.inner.delete_team_member(team_id=team_id, user_id=user_id))
+
+    async def delete_team_members(self, team_id: str, limit: int):
+        return await self._write(self._membership_keys(team_id, None),
+                                 lambda: self.inner.delete_team_members(team_id=team_id, limit=limit))
+
+    async def import_batch(self, users: List[ImportUser], teams: List[BaseTeam], memberships: List[Tuple[str, str]]):
+        return await self._write(self._all_keys(),
+                                 lambda: self.inner.import_batch(users=users, teams=teams, memberships=memberships))
@@ -1,30 +1,355 @@
-import aiosqlite
-
-from aiosqlite import IntegrityError
-from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser
+import asyncio
+import json
+import time
+
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from aiosqlite import IntegrityError, OperationalError
+from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser, ImportUser
+from api.modules.metrics import metrics
+from api.modules.tracing import tracer, TracedConnection
+from api.modules.deadlines import current_deadline, DeadlineConnection, DeadlineExceeded
 from .database_handler import DBHandler, DBHandlerException
-from .config import CONFIG_SQLITE
-from .utils import encrypt_string, generate_sql_update_set_formatted_string
+from .config import CONFIG_SQLITE, CONFIG_CHANGE_LOG, CONFIG_SQLITE_POOL, CONFIG_MEMBERSHIP_INDEX, \
+    CONFIG_SQLITE_MAINTENANCE, CONFIG_SQLITE_PROFILES
+from .membership_index import MembershipIndex
+from .schema import ensure_schema
+from .sqlite_maintenance import SQLiteMaintenance
+from .sqlite_pool import SQLiteConnectionPool
+from .utils import encrypt_string, generate_sql_update_set_formatted_string, chunked
 
 # Establish necessary connection configuration for SQLite db
 connection_config = CONFIG_SQLITE["production"]["db_file"]
 
+# Memberships are stored as integer row ids of users and teams, string ids are translated by these fragments
+USER_ROW_ID = "SELECT row_id FROM users WHERE id = :id_user"
+TEAM_ROW_ID = "SELECT row_id FROM teams WHERE id = :id_team"
+MEMBERSHIP_JOIN = ("FROM team_members INNER JOIN users ON users.row_id = team_members.user_row_id "
+                   "INNER JOIN teams ON teams.row_id = team_members.team_row_id")
+MEMBERSHIP_IDS_QUERY = f"SELECT teams.id, users.id {MEMBERSHIP_JOIN}"
+# Unknown users or teams resolve to NULL row ids, which fail with an IntegrityError like a foreign key would
+INSERT_MEMBERSHIP_QUERY = f"INSERT INTO team_members (user_row_id, team_row_id) VALUES (({USER_ROW_ID}), ({TEAM_ROW_ID}))"
+
+interrupted_statements_counter = metrics.counter("sqlite_statements_interrupted_total",
+                                                "SQLite statements interrupted by the cancellation of their request")
+membership_index_edges_gauge = metrics.gauge("membership_index_edges", "Memberships held by the in-memory index")
+membership_index_bytes_gauge = metrics.gauge("membership_index_bytes", "Estimated memory held by the in-memory index")
+membership_index_density_gauge = metrics.gauge("membership_index_bytes_per_million_edges",
+                                               "Estimated memory of the in-memory index per million memberships")
+
+
+def connection_pragmas(profile: Optional[str] = None) -> Dict:
+    """
+    Pragmas applied to every pooled connection, in order
+
+    :param profile: Name of the tuning profile, see CONFIG_SQLITE_PROFILES. None for the configured one
+    :raises ValueError: If the profile doesn't exist
+    """
+    profile = profile or CONFIG_SQLITE_POOL["profile"]
+    if profile not in CONFIG_SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite tuning profile '{profile}'")
+
+    # Foreign keys are always enforced, deletes rely on their ON DELETE CASCADE actions. The page size and
+    # incremental auto-vacuum only apply to new files and must be set in this order, before the journal mode
+    pragmas = dict(CONFIG_SQLITE_PROFILES[profile])
+    page_size = {"page_size": pragmas.pop("page_size")} if "page_size" in pragmas else {}
+    return {**page_size, "auto_vacuum": "INCREMENTAL", **pragmas, **CONFIG_SQLITE_POOL["pragmas"],
+            "foreign_keys": "ON"}
+
 
 class SQLiteDBHandler(DBHandler):
     """
     DB handler class for managing operations on a SQLite db.
-    Singleton class, just allows for one instance at any given time
+    Singleton class, just allows for one instance at any given time. Handlers of other DB files, like the ones
+    of tenants, are separate instances created by passing their db_file (and optionally their tuning profile)
     """
 
     _instance = None  # Class instance of same class (singleton pattern)
 
     # Overriding of __new__ method for implementing singleton pattern
-    def __new__(cls):
+    def __new__(cls, db_file: str = None, pool_max_size: int = None, profile: str = None):
+        if db_file is not None:
+            return cls._new_instance(db_file, pool_max_size, profile)
+
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
+            cls._instance = cls._new_instance(None, None, None)
 
         return cls._instance
 
+    @classmethod
+    def _new_instance(cls, db_file: Optional[str], pool_max_size: Optional[int], profile: Optional[str]):
+        instance = super().__new__(cls)
+        instance._db_file = db_file  # None follows the module connection_config
+        instance._pool_max_size = pool_max_size
+        instance._profile = profile  # None follows the profile of CONFIG_SQLITE_POOL
+        instance._initialized_files = set()  # DB files whose schema has already been checked
+        instance._pools = {}  # Connection pools indexed by DB file
+        instance._membership_indexes = {}  # In-memory membership indexes indexed by DB file
+        instance._maintenances = {}  # Background maintenance tasks indexed by DB file
+        instance._collectors = []  # Metric collectors registered by this instance
+        instance._change_waiters = set()  # Futures of long-polling consumers of the change log
+        instance._changes_since_compaction = 0
+        return instance
+
+    @property
+    def db_file(self):
+        return self._db_file if self._db_file is not None else connection_config
+
+    def _get_pool(self):
+        """
+        Get the connection pool of the configured DB file, creating it on first use
+        """
+        pool = self._pools.get(self.db_file)
+        if pool is None:
+            pool = SQLiteConnectionPool(self.db_file, self._pool_max_size or CONFIG_SQLITE_POOL["max_size"],
+                                        connection_pragmas(self._profile))
+            self._pools[self.db_file] = pool
+
+        return pool
+
+    @asynccontextmanager
+    async def _connect(self):
+        """
+        Borrow a pooled connection to the configured DB file, creating any missing table on first use.
+        Within sampled traces, the wait for the connection and every statement are recorded as spans.
+        When the deadline of the request is cancelled, the running statement is interrupted and the call fails
+        with DeadlineExceeded, so the connection goes back to the pool right away
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check()
+
+        acquire_started = time.time()
+        async with self._get_pool().acquire() as db:
+            pooled_db = db
+            if deadline is not None:
+                db = DeadlineConnection(db, deadline)
+            if tracer.current_span() is not None:
+                tracer.record("sqlite.acquire", acquire_started, time.time())
+                db = TracedConnection(db, tracer)
+
+            remove_callback = None
+            if deadline is not None:
+                # Interrupted right away rather than in a task, which could run once the connection serves another call.
+                # sqlite3 interrupts are thread safe and what aiosqlite's interrupt() does
+                remove_callback = deadline.on_cancel(lambda reason: pooled_db._conn.interrupt())
+            try:
+                if self.db_file not in self._initialized_files:
+                    await ensure_schema(db)
+                    self._initialized_files.add(self.db_file)
+
+                yield db
+            except OperationalError as e:
+                if deadline is None or not deadline.cancelled or "interrupted" not in str(e):
+                    raise
+                interrupted_statements_counter.inc(reason=deadline.reason)
+                raise DeadlineExceeded(deadline.reason) from e
+            except asyncio.CancelledError:
+                # The statement would keep running on the connection thread, and the connection can't be reused until it ends
+                await pooled_db.interrupt()
+                raise
+            finally:
+                if remove_callback is not None:
+                    remove_callback()
+
+    async def _get_membership_index(self):
+        """
+        Get the in-memory membership index of the configured DB file, loading it on first use
+
+        :return: The loaded MembershipIndex, None if the index is disabled
+        """
+        if not CONFIG_MEMBERSHIP_INDEX["enabled"]:
+            return None
+
+        db_file = self.db_file
+        index = self._membership_indexes.get(db_file)
+        if index is None:
+            index = MembershipIndex()
+            self._membership_indexes[db_file] = index
+            self._collectors.append(lambda: self._collect_membership_index_metrics(db_file, index))
+            metrics.register_collector(self._collectors[-1])
+
+        while not index.loaded:
+            # Writes applied while the table is being read make the snapshot unreliable, so it is read again
+            generation = index.generation
+            async with self._connect() as db:
+                cursor = await db.execute(MEMBERSHIP_IDS_QUERY)
+                membership_rows = await cursor.fetchall()
+
+                await cursor.close()
+
+            if index.generation == generation and not index.loaded:
+                index.load(membership_rows)
+
+        return index
+
+    @staticmethod
+    def _collect_membership_index_metrics(db_file: str, index: MembershipIndex):
+        memory_usage = index.memory_usage()
+        membership_index_edges_gauge.set(memory_usage["edges"], db_file=db_file)
+        membership_index_bytes_gauge.set(memory_usage["bytes"], db_file=db_file)
+        membership_index_density_gauge.set(memory_usage["bytes_per_million_edges"], db_file=db_file)
+
+    def _existing_membership_index(self):
+        """
+        Get the membership index of the configured DB file only if it was already created, for applying
+        committed writes to it. Indexes that were never created are loaded from the DB on first use anyway
+        """
+        return self._membership_indexes.get(self.db_file)
+
+    async def _select_by_ids(self, query: str, ids: List[str]):
+        """
+        Run a select query for a list of ids in chunks, keeping the result ordered by id
+
+        :param query: Query with a single "{}" placeholder for the positional parameters of the ids
+        :param ids: Sorted list of ids of interest
+        :return: A list with the concatenated rows of every chunk
+        """
+        resulting_rows = []
+        async with self._connect() as db:
+            for ids_chunk in chunked(ids, 500):
+                cursor = await db.execute(query.format(", ".join("?" * len(ids_chunk))), ids_chunk)
+                resulting_rows.extend(await cursor.fetchall())
+
+                await cursor.close()
+
+        return resulting_rows
+
+    async def startup(self):
+        """
+        Open the connection pool of the configured DB file and warm it up: pragmas are applied to the
+        new connections, the schema is checked, table statistics are refreshed and the page cache is primed
+        """
+        pool = self._get_pool()
+        await pool.warm_up(CONFIG_SQLITE_POOL["min_size"])
+
+        async with self._connect() as db:
+            if CONFIG_SQLITE_POOL["analyze_on_startup"]:
+                await db.execute("PRAGMA analysis_limit = 1000")
+                await db.execute("ANALYZE")
+                await db.commit()
+
+            for table in ("users", "teams", "team_members"):
+                cursor = await db.execute(f"SELECT COUNT(*) FROM {table}")
+                await cursor.fetchone()
+                await cursor.close()
+
+        await self._get_membership_index()
+
+        if self.db_file not in self._maintenances:
+            self._maintenances[self.db_file] = SQLiteMaintenance(pool, CONFIG_SQLITE_MAINTENANCE)
+        self._maintenances[self.db_file].start()
+
+    def _get_maintenance(self):
+        maintenance = self._maintenances.get(self.db_file)
+        if maintenance is None:
+            maintenance = SQLiteMaintenance(self._get_pool(), CONFIG_SQLITE_MAINTENANCE)
+            self._maintenances[self.db_file] = maintenance
+        return maintenance
+
+    async def run_maintenance(self, force: bool = False):
+        """
+        Run the due maintenance operations on the configured DB file right away, instead of waiting for the schedule
+
+        :param force: Run even if the pool is busy, and refresh the table statistics regardless of their age
+        :return: Dict with the last run time and duration of every operation, and the WAL and freelist sizes
+        """
+        return await self._get_maintenance().run(force=force)
+
+    def maintenance_status(self):
+        """
+        :return: Dict with the last run time and duration of every maintenance operation of the configured DB file
+        """
+        return self._get_maintenance().status
+
+    def reload_caches(self):
+        """
+        Mark the in-memory caches derived from the DB file as stale, so they are reloaded on next use.
+        Needed after the DB file is replaced behind the back of the handler, e.g. by a restore
+        """
+        for membership_index in self._membership_indexes.values():
+            membership_index.loaded = False
+
+    async def shutdown(self):
+        """
+        Stop the maintenance tasks, drain the in-flight queries and close every pooled connection
+        """
+        maintenances, self._maintenances = self._maintenances, {}
+        for maintenance in maintenances.values():
+            await maintenance.stop()
+
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            await pool.close(CONFIG_SQLITE_POOL["drain_timeout"])
+
+        # Indexes are loaded again on next use, registering their collectors again
+        collectors, self._collectors = self._collectors, []
+        for collector in collectors:
+            metrics.unregister_collector(collector)
+        self._membership_indexes = {}
+
+    @staticmethod
+    async def _log_change(db, entity: str, entity_id: str, operation: str, data: dict = None):
+        """
+        Append a record to the change log table. Must run inside the transaction of the write it describes
+
+        :param db: Connection holding the ongoing write transaction
+        :param entity: Kind of the changed record, one of "user", "team" or "membership"
+        :param entity_id: Id of the changed record, memberships use the format "id_team:id_user"
+        :param operation: One of "insert", "update" or "delete"
+        :param data: Public state of the record after the change, None for deletions
+        """
+        await db.execute(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                          "VALUES (:entity, :entity_id, :operation, :data, :created_at)"),
+                         {"entity": entity, "entity_id": entity_id, "operation": operation,
+                          "data": json.dumps(data) if data is not None else None, "created_at": time.time()})
+
+    @staticmethod
+    async def _log_membership_deletions(db, column: str, values: List[str]):
+        """
+        Append one change log record for every team_members row that matches any of the given column values,
+        using a single set-based statement. Must run before the rows are actually deleted
+
+        :param db: Connection holding the ongoing write transaction
+        :param column: Either "users.id" or "teams.id"
+        :param values: Ids used for filtering the team_members rows
+        :return: Number of appended change log records
+        """
+        cursor = await db.execute(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                   "SELECT 'membership', teams.id || ':' || users.id, 'delete', NULL, ? "
+                                   f"{MEMBERSHIP_JOIN} WHERE {column} IN ({', '.join('?' * len(values))})"),
+                                  [time.time(), *values])
+        return cursor.rowcount
+
+    async def _changes_committed(self, db, count: int = 1):
+        """
+        Wake up long-polling consumers after a write that logged changes was committed, and compact
+        the change log every time the configured amount of changes has been appended
+
+        :param db: Connection used for the committed write
+        :param count: Number of change records appended by the write
+        """
+        for waiter in self._change_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+        self._changes_since_compaction += count
+        if self._changes_since_compaction >= CONFIG_CHANGE_LOG["compaction_interval"]:
+            self._changes_since_compaction = 0
+            await self._compact_changes(db)
+
+    @staticmethod
+    async def _compact_changes(db):
+        """
+        Apply the retention policy to the change log table, deleting entries that are too old
+        or that exceed the maximum amount of entries to keep
+        """
+        await db.execute("DELETE FROM changes WHERE created_at < :oldest",
+                         {"oldest": time.time() - CONFIG_CHANGE_LOG["retention_seconds"]})
+        await db.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - :max_entries",
+                         {"max_entries": CONFIG_CHANGE_LOG["max_entries"]})
+        await db.commit()
+
     async def select_user(self, user_id: str):
         """
         Select a single row from users table in DB
@@ -33,7 +358,7 @@ class SQLiteDBHandler(DBHandler):
         :return: Tuple corresponding to the user record, uses format ("id", "name", "email"), None if no record is found
         """
         resulting_row = tuple()
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             cursor = await db.execute('SELECT id, name, email FROM users WHERE id=:id', {"id": user_id})
             resulting_row = await cursor.fetchone()
 
@@ -48,8 +373,8 @@ class SQLiteDBHandler(DBHandler):
         :return: A list corresponding to all user records, uses format [("id", "name", "email"),...]
         """
         resulting_rows = []
-        async with aiosqlite.connect(connection_config) as db:
-            cursor = await db.execute('SELECT id, name, email FROM users')
+        async with self._connect() as db:
+            cursor = await db.execute('SELECT id, name, email FROM users ORDER BY id')
             resulting_rows = await cursor.fetchall()
 
             await cursor.close()
@@ -64,15 +389,21 @@ class SQLiteDBHandler(DBHandler):
         :return: Tuple corresponding to inserted user record, uses format ("id", "name", "email")
         """
         inserted_row = tuple()
-        new_user.password = encrypt_string(new_user.password)
+        # Hashed into a copy, so retried calls with the same model don't hash the password twice
+        user_values_dict = {**new_user.dict(), "password": encrypt_string(new_user.password)}
 
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             try:
-                await db.execute("INSERT INTO users values (:id, :name, :email, :password)", new_user.dict())
+                await db.execute("INSERT INTO users (id, name, email, password) VALUES (:id, :name, :email, :password)",
+                                 user_values_dict)
+                await self._log_change(db, "user", new_user.id, "insert",
+                                       {"id": new_user.id, "name": new_user.name, "email": new_user.email})
                 await db.commit()
             except IntegrityError as e:
                 raise DBHandlerException()
 
+            await self._changes_committed(db)
+
         inserted_row = await self.select_user(user_id=new_user.id)
         return inserted_row
 
@@ -85,40 +416,52 @@ class SQLiteDBHandler(DBHandler):
         :return: Tuple corresponding to updated user record, uses format ("id", "name", "email")
         """
         updated_row = tuple()
-        if new_data.password:
-            new_data.password = encrypt_string(new_data.password)
-
         updated_values_dict = new_data.dict(exclude_unset=True)
+        if new_data.password:
+            # Hashed into the dict, so retried calls with the same model don't hash the password twice
+            updated_values_dict["password"] = encrypt_string(new_data.password)
 
         set_query = generate_sql_update_set_formatted_string(list(updated_values_dict.keys()))
         updated_values_dict["id"] = user_id
 
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             try:
-                await db.execute(f"UPDATE users SET {set_query} WHERE id = :id", updated_values_dict)
+                cursor = await db.execute(f"UPDATE users SET {set_query} WHERE id = :id", updated_values_dict)
+                updated_count = cursor.rowcount
+                if updated_count:
+                    cursor = await db.execute('SELECT id, name, email FROM users WHERE id=:id', {"id": user_id})
+                    row = await cursor.fetchone()
+                    await self._log_change(db, "user", user_id, "update", dict(zip(("id", "name", "email"), row)))
                 await db.commit()
             except IntegrityError as e:
                 raise DBHandlerException()
 
+            if updated_count:
+                await self._changes_committed(db)
+
         updated_row = await self.select_user(user_id=user_id)
         return updated_row
 
     async def delete_user(self, user_id: str):
         """
         Delete a record from the users table in DB.
-        Also deletes all related records of the user in team_members table
+        Related records of the user in team_members table are deleted by the foreign key cascade
 
         :param user_id: Id of user of interest
         :return: Tuple corresponding to deleted user record, uses format ("id", "name", "email")
         """
-        deleted_row = await self.select_user(user_id=user_id)
+        deleted_rows = await self._delete_records("user", [user_id])
+        return deleted_rows[0] if deleted_rows else None
 
-        async with aiosqlite.connect(connection_config) as db:
-            await db.execute("DELETE FROM team_members WHERE id_user = :id", {"id": user_id})
-            await db.execute("DELETE FROM users WHERE id = :id", {"id": user_id})
-            await db.commit()
+    async def delete_users(self, user_ids: List[str]):
+        """
+        Delete many records from the users table in DB in a single transaction.
+        Related records of the users in team_members table are deleted by the foreign key cascade
 
-        return deleted_row
+        :param user_ids: Ids of users of interest, unknown ids are ignored
+        :return: A list of the deleted user records ordered by id, uses format [("id", "name", "email"),...]
+        """
+        return await self._delete_records("user", user_ids)
 
     async def select_team(self, team_id: str):
         """
@@ -128,8 +471,8 @@ class SQLiteDBHandler(DBHandler):
         :return: Tuple corresponding to the team record, uses format ("id", "name", "description")
         """
         resulting_row = tuple()
-        async with aiosqlite.connect(connection_config) as db:
-            cursor = await db.execute('SELECT * FROM teams WHERE id=:id', {"id": team_id})
+        async with self._connect() as db:
+            cursor = await db.execute('SELECT id, name, description FROM teams WHERE id=:id', {"id": team_id})
             resulting_row = await cursor.fetchone()
 
             await cursor.close()
@@ -143,8 +486,8 @@ class SQLiteDBHandler(DBHandler):
         :return: A list corresponding to all team records, uses format [("id", "name", "description"),...]
         """
         resulting_rows = []
-        async with aiosqlite.connect(connection_config) as db:
-            cursor = await db.execute('SELECT * FROM teams')
+        async with self._connect() as db:
+            cursor = await db.execute('SELECT id, name, description FROM teams ORDER BY id')
             resulting_rows = await cursor.fetchall()
 
             await cursor.close()
@@ -160,13 +503,17 @@ class SQLiteDBHandler(DBHandler):
         """
         inserted_row = tuple()
 
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             try:
-                await db.execute("INSERT INTO teams values (:id, :name, :description)", new_team.dict())
+                await db.execute("INSERT INTO teams (id, name, description) VALUES (:id, :name, :description)",
+                                 new_team.dict())
+                await self._log_change(db, "team", new_team.id, "insert", new_team.dict())
                 await db.commit()
             except IntegrityError as e:
                 raise DBHandlerException()
 
+            await self._changes_committed(db)
+
         inserted_row = await self.select_team(team_id=new_team.id)
         return inserted_row
 
@@ -185,32 +532,92 @@ class SQLiteDBHandler(DBHandler):
         set_query = generate_sql_update_set_formatted_string(list(updated_values_dict.keys()))
         updated_values_dict["id"] = team_id
 
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             try:
-                await db.execute(f"UPDATE teams SET {set_query} WHERE id = :id", updated_values_dict)
+                cursor = await db.execute(f"UPDATE teams SET {set_query} WHERE id = :id", updated_values_dict)
+                updated_count = cursor.rowcount
+                if updated_count:
+                    cursor = await db.execute('SELECT id, name, description FROM teams WHERE id=:id', {"id": team_id})
+                    row = await cursor.fetchone()
+                    await self._log_change(db, "team", team_id, "update", dict(zip(("id", "name", "description"), row)))
                 await db.commit()
             except IntegrityError as e:
                 raise DBHandlerException()
 
+            if updated_count:
+                await self._changes_committed(db)
+
         updated_row = await self.select_team(team_id=team_id)
         return updated_row
 
     async def delete_team(self, team_id: str):
         """
         Delete a record from the teams table in DB.
-        Also deletes all related records of the team in team_members table
+        Related records of the team in team_members table are deleted by the foreign key cascade
 
         :param team_id: Id of team of interest
         :return: Tuple corresponding to deleted team record, uses format ("id", "name", "description")
         """
-        deleted_row = await self.select_team(team_id=team_id)
+        deleted_rows = await self._delete_records("team", [team_id])
+        return deleted_rows[0] if deleted_rows else None
+
+    async def delete_teams(self, team_ids: List[str]):
+        """
+        Delete many records from the teams table in DB in a single transaction.
+        Related records of the teams in team_members table are deleted by the foreign key cascade
+
+        :param team_ids: Ids of teams of interest, unknown ids are ignored
+        :return: A list of the deleted team records ordered by id, uses format [("id", "name", "description"),...]
+        """
+        return await self._delete_records("team", team_ids)
 
-        async with aiosqlite.connect(connection_config) as db:
-            await db.execute("DELETE FROM team_members WHERE id_team = :id", {"id": team_id})
-            await db.execute("DELETE FROM teams WHERE id = :id", {"id": team_id})
+    async def _delete_records(self, entity: str, ids: List[str]):
+        """
+        Delete users or teams in a single transaction. Their team_members rows are deleted inside SQLite by the
+        ON DELETE CASCADE foreign keys, so every chunk of ids takes a fixed amount of statements regardless of
+        the amount of memberships
+
+        :param entity: Either "user" or "team"
+        :param ids: Ids of the records to delete
+        :return: A list of the deleted records ordered by id
+        """
+        table, columns, member_column = {"user": ("users", "id, name, email", "users.id"),
+                                         "team": ("teams", "id, name, description", "teams.id")}[entity]
+        deleted_rows = []
+        changes_count = 0
+
+        async with self._connect() as db:
+            await db.execute("BEGIN")
+            for ids_chunk in chunked(sorted(set(ids)), 500):
+                placeholders = ", ".join("?" * len(ids_chunk))
+                cursor = await db.execute(f"SELECT {columns} FROM {table} WHERE id IN ({placeholders}) ORDER BY id",
+                                          ids_chunk)
+                rows = await cursor.fetchall()
+                await cursor.close()
+                if not rows:
+                    continue
+
+                changes_count += await self._log_membership_deletions(db, member_column, ids_chunk)
+                await db.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids_chunk)
+                await db.executemany(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                      "VALUES (?, ?, 'delete', NULL, ?)"),
+                                     [(entity, row[0], time.time()) for row in rows])
+                changes_count += len(rows)
+                deleted_rows.extend(rows)
             await db.commit()
 
-        return deleted_row
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                for row in deleted_rows:
+                    if entity == "user":
+                        membership_index.remove_user(row[0])
+                    else:
+                        membership_index.remove_team(row[0])
+
+            if changes_count:
+                await self._changes_committed(db, changes_count)
+
+        return deleted_rows
 
     async def select_user_teams(self, user_id: str):
         """
@@ -219,11 +626,17 @@ class SQLiteDBHandler(DBHandler):
         :param user_id: Id of user of interest
         :return: A list of all team records associated with a user, uses format [("id", "name", "description"),...]
         """
+        membership_index = await self._get_membership_index()
+        if membership_index is not None:
+            return await self._select_by_ids('SELECT id, name, description FROM teams WHERE id IN ({}) ORDER BY id',
+                                             membership_index.user_teams(user_id))
+
         resulting_rows = []
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             cursor = await db.execute(('SELECT teams.id, teams.name, teams.description '
-                                       'FROM teams INNER JOIN team_members on teams.id = team_members.id_team '
-                                       'WHERE team_members.id_user = :id_user'), {"id_user": user_id})
+                                       'FROM team_members INNER JOIN teams ON teams.row_id = team_members.team_row_id '
+                                       f'WHERE team_members.user_row_id = ({USER_ROW_ID}) ORDER BY teams.id'),
+                                      {"id_user": user_id})
             resulting_rows = await cursor.fetchall()
 
             await cursor.close()
@@ -237,17 +650,106 @@ class SQLiteDBHandler(DBHandler):
         :param team_id: Id of team of interest
         :return: A list of all user records associated with a team, uses format [("id", "name", "email"),...]
         """
+        membership_index = await self._get_membership_index()
+        if membership_index is not None:
+            return await self._select_by_ids('SELECT id, name, email FROM users WHERE id IN ({}) ORDER BY id',
+                                             membership_index.team_members(team_id))
+
         resulting_rows = []
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             cursor = await db.execute(('SELECT users.id, users.name, users.email '
-                                       'FROM users INNER JOIN team_members on users.id = team_members.id_user '
-                                       'WHERE team_members.id_team = :id_team'), {"id_team": team_id})
+                                       'FROM team_members INNER JOIN users ON users.row_id = team_members.user_row_id '
+                                       f'WHERE team_members.team_row_id = ({TEAM_ROW_ID}) ORDER BY users.id'),
+                                      {"id_team": team_id})
             resulting_rows = await cursor.fetchall()
 
             await cursor.close()
 
         return resulting_rows
 
+    async def _select_counted_page(self, query: str, parameters: dict):
+        """
+        Run a query whose last column is the amount of rows before its LIMIT, as computed by COUNT(*) OVER ()
+
+        :return: Tuple with the amount of rows without limit and the selected rows without their last column
+        """
+        async with self._connect() as db:
+            cursor = await db.execute(query, parameters)
+            rows = await cursor.fetchall()
+            await cursor.close()
+
+        return (rows[0][-1] if rows else 0), [row[:-1] for row in rows]
+
+    async def select_teammates(self, user_id: str, limit: int):
+        """
+        Select the users that share at least one team with a user, in a single query over team_members
+
+        :param user_id: Id of user of interest
+        :param limit: Maximum amount of returned teammates
+        :return: Tuple with the total amount of teammates and a list of teammate records with the amount of shared
+                 teams, most shared teams first, uses format (total, [("id", "name", "email", shared_teams),...])
+        """
+        return await self._select_counted_page(
+            ('SELECT users.id, users.name, users.email, COUNT(*) AS shared_teams, COUNT(*) OVER () '
+             'FROM team_members AS own INNER JOIN team_members AS other ON other.team_row_id = own.team_row_id '
+             'INNER JOIN users ON users.row_id = other.user_row_id '
+             f'WHERE own.user_row_id = ({USER_ROW_ID}) AND other.user_row_id != own.user_row_id '
+             'GROUP BY other.user_row_id ORDER BY shared_teams DESC, users.id LIMIT :limit'),
+            {"id_user": user_id, "limit": limit})
+
+    async def select_shared_teams(self, user_id: str, other_user_id: str, limit: int):
+        """
+        Select the teams where two users are members
+
+        :param user_id: Id of one of the users of interest
+        :param other_user_id: Id of the other user of interest
+        :param limit: Maximum amount of returned teams
+        :return: Tuple with the total amount of shared teams and a list of team records,
+                 uses format (total, [("id", "name", "description"),...])
+        """
+        return await self._select_counted_page(
+            ('SELECT teams.id, teams.name, teams.description, COUNT(*) OVER () '
+             'FROM team_members AS own INNER JOIN team_members AS other ON other.team_row_id = own.team_row_id '
+             'INNER JOIN teams ON teams.row_id = own.team_row_id '
+             f'WHERE own.user_row_id = ({USER_ROW_ID}) '
+             'AND other.user_row_id = (SELECT row_id FROM users WHERE id = :id_other_user) '
+             'ORDER BY teams.id LIMIT :limit'),
+            {"id_user": user_id, "id_other_user": other_user_id, "limit": limit})
+
+    async def select_team_set_members(self, union: List[str], intersect: List[str], exclude: List[str], limit: int):
+        """
+        Select the users that belong to any team of union and to every team of intersect, but to no team of exclude.
+        The membership sets are combined by a single compound SELECT (UNION/INTERSECT/EXCEPT) of user row ids
+
+        :param union: Ids of teams whose members are combined
+        :param intersect: Ids of teams where every selected user must be a member
+        :param exclude: Ids of teams where no selected user can be a member
+        :param limit: Maximum amount of returned users
+        :return: Tuple with the total amount of selected users and a list of user records,
+                 uses format (total, [("id", "name", "email"),...])
+        """
+        if not union and not intersect:
+            return 0, []
+
+        parameters = {"limit": limit}
+
+        def members_of(prefix: str, team_ids: List[str]):
+            names = [f"{prefix}{position}" for position in range(len(team_ids))]
+            parameters.update(zip(names, team_ids))
+            placeholders = ", ".join(f":{name}" for name in names)
+            return f"SELECT user_row_id FROM team_members WHERE team_row_id IN (SELECT row_id FROM teams WHERE id IN ({placeholders}))"
+
+        # Compound operators have the same precedence and apply from left to right: (A INTERSECT B ...) EXCEPT C
+        selects = [members_of("union", union)] if union else []
+        selects.extend(members_of(f"intersect{position}_", [team_id]) for position, team_id in enumerate(intersect))
+        compound_select = " INTERSECT ".join(selects)
+        if exclude:
+            compound_select += f" EXCEPT {members_of('exclude', exclude)}"
+
+        return await self._select_counted_page(
+            f"SELECT id, name, email, COUNT(*) OVER () FROM users WHERE row_id IN ({compound_select}) ORDER BY id LIMIT :limit",
+            parameters)
+
     async def insert_team_member(self, team_id: str, user_id: str):
         """
         Insert a new record to the team_members table in DB
@@ -258,22 +760,80 @@ class SQLiteDBHandler(DBHandler):
         """
         inserted_row = tuple()
 
-        async with aiosqlite.connect(connection_config) as db:
+        async with self._connect() as db:
             try:
-                await db.execute("INSERT INTO team_members values (:id_user, :id_team)",
-                                 {"id_team": team_id, "id_user": user_id})
+                await db.execute(INSERT_MEMBERSHIP_QUERY, {"id_team": team_id, "id_user": user_id})
+                await self._log_change(db, "membership", f"{team_id}:{user_id}", "insert",
+                                       {"id_team": team_id, "id_user": user_id})
                 await db.commit()
             except IntegrityError as e:
                 raise DBHandlerException()
 
-            cursor = await db.execute(('SELECT id_team, id_user FROM team_members '
-                                       'WHERE id_team = :id_team AND id_user = :id_user'),
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                membership_index.add(team_id, user_id)
+
+            await self._changes_committed(db)
+
+            cursor = await db.execute(f"{MEMBERSHIP_IDS_QUERY} WHERE teams.id = :id_team AND users.id = :id_user",
                                       {"id_team": team_id, "id_user": user_id})
             inserted_row = await cursor.fetchone()
             await cursor.close()
 
         return inserted_row
 
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        """
+        Make the members of a team match the given set of users. Only the differences with the current members
+        are written, in a single transaction
+
+        :param team_id: Id of team of interest
+        :param user_ids: Ids of every user that must be a member of the team after the call
+        :return: Tuple of two sorted lists, with the ids of the added and the removed members
+        """
+        async with self._connect() as db:
+            await db.execute("BEGIN")
+            cursor = await db.execute(TEAM_ROW_ID, {"id_team": team_id})
+            team_row = await cursor.fetchone()
+            team_row_id = team_row[0] if team_row is not None else None
+            cursor = await db.execute(('SELECT users.id FROM team_members '
+                                       'INNER JOIN users ON users.row_id = team_members.user_row_id '
+                                       'WHERE team_members.team_row_id = :team_row_id'), {"team_row_id": team_row_id})
+            current_members = {row[0] for row in await cursor.fetchall()}
+            await cursor.close()
+
+            desired_members = set(user_ids)
+            added, removed = sorted(desired_members - current_members), sorted(current_members - desired_members)
+            try:
+                # The team row id is resolved once, the users are resolved by every statement
+                await db.executemany(f"DELETE FROM team_members WHERE team_row_id = :team_row_id AND user_row_id = ({USER_ROW_ID})",
+                                     [{"team_row_id": team_row_id, "id_user": user_id} for user_id in removed])
+                await db.executemany(("INSERT INTO team_members (user_row_id, team_row_id) "
+                                      f"VALUES (({USER_ROW_ID}), :team_row_id)"),
+                                     [{"team_row_id": team_row_id, "id_user": user_id} for user_id in added])
+            except IntegrityError as e:
+                raise DBHandlerException()
+
+            created_at = time.time()
+            change_rows = [(f"{team_id}:{user_id}", "delete", None, created_at) for user_id in removed]
+            change_rows.extend((f"{team_id}:{user_id}", "insert", json.dumps({"id_team": team_id, "id_user": user_id}),
+                                created_at) for user_id in added)
+            await db.executemany(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                  "VALUES ('membership', ?, ?, ?, ?)"), change_rows)
+            await db.commit()
+
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                for user_id in removed:
+                    membership_index.remove(team_id, user_id)
+                for user_id in added:
+                    membership_index.add(team_id, user_id)
+
+            if change_rows:
+                await self._changes_committed(db, len(change_rows))
+
+        return added, removed
+
     async def delete_team_member(self, team_id: str, user_id: str):
         """
         Delete a record from the team_members table in DB
@@ -284,18 +844,265 @@ class SQLiteDBHandler(DBHandler):
         """
         deleted_row = tuple()
 
-        async with aiosqlite.connect(connection_config) as db:
-            cursor = await db.execute(('SELECT id_team, id_user FROM team_members '
-                                       'WHERE id_team = :id_team AND id_user = :id_user'),
+        async with self._connect() as db:
+            cursor = await db.execute(f"{MEMBERSHIP_IDS_QUERY} WHERE teams.id = :id_team AND users.id = :id_user",
                                       {"id_team": team_id, "id_user": user_id})
             deleted_row = await cursor.fetchone()
             await cursor.close()
 
-            await db.execute(("DELETE FROM team_members "
-                              "WHERE id_team = :id_team AND id_user = :id_user"),
-                             {"id_team": team_id, "id_user": user_id})
+            cursor = await db.execute(("DELETE FROM team_members "
+                                       f"WHERE team_row_id = ({TEAM_ROW_ID}) AND user_row_id = ({USER_ROW_ID})"),
+                                      {"id_team": team_id, "id_user": user_id})
+            if cursor.rowcount:
+                await self._log_change(db, "membership", f"{team_id}:{user_id}", "delete")
             await db.commit()
 
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                membership_index.remove(team_id, user_id)
+
+            if cursor.rowcount:
+                await self._changes_committed(db)
+
         return deleted_row
 
+    async def delete_team_members(self, team_id: str, limit: int):
+        """
+        Delete some of the records of a team in the team_members table in DB, in a single transaction. Used for
+        emptying large teams in bounded transactions before deleting them
+
+        :param team_id: Id of team of interest
+        :param limit: Maximum amount of records to delete
+        :return: A list of the deleted team_member records, uses format [("id_team", "id_user"),...]
+        """
+        async with self._connect() as db:
+            await db.execute("BEGIN")
+            cursor = await db.execute(("SELECT users.id, users.row_id, team_members.team_row_id FROM team_members "
+                                       "INNER JOIN users ON users.row_id = team_members.user_row_id "
+                                       f"WHERE team_members.team_row_id = ({TEAM_ROW_ID}) LIMIT :limit"),
+                                      {"id_team": team_id, "limit": limit})
+            member_rows = await cursor.fetchall()
+            await cursor.close()
+            if not member_rows:
+                await db.commit()
+                return []
 
+            await db.executemany("DELETE FROM team_members WHERE team_row_id = ? AND user_row_id = ?",
+                                 [(row[2], row[1]) for row in member_rows])
+            await db.executemany(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                  "VALUES ('membership', ?, 'delete', NULL, ?)"),
+                                 [(f"{team_id}:{row[0]}", time.time()) for row in member_rows])
+            await db.commit()
+
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                for row in member_rows:
+                    membership_index.remove(team_id, row[0])
+
+            await self._changes_committed(db, len(member_rows))
+
+        return [(team_id, row[0]) for row in member_rows]
+
+    async def select_changes(self, since: int, limit: int, wait: float = 0):
+        """
+        Select the change log records appended after a given sequence number. If there are none, optionally
+        wait until new changes are committed (long-polling)
+
+        :param since: Sequence number of the last change already known by the consumer
+        :param limit: Maximum amount of records to return
+        :param wait: Maximum amount of seconds to wait for new changes when there are none
+        :return: A list of change records ordered by sequence number,
+                 uses format [(seq, "entity", "entity_id", "operation", "data", created_at),...]
+        """
+        deadline = time.monotonic() + wait
+
+        while True:
+            async with self._connect() as db:
+                cursor = await db.execute(('SELECT seq, entity, entity_id, operation, data, created_at FROM changes '
+                                           'WHERE seq > :since ORDER BY seq LIMIT :limit'),
+                                          {"since": since, "limit": limit})
+                resulting_rows = await cursor.fetchall()
+
+                await cursor.close()
+
+            remaining = deadline - time.monotonic()
+            if resulting_rows or remaining <= 0:
+                return resulting_rows
+
+            # Changes committed by other processes do not notify the waiter, so the table is re-checked periodically
+            waiter = asyncio.get_running_loop().create_future()
+            self._change_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=min(remaining, CONFIG_CHANGE_LOG["poll_interval"]))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._change_waiters.discard(waiter)
+
+    async def _select_counts(self, table: str, entity_table: str, key_column: str, count_column: str, ids: List[str]):
+        resulting_counts = {}
+        async with self._connect() as db:
+            for ids_chunk in chunked(ids, 500):
+                placeholders = ", ".join("?" * len(ids_chunk))
+                cursor = await db.execute(f"SELECT {entity_table}.id, {count_column} FROM {entity_table} "
+                                          f"INNER JOIN {table} ON {table}.{key_column} = {entity_table}.row_id "
+                                          f"WHERE {entity_table}.id IN ({placeholders})", ids_chunk)
+                resulting_counts.update(await cursor.fetchall())
+
+                await cursor.close()
+
+        return resulting_counts
+
+    async def select_member_counts(self, team_ids: List[str]):
+        """
+        Select the materialized amount of members of a group of teams
+
+        :param team_ids: Ids of teams of interest
+        :return: A dict that maps each existing team id to its amount of members
+        """
+        return await self._select_counts("team_stats", "teams", "team_row_id", "member_count", team_ids)
+
+    async def select_team_counts(self, user_ids: List[str]):
+        """
+        Select the materialized amount of teams of a group of users
+
+        :param user_ids: Ids of users of interest
+        :return: A dict that maps each existing user id to the amount of teams where it is a member
+        """
+        return await self._select_counts("user_stats", "users", "user_row_id", "team_count", user_ids)
+
+    async def select_stats(self, top: int):
+        """
+        Select membership statistics from the materialized counts, without scanning team_members
+
+        :param top: Amount of largest teams to return
+        :return: Tuple with the largest teams, uses format [("id", "name", "description", member_count),...],
+                 the distribution of team sizes and the distribution of teams per user,
+                 both using format [(count, amount of teams or users with that count),...]
+        """
+        async with self._connect() as db:
+            cursor = await db.execute(('SELECT teams.id, teams.name, teams.description, team_stats.member_count '
+                                       'FROM team_stats INNER JOIN teams ON teams.row_id = team_stats.team_row_id '
+                                       'ORDER BY team_stats.member_count DESC LIMIT :top'), {"top": top})
+            largest_teams = await cursor.fetchall()
+            await cursor.close()
+            cursor = await db.execute('SELECT member_count, COUNT(*) FROM team_stats GROUP BY member_count')
+            team_size_distribution = await cursor.fetchall()
+            await cursor.close()
+            cursor = await db.execute('SELECT team_count, COUNT(*) FROM user_stats GROUP BY team_count')
+            user_team_count_distribution = await cursor.fetchall()
+            await cursor.close()
+
+        return largest_teams, team_size_distribution, user_team_count_distribution
+
+    @staticmethod
+    async def _import_rows(db, query: str, rows: List, errors: List):
+        """
+        Insert many rows with a single executemany. If any row violates a constraint, the whole statement is
+        rolled back to a savepoint and the rows are inserted one by one, reporting the error of each failed row
+
+        :param db: Connection holding the ongoing import transaction
+        :param query: Insert query with named parameters
+        :param rows: List of dicts with the parameters of every row
+        :param errors: List aligned with rows, where the error of every failed row is written
+        """
+        if not rows:
+            return
+
+        await db.execute("SAVEPOINT import_rows")
+        try:
+            await db.executemany(query, rows)
+        except IntegrityError:
+            await db.execute("ROLLBACK TO import_rows")
+            for position, row in enumerate(rows):
+                try:
+                    await db.execute(query, row)
+                except IntegrityError as e:
+                    errors[position] = f"Constraint conflict with the database: {e}"
+        await db.execute("RELEASE import_rows")
+
+    async def import_batch(self, users: List[ImportUser], teams: List[BaseTeam], memberships: List[Tuple[str, str]]):
+        """
+        Insert a batch of users, teams and memberships in a single transaction, in that order.
+        Rows that violate a constraint are skipped without affecting the rest of the batch
+
+        :param users: Pydantic models of the new users, with either a plain or an already hashed password
+        :param teams: Pydantic models of the new teams
+        :param memberships: Tuples of the new memberships, uses format ("id_team", "id_user")
+        :return: Tuple of three lists aligned with users, teams and memberships, with None for every
+                 imported row and the error message of every failed one
+        """
+        user_errors, team_errors, membership_errors = [None] * len(users), [None] * len(teams), [None] * len(memberships)
+        user_rows = [{"id": user.id, "name": user.name, "email": user.email,
+                      "password": user.password_hash or encrypt_string(user.password)} for user in users]
+        team_rows = [{"id": team.id, "name": team.name, "description": team.description} for team in teams]
+        membership_rows = [{"id_team": id_team, "id_user": id_user} for id_team, id_user in memberships]
+
+        created_at = time.time()
+        change_rows = []
+        async with self._connect() as db:
+            # Explicit transaction, otherwise releasing the savepoints of every table would commit them separately
+            await db.execute("BEGIN")
+            await self._import_rows(db, "INSERT INTO users (id, name, email, password) VALUES (:id, :name, :email, :password)",
+                                    user_rows, user_errors)
+            await self._import_rows(db, "INSERT INTO teams (id, name, description) VALUES (:id, :name, :description)",
+                                    team_rows, team_errors)
+            await self._import_rows(db, INSERT_MEMBERSHIP_QUERY, membership_rows, membership_errors)
+
+            for entity, rows, errors in (("user", user_rows, user_errors), ("team", team_rows, team_errors)):
+                change_rows.extend({"entity": entity, "entity_id": row["id"], "created_at": created_at,
+                                    "data": json.dumps({key: value for key, value in row.items() if key != "password"})}
+                                   for row, error in zip(rows, errors) if error is None)
+            change_rows.extend({"entity": "membership", "entity_id": f"{row['id_team']}:{row['id_user']}",
+                                "created_at": created_at, "data": json.dumps(row)}
+                               for row, error in zip(membership_rows, membership_errors) if error is None)
+            await db.executemany(("INSERT INTO changes (entity, entity_id, operation, data, created_at) "
+                                  "VALUES (:entity, :entity_id, 'insert', :data, :created_at)"), change_rows)
+            await db.commit()
+
+            membership_index = self._existing_membership_index()
+            if membership_index is not None:
+                for (id_team, id_user), error in zip(memberships, membership_errors):
+                    if error is None:
+                        membership_index.add(id_team, id_user)
+
+            if change_rows:
+                await self._changes_committed(db, len(change_rows))
+
+        return user_errors, team_errors, membership_errors
+
+    async def select_export_page(self, entity: str, after: Optional[Tuple], limit: int):
+        """
+        Select a page of records for exporting, using keyset pagination over the primary key of the table.
+        Memberships are ordered by user id and, within a user, by the row id of the team. The row id is part of
+        every membership row, so pages keep going even if the team of the last row is deleted in between
+
+        :param entity: One of "user", "team" or "membership"
+        :param after: Last row of the previous page, None for the first page
+        :param limit: Maximum amount of rows of the page
+        :return: A list of rows, uses format [("id", "name", "email", "password"),...] for users,
+                 [("id", "name", "description"),...] for teams and [("id_team", "id_user", team_row_id),...]
+                 for memberships
+        """
+        queries = {
+            "user": ('SELECT id, name, email, password FROM users', 'id > :id', 'id'),
+            "team": ('SELECT id, name, description FROM teams', 'id > :id', 'id'),
+            "membership": ('SELECT teams.id, users.id, team_members.team_row_id FROM users '
+                           'INNER JOIN team_members ON team_members.user_row_id = users.row_id '
+                           'INNER JOIN teams ON teams.row_id = team_members.team_row_id',
+                           '(users.id, team_members.team_row_id) > (:id_user, :team_row_id)',
+                           'users.id, team_members.team_row_id')
+        }
+        select_query, after_condition, order = queries[entity]
+        parameters = {"limit": limit}
+        if after is not None:
+            select_query = f"{select_query} WHERE {after_condition}"
+            parameters.update({"id": after[0]} if entity != "membership" else {"id_user": after[1], "team_row_id": after[2]})
+
+        async with self._connect() as db:
+            cursor = await db.execute(f"{select_query} ORDER BY {order} LIMIT :limit", parameters)
+            resulting_rows = await cursor.fetchall()
+
+            await cursor.close()
+
+        return resulting_rows
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+
+from api.modules.metrics import metrics
+from .sqlite_pool import SQLiteConnectionPool
+
+maintenance_last_run_gauge = metrics.gauge("sqlite_maintenance_last_run_timestamp",
+                                           "Unix timestamp of the last run of every maintenance operation")
+maintenance_duration_gauge = metrics.gauge("sqlite_maintenance_duration_seconds",
+                                           "Duration of the last run of every maintenance operation")
+wal_bytes_gauge = metrics.gauge("sqlite_wal_bytes", "Size of the WAL file at the last maintenance check")
+freelist_pages_gauge = metrics.gauge("sqlite_freelist_pages", "Free pages of the DB file at the last maintenance check")
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+logger = logging.getLogger("api.sqlite_maintenance")
+
+
+class SQLiteMaintenance:
+    """
+    Periodic maintenance of a SQLite file: statistics for the query planner, WAL checkpoints and release of free
+    pages. Checks run on a schedule and are skipped while the pool is busy, so maintenance happens in low traffic
+    """
+
+    def __init__(self, pool: SQLiteConnectionPool, config: dict):
+        self.pool = pool
+        self.config = config
+        self.status = {"last_check": None, "skipped": None, "wal_bytes": None, "freelist_pages": None,
+                       "page_count": None, "operations": {}}
+        self._last_analyze = time.time()  # The handler already runs ANALYZE on startup
+        self._task = None
+
+    async def _timed(self, operation: str, action):
+        started_at, started = time.time(), time.perf_counter()
+        detail = await action()
+        duration = time.perf_counter() - started
+        self.status["operations"][operation] = {"last_run": started_at, "duration": duration, "detail": detail}
+        maintenance_last_run_gauge.set(started_at, db_file=self.pool.db_file, operation=operation)
+        maintenance_duration_gauge.set(duration, db_file=self.pool.db_file, operation=operation)
+
+    @staticmethod
+    async def _pragma(db, pragma: str):
+        cursor = await db.execute(f"PRAGMA {pragma}")
+        row = await cursor.fetchone()
+        await cursor.close()
+        return row
+
+    async def run(self, force: bool = False):
+        """
+        Run the maintenance operations that are due
+
+        :param force: Run even if the pool is busy, run ANALYZE regardless of its interval and convert files
+                      without incremental auto-vacuum with a full VACUUM, which blocks every other connection
+        :return: The maintenance status after the run
+        """
+        self.status["last_check"] = time.time()
+        if not force and self.pool.in_flight > self.config["busy_threshold"]:
+            self.status["skipped"] = f"{self.pool.in_flight} connections in use"
+            return self.status
+        self.status["skipped"] = None
+
+        async with self.pool.acquire() as db:
+            async def optimize():
+                await db.executescript("PRAGMA optimize")
+            await self._timed("optimize", optimize)
+
+            if force or time.time() - self._last_analyze >= self.config["analyze_interval"]:
+                async def analyze():
+                    await db.execute(f"PRAGMA analysis_limit = {int(self.config['analysis_limit'])}")
+                    await db.execute("ANALYZE")
+                    await db.commit()
+                await self._timed("analyze", analyze)
+                self._last_analyze = time.time()
+
+            wal_file = f"{self.pool.db_file}-wal"
+            wal_bytes = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+            if wal_bytes > self.config["wal_checkpoint_bytes"]:
+                async def checkpoint():
+                    busy, log_frames, checkpointed_frames = await self._pragma(db, "wal_checkpoint(TRUNCATE)")
+                    return {"busy": bool(busy), "log_frames": log_frames, "checkpointed_frames": checkpointed_frames}
+                await self._timed("wal_checkpoint", checkpoint)
+                wal_bytes = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+
+            freelist_pages = (await self._pragma(db, "freelist_count"))[0]
+            page_count = (await self._pragma(db, "page_count"))[0]
+            if freelist_pages >= max(self.config["freelist_min_pages"], self.config["freelist_ratio"] * page_count):
+                if (await self._pragma(db, "auto_vacuum"))[0] == AUTO_VACUUM_INCREMENTAL:
+                    await self._timed("incremental_vacuum", lambda: self._incremental_vacuum(db, freelist_pages))
+                elif force:
+                    async def vacuum():
+                        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                        await db.execute("VACUUM")
+                    await self._timed("vacuum", vacuum)
+                else:
+                    self.status["skipped"] = "vacuum: auto_vacuum is not INCREMENTAL, run a forced maintenance"
+                    logger.warning("Skipping vacuum of %s, %d free pages: auto_vacuum is not INCREMENTAL and a full "
+                                   "VACUUM only runs on forced maintenance", self.pool.db_file, freelist_pages)
+                freelist_pages = (await self._pragma(db, "freelist_count"))[0]
+                page_count = (await self._pragma(db, "page_count"))[0]
+
+        self.status.update(wal_bytes=wal_bytes, freelist_pages=freelist_pages, page_count=page_count)
+        wal_bytes_gauge.set(wal_bytes, db_file=self.pool.db_file)
+        freelist_pages_gauge.set(freelist_pages, db_file=self.pool.db_file)
+        return self.status
+
+    async def _incremental_vacuum(self, db, freelist_pages: int):
+        released_pages = 0
+        while released_pages < freelist_pages:
+            # Through execute, the sqlite3 module steps the pragma once and releases a single page,
+            # executescript runs it to completion
+            await db.executescript(f"PRAGMA incremental_vacuum({int(self.config['vacuum_step_pages'])})")
+            released_pages += self.config["vacuum_step_pages"]
+            await asyncio.sleep(self.config["vacuum_step_sleep"])  # Lets writers in between steps
+        return {"released_pages": freelist_pages - (await self._pragma(db, "freelist_count"))[0]}
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.config["check_interval"])
+            try:
+                await self.run()
+            except Exception as e:
+                self.status["skipped"] = f"Failed: {e!r}"
+
+    def start(self):
+        if self.config["enabled"] and self._task is None:
+            self._task = asyncio.ensure_future(self._schedule())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,131 @@
+import asyncio
+import aiosqlite
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+
+class SQLiteConnectionPool:
+    """
+    Bounded pool of aiosqlite connections to a single SQLite file. Connections are opened lazily
+    (or eagerly through warm_up), configured once with the given pragmas and reused between calls.
+    When every connection is busy, callers wait in FIFO order until one is released
+    """
+
+    def __init__(self, db_file: str, max_size: int, pragmas: Dict[str, str]):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.in_flight = 0  # Amount of connections currently lent to callers
+        self._pragmas = pragmas
+        self._size = 0  # Amount of connections opened by the pool, idle or not
+        self._idle = deque()
+        self._waiters = deque()
+        self._closed = False
+
+    async def _open(self):
+        connection = aiosqlite.connect(self.db_file)
+        connection.daemon = True  # Idle connections must not keep the interpreter alive on exit
+        db = await connection
+
+        for name, value in self._pragmas.items():
+            await db.execute(f"PRAGMA {name} = {value}")
+
+        return db
+
+    async def _get(self):
+        if self._closed:
+            raise RuntimeError(f"Connection pool of {self.db_file} is closed")
+
+        if self._idle:
+            return self._idle.pop()
+
+        if self._size < self.max_size:
+            self._size += 1
+            try:
+                return await self._open()
+            except BaseException:
+                self._size -= 1
+                raise
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # The connection could have been handed over right before the cancellation arrived
+            if waiter.done() and not waiter.cancelled():
+                self._put(waiter.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _put(self, db):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(db)
+                return
+
+        self._idle.append(db)
+
+    async def _release(self, db):
+        try:
+            # A failed write leaves its implicit transaction open, which must not leak to the next caller
+            if db.in_transaction:
+                await db.rollback()
+        except Exception:
+            self._size -= 1
+            await db.close()
+            return
+
+        # While draining, connections are still handed over to callers that were already waiting for one
+        if self._closed and not any(not waiter.done() for waiter in self._waiters):
+            self._size -= 1
+            await db.close()
+        else:
+            self._put(db)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Lend a connection of the pool for the duration of the context
+        """
+        db = await self._get()
+        self.in_flight += 1
+        try:
+            yield db
+        finally:
+            self.in_flight -= 1
+            await self._release(db)
+
+    async def warm_up(self, size: int):
+        """
+        Open connections until the pool holds at least the given amount, so the first requests don't pay for it
+
+        :param size: Amount of connections to keep open, bounded by the maximum size of the pool
+        """
+        while self._size < min(size, self.max_size):
+            self._size += 1
+            try:
+                self._put(await self._open())
+            except BaseException:
+                self._size -= 1
+                raise
+
+    async def close(self, drain_timeout: float):
+        """
+        Stop lending connections, wait for the in-flight ones to be released and close every connection
+
+        :param drain_timeout: Maximum amount of seconds to wait for in-flight work
+        """
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        while (self.in_flight or self._waiters) and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+
+        while self._idle:
+            self._size -= 1
+            await self._idle.pop().close()
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import aiosqlite
+
+from .schema import ensure_schema
+
+# Benchmark of the membership storage layout: size and join speed of string keys vs integer row ids-------------
+
+# Layout of databases created before team_members stored integer row ids
+LEGACY_SCHEMA = [
+    ("CREATE TABLE users (id VARCHAR PRIMARY KEY UNIQUE NOT NULL, name VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+     "password VARCHAR NOT NULL) WITHOUT ROWID"),
+    ("CREATE TABLE teams (id VARCHAR PRIMARY KEY UNIQUE NOT NULL, name VARCHAR UNIQUE NOT NULL, "
+     "description NOT NULL) WITHOUT ROWID"),
+    ("CREATE TABLE team_members (id_user VARCHAR REFERENCES users (id) ON DELETE CASCADE NOT NULL, "
+     "id_team VARCHAR REFERENCES teams (id) ON DELETE CASCADE NOT NULL, PRIMARY KEY (id_user, id_team))"),
+    "CREATE INDEX team_members_id_team ON team_members (id_team, id_user)",
+]
+
+# Queries of select_team_members and select_user_teams for both layouts
+LOOKUP_QUERIES = {
+    "legacy": {
+        "team_members": ("SELECT users.id, users.name, users.email FROM users "
+                         "INNER JOIN team_members ON users.id = team_members.id_user "
+                         "WHERE team_members.id_team = :id_team ORDER BY users.id"),
+        "user_teams": ("SELECT teams.id, teams.name, teams.description FROM teams "
+                       "INNER JOIN team_members ON teams.id = team_members.id_team "
+                       "WHERE team_members.id_user = :id_user ORDER BY teams.id")
+    },
+    "integer_keys": {
+        "team_members": ("SELECT users.id, users.name, users.email FROM team_members "
+                         "INNER JOIN users ON users.row_id = team_members.user_row_id "
+                         "WHERE team_members.team_row_id = (SELECT row_id FROM teams WHERE id = :id_team) "
+                         "ORDER BY users.id"),
+        "user_teams": ("SELECT teams.id, teams.name, teams.description FROM team_members "
+                       "INNER JOIN teams ON teams.row_id = team_members.team_row_id "
+                       "WHERE team_members.user_row_id = (SELECT row_id FROM users WHERE id = :id_user) "
+                       "ORDER BY teams.id")
+    }
+}
+
+
+async def create_legacy_database(db_file: str, users: int, teams: int, teams_per_user: int, seed: int = 0):
+    """
+    Fill a new database with the legacy layout and random data
+
+    :return: Tuple with the lists of user ids and team ids
+    """
+    generator = random.Random(seed)
+    user_ids = [uuid.UUID(int=generator.getrandbits(128)).hex for _ in range(users)]
+    team_ids = [uuid.UUID(int=generator.getrandbits(128)).hex for _ in range(teams)]
+
+    async with aiosqlite.connect(db_file) as db:
+        for statement in LEGACY_SCHEMA:
+            await db.execute(statement)
+        await db.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                             [(user_id, f"User {user_id[:8]}", f"{user_id[:8]}@example.com", "x" * 64)
+                              for user_id in user_ids])
+        await db.executemany("INSERT INTO teams VALUES (?, ?, ?)",
+                             [(team_id, f"Team {team_id}", "A team") for team_id in team_ids])
+        await db.executemany("INSERT INTO team_members VALUES (?, ?)",
+                             [(user_id, team_id) for user_id in user_ids
+                              for team_id in generator.sample(team_ids, min(teams_per_user, teams))])
+        await db.commit()
+
+    return user_ids, team_ids
+
+
+async def measure(db_file: str, layout: str, user_ids: list, team_ids: list, lookups: int, seed: int = 0):
+    """
+    :return: Dict with the bytes used by every table and index of the memberships, the total file size and the
+             average time of the membership lookups
+    """
+    generator = random.Random(seed)
+    async with aiosqlite.connect(db_file) as db:
+        await db.execute("VACUUM")  # Compares layouts without the free pages left by the migration
+        cursor = await db.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY name")
+        object_sizes = {name: size for name, size in await cursor.fetchall()
+                        if name.startswith("team_members") or name.startswith("sqlite_autoindex_team_members")}
+        cursor = await db.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()")
+        file_size = (await cursor.fetchone())[0]
+        await cursor.close()
+
+        timings = {}
+        for lookup, query, key, ids in (("team_members", LOOKUP_QUERIES[layout]["team_members"], "id_team", team_ids),
+                                        ("user_teams", LOOKUP_QUERIES[layout]["user_teams"], "id_user", user_ids)):
+            sample = [generator.choice(ids) for _ in range(lookups)]
+            started = time.perf_counter()
+            for entity_id in sample:
+                cursor = await db.execute(query, {key: entity_id})
+                await cursor.fetchall()
+                await cursor.close()
+            timings[lookup] = (time.perf_counter() - started) / lookups
+
+    return {"membership_bytes": object_sizes, "file_bytes": file_size, "lookup_seconds": timings}
+
+
+async def run_benchmark(users: int, teams: int, teams_per_user: int, lookups: int):
+    """
+    Build a database with the legacy layout, measure it, migrate it with ensure_schema and measure it again
+
+    :return: Dict with the measures of both layouts and the duration of the migration
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "BenchmarkDB.db")
+        user_ids, team_ids = await create_legacy_database(db_file, users, teams, teams_per_user)
+        before = await measure(db_file, "legacy", user_ids, team_ids, lookups)
+
+        started = time.perf_counter()
+        async with aiosqlite.connect(db_file) as db:
+            await ensure_schema(db)
+        migration_seconds = time.perf_counter() - started
+
+        after = await measure(db_file, "integer_keys", user_ids, team_ids, lookups)
+
+    return {"parameters": {"users": users, "teams": teams, "teams_per_user": teams_per_user, "lookups": lookups},
+            "legacy": before, "integer_keys": after, "migration_seconds": migration_seconds}
+
+
+# Command line interface: python -m api.modules.database.storage_benchmark [--users N] ...
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the membership storage layouts")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--teams", type=int, default=2000)
+    parser.add_argument("--teams-per-user", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=2000)
+    arguments = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_benchmark(arguments.users, arguments.teams, arguments.teams_per_user,
+                                               arguments.lookups)), indent=2))
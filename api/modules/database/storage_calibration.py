@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+from api.modules.data_classes import UpdateUser
+from .config import CONFIG_SQLITE, CONFIG_SQLITE_PROFILES
+from .sqlite_database_handler import SQLiteDBHandler
+
+# Calibration of the storage tuning profiles: mixed workload on a copy of a real DB file, once per profile---------
+
+# Reads of the workload, picked uniformly: (DBHandler method, kind of the id it takes)
+READ_OPERATIONS = (("select_user", "user"), ("select_user_teams", "user"),
+                   ("select_team", "team"), ("select_team_members", "team"))
+
+# Amount of ids of every kind sampled from the DB file for the workload
+SAMPLED_IDS = 1000
+
+
+async def copy_database(source: str, target: str, page_size: int):
+    """
+    Copy a DB file with a consistent snapshot (even while other processes write to it), rebuilding the copy
+    with the given page size if the source uses another one
+    """
+    async with aiosqlite.connect(source) as db:
+        await db.execute("VACUUM INTO ?", (target,))
+
+    async with aiosqlite.connect(target) as db:
+        cursor = await db.execute("PRAGMA page_size")
+        current_page_size = (await cursor.fetchone())[0]
+        await cursor.close()
+        if current_page_size != page_size:
+            # The page size of a file can't change in WAL mode
+            await db.execute("PRAGMA journal_mode = DELETE")
+            await db.execute(f"PRAGMA page_size = {page_size}")
+            await db.execute("VACUUM")
+
+
+async def sample_ids(db_file: str, seed: int = 0):
+    """
+    :return: Dict with random samples of the user ids and team ids of the DB file
+    :raises ValueError: If the DB file has no users or no teams to run the workload on
+    """
+    async with aiosqlite.connect(db_file) as db:
+        sampled = {}
+        for kind, table in (("user", "users"), ("team", "teams")):
+            cursor = await db.execute(f"SELECT id FROM {table} ORDER BY id")
+            ids = [row[0] for row in await cursor.fetchall()]
+            await cursor.close()
+            if not ids:
+                raise ValueError(f"{db_file} has no {table} to calibrate with")
+            sampled[kind] = random.Random(seed).sample(ids, min(len(ids), SAMPLED_IDS))
+
+    return sampled
+
+
+def memory_estimate(profile: Dict, connections: int, file_bytes: int):
+    """
+    :return: Upper bound of the memory used by the page caches of the pool and the mapped part of the file, in bytes
+    """
+    cache_size = profile.get("cache_size", -2000)
+    cache_bytes = -cache_size * 1024 if cache_size < 0 else cache_size * profile.get("page_size", 4096)
+    return cache_bytes * connections + min(profile.get("mmap_size", 0), file_bytes)
+
+
+def percentile(latencies: List[float], fraction: float):
+    if not latencies:
+        return None
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+async def run_workload(db_file: str, profile: str, ids: Dict[str, List[str]], operations: int, concurrency: int,
+                       read_ratio: float, seed: int = 0):
+    """
+    Run a mix of reads and user updates on a DB file through a SQLiteDBHandler using the given profile. A tenth of
+    the operations run beforehand, untimed, to warm up the caches
+
+    :return: Dict with the throughput and the latency percentiles (in seconds) of reads and writes
+    """
+    generator = random.Random(seed)
+    db_handler = SQLiteDBHandler(db_file=db_file, pool_max_size=concurrency, profile=profile)
+    await db_handler.startup()
+
+    def next_operation():
+        if generator.random() < read_ratio:
+            method, kind = generator.choice(READ_OPERATIONS)
+            return "read", getattr(db_handler, method)(generator.choice(ids[kind]))
+        user_id = generator.choice(ids["user"])
+        return "write", db_handler.update_user(user_id, UpdateUser(name=f"Calibrated {generator.getrandbits(32)}"))
+
+    latencies = {"read": [], "write": []}
+    remaining = 0
+
+    async def worker(record: bool):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            kind, call = next_operation()
+            started = time.perf_counter()
+            await call
+            if record:
+                latencies[kind].append(time.perf_counter() - started)
+
+    try:
+        remaining = operations // 10
+        await asyncio.gather(*(worker(False) for _ in range(concurrency)))
+
+        remaining = operations
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await db_handler.shutdown()
+
+    return {
+        "operations_per_second": operations / elapsed,
+        **{f"{kind}_p50_seconds": percentile(latencies[kind], 0.5) for kind in latencies},
+        **{f"{kind}_p99_seconds": percentile(latencies[kind], 0.99) for kind in latencies}
+    }
+
+
+def recommend(results: Dict[str, Dict], memory_budget: Optional[int] = None):
+    """
+    :param memory_budget: Maximum memory estimate in bytes, None for no limit
+    :return: Name of the fastest profile within the memory budget, the one with the lowest estimate if none fits
+    """
+    within_budget = [name for name, result in results.items()
+                     if memory_budget is None or result["memory_estimate_bytes"] <= memory_budget]
+    if not within_budget:
+        return min(results, key=lambda name: results[name]["memory_estimate_bytes"])
+    return max(within_budget, key=lambda name: results[name]["operations_per_second"])
+
+
+async def calibrate(db_file: str, profiles: Optional[List[str]] = None, operations: int = 5000,
+                    concurrency: int = 4, read_ratio: float = 0.9, memory_budget: Optional[int] = None,
+                    seed: int = 0):
+    """
+    Benchmark the tuning profiles on a DB file and the current machine. Every profile runs the same workload on
+    a fresh copy of the file, stored next to it so the copies live on the same disk, so the original is never
+    modified
+
+    :param profiles: Names of the profiles to compare, every profile of CONFIG_SQLITE_PROFILES by default
+    :param operations: Amount of timed operations per profile
+    :param concurrency: Amount of concurrent callers, and of pooled connections
+    :param read_ratio: Fraction of the operations that are reads, the rest are user updates
+    :param memory_budget: Maximum memory estimate of the recommended profile in bytes, None for no limit
+    :return: Dict with the results of every profile and the name of the recommended one
+    """
+    profiles = profiles or list(CONFIG_SQLITE_PROFILES)
+    for name in profiles:
+        if name not in CONFIG_SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite tuning profile '{name}'")
+
+    ids = await sample_ids(db_file, seed)
+    file_bytes = os.path.getsize(db_file)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_file))) as directory:
+        for name in profiles:
+            profile = CONFIG_SQLITE_PROFILES[name]
+            copy_file = os.path.join(directory, f"{name}.db")
+            await copy_database(db_file, copy_file, profile.get("page_size", 4096))
+            results[name] = await run_workload(copy_file, name, ids, operations, concurrency, read_ratio, seed)
+            results[name]["memory_estimate_bytes"] = memory_estimate(profile, concurrency, file_bytes)
+
+    return {"db_file": db_file,
+            "parameters": {"operations": operations, "concurrency": concurrency, "read_ratio": read_ratio,
+                           "memory_budget": memory_budget},
+            "profiles": results,
+            "recommended": recommend(results, memory_budget)}
+
+
+# Command line interface: python -m api.modules.database.storage_calibration [--db-file FILE] ...
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite tuning profiles and recommend one")
+    parser.add_argument("--db-file", default=CONFIG_SQLITE["production"]["db_file"])
+    parser.add_argument("--profiles", nargs="+", choices=list(CONFIG_SQLITE_PROFILES))
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--read-ratio", type=float, default=0.9)
+    parser.add_argument("--memory-budget-mb", type=int)
+    arguments = parser.parse_args()
+
+    memory_budget_bytes = arguments.memory_budget_mb * 1024 * 1024 if arguments.memory_budget_mb else None
+    print(json.dumps(asyncio.run(calibrate(arguments.db_file, arguments.profiles, arguments.operations,
+                                           arguments.concurrency, arguments.read_ratio, memory_budget_bytes)),
+                     indent=2))
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import re
+import time
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable
+from api.modules.admission import AdmissionLimiter
+from api.modules.metrics import metrics
+from .database_handler import DBHandler
+
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+open_tenants_gauge = metrics.gauge("tenant_databases_open", "Tenant databases with a warm connection pool")
+tenant_evictions_counter = metrics.counter("tenant_databases_evicted_total", "Tenant databases closed by the router")
+
+
+class _TenantEntry:
+    __slots__ = ("handler", "limiter", "leases", "last_used")
+
+    def __init__(self, handler: DBHandler, limiter: AdmissionLimiter):
+        self.handler = handler
+        self.limiter = limiter
+        self.leases = 0  # Calls currently using the handler, tenants with leases are never evicted
+        self.last_used = time.monotonic()
+
+
+class TenantRouter:
+    """
+    Routes DB calls of every tenant to its own SQLite file. Handlers are opened lazily on the first call of a
+    tenant and kept in an LRU bounded by max_open_tenants; opening one more tenant closes the least recently used
+    tenant without calls in flight, and tenants idle for idle_timeout seconds are closed in the background. Every
+    tenant gets a small connection pool and a concurrency limiter, so a single busy tenant can't take every
+    thread and file descriptor of the process
+    """
+
+    def __init__(self, config: dict, handler_factory: Callable[[str], DBHandler]):
+        """
+        :param config: Tenancy configuration, see CONFIG_TENANTS
+        :param handler_factory: Builds the handler of a tenant from the path of its DB file
+        """
+        self.config = config
+        self._handler_factory = handler_factory
+        self._open = OrderedDict()  # Entries of the open tenants, least recently used first
+        self._closing = set()  # Tasks closing evicted handlers
+        self._idle_task = None
+
+    def db_file(self, tenant_id: str):
+        """
+        :raises ValueError: If the tenant id isn't made of letters, digits, "-" and "_" (up to 64 characters)
+        :return: Path of the DB file of a tenant
+        """
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise ValueError(f"Invalid tenant id '{tenant_id}'")
+        return os.path.join(self.config["directory"], f"{tenant_id}.db")
+
+    def get(self, tenant_id: str) -> DBHandler:
+        """
+        Get the handler of a tenant. The handler holds no resources, the tenant DB is opened by its first call
+
+        :raises ValueError: If the tenant id is invalid
+        """
+        self.db_file(tenant_id)
+        return TenantDBHandler(self, tenant_id)
+
+    @property
+    def open_tenants(self):
+        return list(self._open)
+
+    def _open_tenant(self, tenant_id: str):
+        db_file = self.db_file(tenant_id)
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        entry = _TenantEntry(self._handler_factory(db_file),
+                             AdmissionLimiter("tenant", self.config["max_concurrency"], self.config["max_queue"],
+                                              self.config["queue_timeout"], track_gauges=False))
+        self._open[tenant_id] = entry
+
+        # When every open tenant has calls in flight the LRU grows over its bound until they finish
+        for candidate_id in [key for key in self._open if key != tenant_id]:
+            if len(self._open) <= self.config["max_open_tenants"]:
+                break
+            if self._open[candidate_id].leases == 0:
+                self._evict(candidate_id)
+
+        open_tenants_gauge.set(len(self._open))
+        return entry
+
+    def _evict(self, tenant_id: str):
+        entry = self._open.pop(tenant_id)
+        task = asyncio.ensure_future(entry.handler.shutdown())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        tenant_evictions_counter.inc()
+        open_tenants_gauge.set(len(self._open))
+
+    @asynccontextmanager
+    async def lease(self, tenant_id: str):
+        """
+        Lend the handler of a tenant for the duration of the context, opening the tenant if needed
+
+        :raises AdmissionRejected: If the tenant is at its concurrency cap and its queue is full or too slow
+        """
+        entry = self._open.get(tenant_id)
+        if entry is None:
+            entry = self._open_tenant(tenant_id)
+        else:
+            self._open.move_to_end(tenant_id)
+
+        entry.leases += 1
+        try:
+            await entry.limiter.acquire()
+            try:
+                yield entry.handler
+            finally:
+                entry.limiter.release()
+        finally:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+
+    def evict_idle(self):
+        """
+        Close every tenant without calls in flight that has been idle for longer than the idle timeout
+
+        :return: Ids of the closed tenants
+        """
+        deadline = time.monotonic() - self.config["idle_timeout"]
+        idle_tenants = [tenant_id for tenant_id, entry in self._open.items()
+                        if entry.leases == 0 and entry.last_used <= deadline]
+        for tenant_id in idle_tenants:
+            self._evict(tenant_id)
+        return idle_tenants
+
+    async def _evict_idle_periodically(self):
+        while True:
+            await asyncio.sleep(self.config["idle_check_interval"])
+            self.evict_idle()
+
+    async def startup(self):
+        if self._idle_task is None:
+            self._idle_task = asyncio.ensure_future(self._evict_idle_periodically())
+
+    async def shutdown(self):
+        """
+        Stop the idle eviction task and close every open tenant
+        """
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            await asyncio.gather(self._idle_task, return_exceptions=True)
+            self._idle_task = None
+
+        for tenant_id in list(self._open):
+            self._evict(tenant_id)
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+class TenantDBHandler(DBHandler):
+    """
+    Database handler of a single tenant. Every call leases the tenant handler from the router, so tenants are
+    never closed in the middle of a call and the per-tenant concurrency cap applies to every call
+    """
+
+    def __init__(self, router: TenantRouter, tenant_id: str):
+        self.router = router
+        self.tenant_id = tenant_id
+
+
+def _leased_method(name: str):
+    async def leased_method(self, *args, **kwargs):
+        async with self.router.lease(self.tenant_id) as handler:
+            return await getattr(handler, name)(*args, **kwargs)
+
+    leased_method.__name__ = name
+    return leased_method
+
+
+# Every method of the DBHandler interface is leased the same way. Startup and shutdown are left to the router
+for _name in DBHandler.__abstractmethods__:
+    setattr(TenantDBHandler, _name, _leased_method(_name))
+# Abstract methods are computed when the class is created, before the loop above implemented them
+TenantDBHandler.__abstractmethods__ = frozenset()
@@ -0,0 +1,28 @@
+from api.modules.tracing import Tracer
+from .database_handler import DBHandler
+from .wrapper_database_handler import DBHandlerWrapper
+
+
+class TracingDBHandler(DBHandlerWrapper):
+    """
+    Database handler that records a span for every call to the wrapped handler, named after the called method.
+    Calls made outside of a sampled trace go straight to the wrapped handler
+    """
+
+    def __init__(self, inner: DBHandler, tracer: Tracer):
+        super().__init__(inner)
+        self.tracer = tracer
+
+
+def _traced_method(name: str):
+    async def traced_method(self, *args, **kwargs):
+        with self.tracer.span(f"db.{name}", handler=type(self.inner).__name__):
+            return await getattr(self.inner, name)(*args, **kwargs)
+
+    traced_method.__name__ = name
+    return traced_method
+
+
+# Every method of the DBHandler interface is traced the same way
+for _name in DBHandler.__abstractmethods__:
+    setattr(TracingDBHandler, _name, _traced_method(_name))
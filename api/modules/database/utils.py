@@ -26,3 +26,16 @@ def generate_sql_update_set_formatted_string(keys_list: List[str]):
     """
 
     return ", ".join([f"{key} = :{key}" for key in keys_list])
+
+
+def chunked(items: List, size: int):
+    """
+    Utility function for splitting a list in consecutive chunks, used for keeping the amount of
+    parameters of a single SQL query under the limit of the database engine
+
+    :param items: List to split
+    :param size: Maximum length of every chunk
+    :return: A generator of lists with at most size elements each
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,100 @@
+from typing import List, Optional, Tuple
+from api.modules.data_classes import UpdateTeam, BaseTeam, UpdateUser, InUser, ImportUser
+from .database_handler import DBHandler
+
+
+class DBHandlerWrapper(DBHandler):
+    """
+    Base class for database handlers that add behavior on top of another handler. Every method
+    delegates to the wrapped handler, so subclasses only override the methods they care about
+    """
+
+    def __init__(self, inner: DBHandler):
+        self.inner = inner
+
+    async def startup(self):
+        await self.inner.startup()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def select_user(self, user_id: str):
+        return await self.inner.select_user(user_id=user_id)
+
+    async def select_users(self):
+        return await self.inner.select_users()
+
+    async def insert_user(self, new_user: InUser):
+        return await self.inner.insert_user(new_user=new_user)
+
+    async def update_user(self, user_id: str, new_data: UpdateUser):
+        return await self.inner.update_user(user_id=user_id, new_data=new_data)
+
+    async def delete_user(self, user_id: str):
+        return await self.inner.delete_user(user_id=user_id)
+
+    async def delete_users(self, user_ids: List[str]):
+        return await self.inner.delete_users(user_ids=user_ids)
+
+    async def select_team(self, team_id: str):
+        return await self.inner.select_team(team_id=team_id)
+
+    async def select_teams(self):
+        return await self.inner.select_teams()
+
+    async def insert_team(self, new_team: BaseTeam):
+        return await self.inner.insert_team(new_team=new_team)
+
+    async def update_team(self, team_id: str, new_data: UpdateTeam):
+        return await self.inner.update_team(team_id=team_id, new_data=new_data)
+
+    async def delete_team(self, team_id: str):
+        return await self.inner.delete_team(team_id=team_id)
+
+    async def delete_teams(self, team_ids: List[str]):
+        return await self.inner.delete_teams(team_ids=team_ids)
+
+    async def select_user_teams(self, user_id: str):
+        return await self.inner.select_user_teams(user_id=user_id)
+
+    async def select_team_members(self, team_id: str):
+        return await self.inner.select_team_members(team_id=team_id)
+
+    async def select_teammates(self, user_id: str, limit: int):
+        return await self.inner.select_teammates(user_id=user_id, limit=limit)
+
+    async def select_shared_teams(self, user_id: str, other_user_id: str, limit: int):
+        return await self.inner.select_shared_teams(user_id=user_id, other_user_id=other_user_id, limit=limit)
+
+    async def select_team_set_members(self, union: List[str], intersect: List[str], exclude: List[str], limit: int):
+        return await self.inner.select_team_set_members(union=union, intersect=intersect, exclude=exclude, limit=limit)
+
+    async def insert_team_member(self, team_id: str, user_id: str):
+        return await self.inner.insert_team_member(team_id=team_id, user_id=user_id)
+
+    async def sync_team_members(self, team_id: str, user_ids: List[str]):
+        return await self.inner.sync_team_members(team_id=team_id, user_ids=user_ids)
+
+    async def delete_team_member(self, team_id: str, user_id: str):
+        return await self.inner.delete_team_member(team_id=team_id, user_id=user_id)
+
+    async def delete_team_members(self, team_id: str, limit: int):
+        return await self.inner.delete_team_members(team_id=team_id, limit=limit)
+
+    async def select_changes(self, since: int, limit: int, wait: float = 0):
+        return await self.inner.select_changes(since=since, limit=limit, wait=wait)
+
+    async def select_member_counts(self, team_ids: List[str]):
+        return await self.inner.select_member_counts(team_ids=team_ids)
+
+    async def select_team_counts(self, user_ids: List[str]):
+        return await self.inner.select_team_counts(user_ids=user_ids)
+
+    async def select_stats(self, top: int):
+        return await self.inner.select_stats(top=top)
+
+    async def import_batch(self, users: List[ImportUser], teams: List[BaseTeam], memberships: List[Tuple[str, str]]):
+        return await self.inner.import_batch(users=users, teams=teams, memberships=memberships)
+
+    async def select_export_page(self, entity: str, after: Optional[Tuple], limit: int):
+        return await self.inner.select_export_page(entity=entity, after=after, limit=limit)
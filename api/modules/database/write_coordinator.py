@@ -0,0 +1,278 @@
+import asyncio
+import fcntl
+import inspect
+import json
+import os
+import random
+
+from pydantic import BaseModel
+from api.modules.data_classes import InUser, UpdateUser, BaseTeam, UpdateTeam, ImportUser
+from api.modules.metrics import metrics
+from .config import CONFIG_MEMBERSHIP_INDEX
+from .database_handler import DBHandler, DBHandlerException, WRITE_METHODS
+from .wrapper_database_handler import DBHandlerWrapper
+
+# Maximum size of a single message on the writer socket, large enough for the biggest import batches
+MESSAGE_LIMIT = 256 * 1024 * 1024
+
+# Models that travel as arguments of forwarded writes, indexed by class name
+_MODELS = {model.__name__: model for model in (InUser, UpdateUser, BaseTeam, UpdateTeam, ImportUser)}
+
+is_writer_gauge = metrics.gauge("write_coordinator_is_writer", "1 if this process is the elected DB writer")
+writer_elections_counter = metrics.counter("write_coordinator_elections_total",
+                                           "Times this process was elected as the DB writer")
+forwarded_writes_counter = metrics.counter("write_coordinator_forwarded_total",
+                                           "Writes forwarded to the writer process")
+
+
+class WriterUnavailable(Exception):
+    """
+    Raised when a write can't be handed over to the writer process, or when the connection to the writer is lost
+    before its reply arrives (in which case the write may or may not have been applied)
+    """
+    pass
+
+
+def encode_value(value):
+    """
+    Encode arguments and results of DBHandler writes as JSON-compatible values, keeping tuples and models apart
+    from lists and dicts so they are decoded back to the same types
+    """
+    if isinstance(value, BaseModel):
+        return {"__model__": type(value).__name__, "fields": value.dict()}
+    if isinstance(value, tuple):
+        return {"__tuple__": [encode_value(item) for item in value]}
+    if isinstance(value, list):
+        return [encode_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    if isinstance(value, dict):
+        if "__model__" in value:
+            return _MODELS[value["__model__"]].parse_obj(value["fields"])
+        if "__tuple__" in value:
+            return tuple(decode_value(item) for item in value["__tuple__"])
+        return {key: decode_value(item) for key, item in value.items()}
+    return value
+
+
+class WriteCoordinator:
+    """
+    Elects a single writer among the worker processes that share a DB file. The writer holds an exclusive flock on
+    the lock file and runs every write on its own handler, serving the writes of the other workers on a Unix socket
+    (one JSON message per line). The OS releases the lock when the writer dies, so the next worker that tries to
+    take it (periodically or after failing to reach the writer) becomes the new writer
+    """
+
+    def __init__(self, config: dict, handler: DBHandler):
+        """
+        :param config: Coordination configuration, see CONFIG_WRITE_COORDINATION
+        :param handler: Handler that runs the writes while this process is the writer
+        """
+        self.config = config
+        self.handler = handler
+        self._lock_fd = None
+        self._server = None
+        self._election_lock = asyncio.Lock()
+        self._election_task = None
+
+    @property
+    def is_writer(self):
+        return self._server is not None
+
+    async def try_become_writer(self):
+        """
+        Take the writer role if no other process holds it
+
+        :return: True if this process is the writer
+        """
+        async with self._election_lock:
+            if self.is_writer:
+                return True
+
+            if self._lock_fd is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.config["lock_file"])), exist_ok=True)
+                self._lock_fd = os.open(self.config["lock_file"], os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            # Holding the lock proves the previous writer is gone, so its socket file is stale
+            socket_path = self.config["socket_path"]
+            try:
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
+                self._server = await asyncio.start_unix_server(self._serve, path=socket_path, limit=MESSAGE_LIMIT)
+                os.chmod(socket_path, 0o600)
+            except BaseException:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                raise
+
+            os.ftruncate(self._lock_fd, 0)
+            os.pwrite(self._lock_fd, str(os.getpid()).encode(), 0)
+            writer_elections_counter.inc()
+            is_writer_gauge.set(1)
+            return True
+
+    async def _elect_periodically(self):
+        while True:
+            await asyncio.sleep(self.config["election_interval"])
+            try:
+                await self.try_become_writer()
+            except OSError:
+                pass  # Tried again on the next interval
+
+    async def start(self):
+        await self.try_become_writer()
+        if self._election_task is None:
+            self._election_task = asyncio.ensure_future(self._elect_periodically())
+
+    async def stop(self):
+        """
+        Stop taking part in elections and give up the writer role, letting another worker take it
+        """
+        if self._election_task is not None:
+            self._election_task.cancel()
+            await asyncio.gather(self._election_task, return_exceptions=True)
+            self._election_task = None
+
+        async with self._election_lock:
+            if self._server is not None:
+                self._server.close()
+                await self._server.wait_closed()
+                self._server = None
+                if os.path.exists(self.config["socket_path"]):
+                    os.unlink(self.config["socket_path"])
+                is_writer_gauge.set(0)
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)  # Closing the file releases the lock
+                self._lock_fd = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._execute(json.loads(line))
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass  # Broken connections and oversized messages end the connection, the client sees it closed
+        finally:
+            writer.close()
+
+    async def _execute(self, request: dict):
+        method = request.get("method")
+        if method not in WRITE_METHODS:
+            return {"error": "failed", "detail": f"Unknown write method '{method}'"}
+
+        try:
+            result = await getattr(self.handler, method)(**decode_value(request["arguments"]))
+        except DBHandlerException:
+            return {"error": "constraint"}
+        except Exception as e:
+            return {"error": "failed", "detail": repr(e)}
+
+        return {"result": encode_value(result)}
+
+    async def forward(self, method: str, arguments: dict):
+        """
+        Run a write on the writer process, which is this one if it holds the writer role. While no writer is
+        reachable, connecting is retried with jittered backoff for up to forward_timeout seconds, trying to take
+        the writer role on every attempt
+
+        :param method: Name of the DBHandler write method
+        :param arguments: Keyword arguments of the write
+        :raises WriterUnavailable: If no writer could be reached, or the writer was lost before replying
+        :return: Result of the write
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config["forward_timeout"]
+        attempt = 0
+        while True:
+            if self.is_writer:
+                return await getattr(self.handler, method)(**arguments)
+
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.config["socket_path"], limit=MESSAGE_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionError):
+                if await self.try_become_writer():
+                    continue
+                attempt += 1
+                if loop.time() >= deadline:
+                    raise WriterUnavailable(f"No DB writer reachable at {self.config['socket_path']}")
+                await asyncio.sleep(random.uniform(0, min(0.5, 0.01 * 2 ** attempt)))
+
+        forwarded_writes_counter.inc(method=method)
+        try:
+            writer.write(json.dumps({"method": method, "arguments": encode_value(arguments)}).encode() + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        except ConnectionError as e:
+            raise WriterUnavailable(f"Connection to the DB writer lost during {method}") from e
+        finally:
+            writer.close()
+
+        if not line:
+            raise WriterUnavailable(f"Connection to the DB writer lost during {method}")
+
+        response = json.loads(line)
+        if response.get("error") == "constraint":
+            raise DBHandlerException()
+        if "error" in response:
+            raise RuntimeError(f"Forwarded {method} failed in the DB writer: {response.get('detail')}")
+        return decode_value(response["result"])
+
+
+class CoordinatedDBHandler(DBHandlerWrapper):
+    """
+    Database handler for one of several worker processes sharing a DB file. Reads run on the wrapped handler of
+    every worker, writes go to the wrapped handler of the elected writer (see WriteCoordinator), so a single
+    process writes to the file and workers don't fight over its lock
+    """
+
+    def __init__(self, inner: DBHandler, config: dict):
+        """
+        :param config: Coordination configuration, see CONFIG_WRITE_COORDINATION
+        """
+        super().__init__(inner)
+        self.coordinator = WriteCoordinator(config, inner)
+
+    async def startup(self):
+        """
+        :raises ValueError: If the membership index is enabled, since it would miss the writes of the other workers
+        """
+        if CONFIG_MEMBERSHIP_INDEX["enabled"]:
+            raise ValueError("CONFIG_MEMBERSHIP_INDEX can't be enabled along with CONFIG_WRITE_COORDINATION: "
+                             "the index of every worker would miss the writes run by the other workers")
+        await self.inner.startup()
+        await self.coordinator.start()
+
+    async def shutdown(self):
+        await self.coordinator.stop()
+        await self.inner.shutdown()
+
+
+def _coordinated_method(name: str):
+    signature = inspect.signature(getattr(DBHandler, name))
+
+    async def coordinated_method(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        del arguments["self"]
+        return await self.coordinator.forward(name, arguments)
+
+    coordinated_method.__name__ = name
+    return coordinated_method
+
+
+# Every write of the DBHandler interface goes through the writer the same way, reads are delegated as they are
+for _name in WRITE_METHODS:
+    setattr(CoordinatedDBHandler, _name, _coordinated_method(_name))
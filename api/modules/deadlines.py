@@ -0,0 +1,205 @@
+import asyncio
+import contextvars
+
+from typing import Callable, Dict, Optional
+from starlette.routing import Match
+from api.modules.metrics import metrics
+
+# Per-request deadlines, cancelled when they expire or the client disconnects--------------------------------
+
+_current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+cancelled_requests_counter = metrics.counter("request_deadline_cancellations_total",
+                                             "Requests whose deadline expired or whose client disconnected")
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised by DB calls made after the deadline of their request was cancelled, or interrupted by its cancellation
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+
+
+class Deadline:
+    """
+    Cancellation state shared by the DB calls of a request. It is cancelled once, either by its timer ("deadline")
+    or explicitly (e.g. "disconnect"), and then runs every registered callback, like the ones that interrupt the
+    running SQLite statements
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        :param timeout: Seconds until the deadline is cancelled by itself, None for no time limit
+        """
+        self.reason = None
+        self._callbacks = []
+        self._timer = None
+        if timeout is not None:
+            self._timer = asyncio.get_running_loop().call_later(timeout, self.cancel, "deadline")
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def cancel(self, reason: str):
+        if self.reason is not None:
+            return
+        self.reason = reason
+        self.close()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(reason)
+
+    def close(self):
+        """
+        Stop the timer, for requests that are already answered
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def on_cancel(self, callback: Callable[[str], None]):
+        """
+        Run a callback with the reason of the cancellation when the deadline is cancelled, right away if it already is
+
+        :return: Function that unregisters the callback
+        """
+        if self.reason is not None:
+            callback(self.reason)
+            return lambda: None
+
+        self._callbacks.append(callback)
+        return lambda: self._callbacks.remove(callback) if callback in self._callbacks else None
+
+    def check(self):
+        """
+        :raises DeadlineExceeded: If the deadline is cancelled
+        """
+        if self.reason is not None:
+            raise DeadlineExceeded(self.reason)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+async def run_with_deadline(deadline: Optional[Deadline], coroutine):
+    """
+    Await a coroutine under another deadline (None for none). Meant to be wrapped in a new task, like background
+    work started by a request that must outlive it, since tasks start with a copy of the deadline of their creator
+    """
+    _current_deadline.set(deadline)
+    return await coroutine
+
+
+async def wait_within_deadline(task: asyncio.Future):
+    """
+    Wait for a task until it is done or the current deadline is cancelled, without cancelling the task
+
+    :raises DeadlineExceeded: If the current deadline was cancelled before the task was done
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await asyncio.shield(task)
+
+    cancelled = asyncio.get_running_loop().create_future()
+    remove_callback = deadline.on_cancel(lambda reason: cancelled.done() or cancelled.set_result(reason))
+    try:
+        await asyncio.wait({task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        remove_callback()
+
+    if not task.done():
+        raise DeadlineExceeded(cancelled.result())
+    return task.result()
+
+
+class DeadlineConnection:
+    """
+    Proxy of an aiosqlite connection that refuses to start statements once the deadline of the request is
+    cancelled. Any other attribute is taken from the proxied connection
+    """
+
+    def __init__(self, db, deadline: Deadline):
+        self._db = db
+        self._deadline = deadline
+
+    def __getattr__(self, name: str):
+        return getattr(self._db, name)
+
+    async def execute(self, sql: str, parameters=None):
+        self._deadline.check()
+        return await self._db.execute(sql, parameters)
+
+    async def executemany(self, sql: str, parameters):
+        self._deadline.check()
+        return await self._db.executemany(sql, parameters)
+
+    async def commit(self):
+        self._deadline.check()
+        return await self._db.commit()
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives every HTTP request the deadline configured for its endpoint and cancels it when the
+    client disconnects. The request messages are pumped in the background so the disconnect is seen while the
+    endpoint is still running, even by endpoints that never read their body
+    """
+
+    def __init__(self, app, config: Dict, router):
+        self.app = app
+        self.config = config
+        self.router = router
+
+    def _timeout(self, scope):
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return self.config["endpoints"].get(f"{scope['method']} {route.path}", self.config["default"])
+        return self.config["default"]
+
+    async def __call__(self, scope, receive, send):
+        if not self.config["enabled"] or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        deadline = Deadline(self._timeout(scope))
+        messages = asyncio.Queue(maxsize=1)  # Bounded, so bodies are still read at the pace of the endpoint
+        disconnected = False
+        response_complete = False
+
+        async def pump_messages():
+            nonlocal disconnected
+            while not disconnected:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected = True
+                    # Servers also report a disconnect once the response is complete, which is no cancellation
+                    if not response_complete:
+                        deadline.cancel("disconnect")
+                await messages.put(message)
+
+        async def pumped_receive():
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def deadline_send(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        pump = asyncio.ensure_future(pump_messages())
+        token = _current_deadline.set(deadline)
+        try:
+            await self.app(scope, pumped_receive, deadline_send)
+        finally:
+            _current_deadline.reset(token)
+            pump.cancel()
+            deadline.close()
+            if deadline.cancelled:
+                cancelled_requests_counter.inc(reason=deadline.reason)
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import uuid
+
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+from api.modules.bulk import read_file_chunks, parse_csv, parse_ndjson, import_records
+from api.modules.data_classes import ImportSummary
+from api.modules.database import DBHandler
+from api.modules.database.job_store import SQLiteJobStore
+from api.modules.deadlines import run_with_deadline
+from api.modules.metrics import metrics
+
+# In-process background jobs, persisted in the DB file so they survive restarts-----------------------
+
+jobs_counter = metrics.counter("jobs_total", "Background jobs that reached a final status")
+running_jobs_gauge = metrics.gauge("jobs_running", "Background jobs currently running")
+
+# Signature of job handlers: (DB handler, job parameters, saved state or None, checkpoint) -> result
+JobHandler = Callable[[DBHandler, dict, Optional[dict], Callable[..., Awaitable]], Awaitable[dict]]
+
+
+async def delete_records_job(db_handler: DBHandler, parameters: dict, state: Optional[dict], checkpoint):
+    """
+    Delete users or teams in chunks, each chunk in its own transaction. The memberships of every team are deleted
+    in chunks beforehand, so large teams don't delete all of them by cascade in a single transaction
+
+    :param parameters: Dict with the "entity" ("user" or "team"), the "ids" to delete and the "chunk_size"
+    :param state: Dict with the "position" of the next chunk and the amount of records "deleted" so far
+    """
+    ids = parameters["ids"]
+    delete = db_handler.delete_users if parameters["entity"] == "user" else db_handler.delete_teams
+    state = state or {"position": 0, "deleted": 0}
+
+    while state["position"] < len(ids):
+        chunk = ids[state["position"]:state["position"] + parameters["chunk_size"]]
+        if parameters["entity"] == "team":
+            for team_id in chunk:
+                while await db_handler.delete_team_members(team_id, parameters["chunk_size"]):
+                    await checkpoint(state, state["position"], len(ids))
+        state["deleted"] += len(await delete(chunk))
+        state["position"] += len(chunk)
+        await checkpoint(state, state["position"], len(ids))
+
+    return {"deleted": state["deleted"]}
+
+
+async def import_job(db_handler: DBHandler, parameters: dict, state: Optional[dict], checkpoint):
+    """
+    Import a spooled NDJSON or CSV file. Every batch is checkpointed, so a resumed job skips the lines that
+    were already written. The spooled file is deleted once the import ends, but kept when the job is cancelled
+    by a stop so it can be resumed
+
+    :param parameters: Dict with the "path" of the spooled file, its "format" and the "batch_size"
+    :param state: Dict with the last fully processed "line" and the "summary" so far
+    """
+    state = state or {"line": 0, "summary": None}
+    summary = ImportSummary(**state["summary"]) if state["summary"] else None
+    parse = parse_csv if parameters["format"] == "csv" else parse_ndjson
+
+    async def pending_rows():
+        async for row in parse(read_file_chunks(parameters["path"])):
+            if row[0] > state["line"]:
+                yield row
+
+    async def on_flush(line_number: int, partial_summary: ImportSummary):
+        state["line"], state["summary"] = line_number, partial_summary.dict()
+        await checkpoint(state, partial_summary.processed)
+
+    try:
+        summary = await import_records(pending_rows(), db_handler, parameters["batch_size"], summary, on_flush)
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        _remove_spooled_file(parameters["path"])
+        raise
+
+    _remove_spooled_file(parameters["path"])
+    return summary.dict()
+
+
+def _remove_spooled_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "delete_records": delete_records_job,
+    "import": import_job
+}
+
+
+class JobManager:
+    """
+    Runs background jobs with bounded concurrency. Every job is stored before it is queued and checkpoints
+    its progress while it runs; jobs that were queued or running when the app stopped are resumed on start.
+    Jobs run against the DB backend chosen when they were submitted, resolved through db_handler_getter
+    """
+
+    def __init__(self, store: SQLiteJobStore, db_handler_getter: Callable[[str], DBHandler], max_concurrency: int,
+                 chunk_pause: float, handlers: Dict[str, JobHandler] = None):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.chunk_pause = chunk_pause
+        self._db_handler_getter = db_handler_getter
+        self._handlers = handlers if handlers is not None else JOB_HANDLERS
+        self._pending = deque()
+        self._running = {}  # Tasks of the running jobs indexed by job id
+        self._stopping = False
+
+    async def start(self):
+        """
+        Queue again every job that was queued or running when the app stopped
+        """
+        self._stopping = False
+        self._pending.extend(job_id for job_id in await self.store.unfinished()
+                             if job_id not in self._running and job_id not in self._pending)
+        self._schedule()
+
+    async def submit(self, kind: str, parameters: dict, db_choice: str):
+        """
+        Store a new job and queue it
+
+        :param kind: Name of the handler of the job
+        :param parameters: JSON serializable parameters of the handler
+        :param db_choice: Name of the DB backend the job runs against
+        :return: Id of the new job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = uuid.uuid4().hex
+        await self.store.insert(job_id, kind, {**parameters, "db_choice": db_choice})
+        self._pending.append(job_id)
+        self._schedule()
+        return job_id
+
+    async def get(self, job_id: str):
+        return await self.store.get(job_id)
+
+    def _schedule(self):
+        while self._pending and len(self._running) < self.max_concurrency and not self._stopping:
+            job_id = self._pending.popleft()
+            # Jobs outlive the request that submitted them, so they don't run under its deadline
+            task = asyncio.ensure_future(run_with_deadline(None, self._run(job_id)))
+            self._running[job_id] = task
+            task.add_done_callback(lambda _, job_id=job_id: self._job_done(job_id))
+        running_jobs_gauge.set(len(self._running))
+
+    def _job_done(self, job_id: str):
+        self._running.pop(job_id, None)
+        self._schedule()
+
+    async def _run(self, job_id: str):
+        job = await self.store.get(job_id)
+        await self.store.update(job_id, status="running")
+
+        async def checkpoint(state: dict, progress_done: int, progress_total: int = None):
+            await self.store.update(job_id, state=state, progress_done=progress_done, progress_total=progress_total)
+            await asyncio.sleep(self.chunk_pause)  # Leaves room for interactive requests between chunks
+
+        db_handler = self._db_handler_getter(job["parameters"]["db_choice"])
+        try:
+            result = await self._handlers[job["kind"]](db_handler, job["parameters"], job["state"], checkpoint)
+        except asyncio.CancelledError:
+            raise  # Left as running, so the job is resumed on next start
+        except Exception as e:
+            await self.store.update(job_id, status="failed", error=repr(e))
+            jobs_counter.inc(kind=job["kind"], status="failed")
+            return
+
+        await self.store.update(job_id, status="succeeded", result=result)
+        jobs_counter.inc(kind=job["kind"], status="succeeded")
+
+    async def stop(self):
+        """
+        Stop every running job, keeping its last checkpoint for resuming it on next start
+        """
+        self._stopping = True
+        self._pending.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.close()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from collections import deque
+from .metrics import metrics
+
+# Event loop lag measurement and detection of callbacks that block the loop-------------------------------
+
+logger = logging.getLogger("api.loop_monitor")
+
+loop_lag_histogram = metrics.histogram("event_loop_lag_seconds", "Delay of the event loop heartbeat over its interval",
+                                       buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+loop_lag_gauge = metrics.gauge("event_loop_lag_last_seconds", "Delay of the last event loop heartbeat")
+blocked_counter = metrics.counter("event_loop_blocked_total", "Times a callback blocked the event loop over the threshold")
+
+
+class LoopLagMonitor:
+    """
+    Measures the event loop lag with a heartbeat task that sleeps for a fixed interval: any delay of its wake-up
+    is time the loop spent running other callbacks. A watchdog thread checks the heartbeat; when it stops for
+    longer than the block threshold, the stack of the loop thread is captured while the blocking code still runs,
+    logged and kept among the most recent reports. Costs a timer per interval in the loop and a sleeping thread
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.reports = deque(maxlen=config["max_reports"])
+        self._last_beat = time.monotonic()
+        self._beat = 0  # Increases with every heartbeat, so a single stall is reported only once
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    async def _heartbeat(self):
+        interval = self.config["interval"]
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            loop_lag_histogram.observe(lag)
+            loop_lag_gauge.set(lag)
+            self._last_beat = now
+            self._beat += 1
+
+    def _watch(self):
+        interval, threshold = self.config["interval"], self.config["block_threshold"]
+        reported_beat = None
+        while not self._stopped.wait(min(interval, threshold) / 2):
+            beat, blocked_for = self._beat, time.monotonic() - self._last_beat - interval
+            if blocked_for < threshold or beat == reported_beat:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_beat = beat
+            stack = "".join(traceback.format_stack(frame, limit=self.config["stack_limit"]))
+            del frame
+            self.reports.append({"detected_at": time.time(), "blocked_for": blocked_for, "stack": stack})
+            blocked_counter.inc()
+            logger.warning("Event loop blocked for at least %.3f seconds, stack of the blocking code:\n%s",
+                           blocked_for, stack)
+
+    def start(self):
+        """
+        Start the heartbeat task in the running loop and the watchdog thread
+        """
+        if not self.config["enabled"] or self._task is not None:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._watchdog.join()
+        self._task = self._watchdog = None
+
+    def status(self):
+        """
+        :return: Dict with the lag of the last heartbeat and the most recent blocking reports, oldest first
+        """
+        return {"last_lag": loop_lag_gauge.value(), "blocked_total": blocked_counter.value(),
+                "reports": list(self.reports)}
@@ -0,0 +1,145 @@
+import bisect
+import threading
+
+from typing import Callable, Dict, Iterable, Tuple
+
+# Minimal in-process metrics registry, rendered in the Prometheus text exposition format------------
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """
+    Monotonically increasing value, optionally split by labels
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down, optionally split by labels
+    """
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """
+    Distribution of observed values, counted in cumulative buckets and optionally split by labels
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str,
+                 buckets: Iterable[float] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}  # Per labels: [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(sorted(labels.items())))
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        for key, counts in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key + (("le", "+Inf" if bound == float("inf") else repr(bound)),), cumulative
+            yield f"{self.name}_count", key, cumulative
+            yield f"{self.name}_sum", key, counts[-1]
+
+
+class MetricsRegistry:
+    """
+    Collection of named metrics. Asking twice for the same name returns the same metric
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register_collector(self, collector: Callable[[], None]):
+        """
+        Register a callback that refreshes metrics that are too expensive to keep updated on every change.
+        Collectors are called right before rendering
+
+        :param collector: Function without arguments that updates the values of some metrics
+        """
+        self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def _get_or_create(self, metric_class, name: str, description: str, **kwargs):
+        if name not in self._metrics:
+            self._metrics[name] = metric_class(name, description, **kwargs)
+        return self._metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, **kwargs) -> Histogram:
+        return self._get_or_create(Histogram, name, description, **kwargs)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format
+
+        :return: String with the current value of every metric
+        """
+        for collector in self._collectors:
+            collector()
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the whole app
+metrics = MetricsRegistry()
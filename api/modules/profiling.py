@@ -0,0 +1,214 @@
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+# On-demand profiling of single requests and continuous low-rate stack sampling-----------------------------
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+
+def _profile_name(kind: str, extension: str):
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    return f"{kind}-{timestamp}-{uuid.uuid4().hex[:8]}.{extension}"
+
+
+def _write_profile(directory: str, name: str, content: str):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "w") as profile_file:
+        profile_file.write(content)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles single requests on demand. Requests carrying a valid admin token and an X-Profile
+    header with value "cpu" (function-level cumulative time, through cProfile) or "alloc" (lines that allocated
+    the most memory, through tracemalloc) are profiled; the report is stored in the profiles directory and its
+    name returned in the X-Profile-File response header. Profilers are process-wide, so only one request is
+    profiled at a time and the report also covers anything else the loop ran meanwhile
+    """
+
+    def __init__(self, app, config: dict, admin_config: dict):
+        self.app = app
+        self.config = config
+        self.admin_config = admin_config
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        kind = headers.get(PROFILE_HEADER, b"").decode("latin-1").strip().lower()
+        token = self.admin_config["token"]
+        if (kind not in ("cpu", "alloc") or self._active or token is None
+                or headers.get(b"x-admin-token", b"").decode("latin-1") != token):
+            return await self.app(scope, receive, send)
+
+        name = _profile_name(kind, "txt")
+
+        async def send_with_profile_name(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_FILE_HEADER, name.encode("latin-1"))]
+            await send(message)
+
+        self._active = True
+        try:
+            if kind == "cpu":
+                report = await self._profile_cpu(scope, receive, send_with_profile_name)
+            else:
+                report = await self._profile_allocations(scope, receive, send_with_profile_name)
+        finally:
+            self._active = False
+
+        await asyncio.get_running_loop().run_in_executor(None, _write_profile, self.config["directory"], name,
+                                                         f"{scope['method']} {scope['path']}\n\n{report}")
+
+    # The profilers are imported on first use, most workers never profile a request
+    async def _profile_cpu(self, scope, receive, send):
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(self.config["top_entries"])
+        return output.getvalue()
+
+    async def _profile_allocations(self, scope, receive, send):
+        import tracemalloc
+
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(self.config["alloc_frames"])
+        before = tracemalloc.take_snapshot()
+        try:
+            await self.app(scope, receive, send)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+        # Allocations of tracemalloc itself would otherwise top the report
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        statistics = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        return "\n".join(str(statistic) for statistic in statistics[:self.config["top_entries"]])
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Continuous low-rate sampler of the event loop thread. A daemon thread reads the loop stack every sampling
+    interval and counts identical stacks; every flush interval the counts are written in the folded stacks
+    format ("outer;...;inner count" per line), which flamegraph.pl, speedscope and similar tools render
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._stacks = Counter()
+        self._loop_thread_id = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            with self._lock:
+                self._stacks[";".join(reversed(labels))] += 1
+
+    def flush(self):
+        """
+        Write the stacks sampled since the last flush to a new file of the profiles directory
+
+        :return: Name of the written file, None if there were no samples
+        """
+        with self._lock:
+            stacks, self._stacks = self._stacks, Counter()
+        if not stacks:
+            return None
+
+        name = _profile_name("stacks", "folded")
+        _write_profile(self.config["directory"], name,
+                       "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())))
+        return name
+
+    def _run(self):
+        next_flush = time.monotonic() + self.config["sampler_flush_interval"]
+        while not self._stopped.wait(self.config["sampler_interval"]):
+            self._sample()
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.config["sampler_flush_interval"]
+
+    def start(self):
+        """
+        Start sampling the thread that calls this method, which must be the one running the event loop
+        """
+        if self._thread is not None:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and write the pending samples. Waits for the sampler thread and writes a file, so the event
+        loop runs it through an executor
+
+        :return: Name of the last written file, None if there were no pending samples
+        """
+        if self._thread is None:
+            return None
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        return self.flush()
+
+
+def list_profiles(directory: str):
+    """
+    :return: Names of the stored profiles, newest first
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.listdir(directory), key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+
+
+def load_profile(directory: str, name: str) -> Optional[str]:
+    """
+    :return: Content of a stored profile, None if there is no profile with that name
+    """
+    profile_path = os.path.join(directory, os.path.basename(name))
+    if not os.path.isfile(profile_path):
+        return None
+    with open(profile_path) as profile_file:
+        return profile_file.read()
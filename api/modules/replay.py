@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.parse
+
+from typing import Dict, List
+from httpx import AsyncClient
+from api.modules.capture import SCRUBBED_VALUE
+
+# Replay of captured traffic against the ASGI app, with per-route latency reports----------------------
+
+REPLAYED_SECRET = "replayed-secret"
+
+
+def load_capture(path: str) -> List[Dict]:
+    """
+    :return: Captured records ordered by arrival time
+    """
+    with open(path) as capture_file:
+        records = [json.loads(line) for line in capture_file if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def _restore_secrets(value):
+    if value == SCRUBBED_VALUE:
+        return REPLAYED_SECRET
+    if isinstance(value, dict):
+        return {key: _restore_secrets(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore_secrets(item) for item in value]
+    return value
+
+
+def build_request(record: Dict):
+    """
+    Rebuild a request from a captured record. Scrubbed secrets are replaced by a fixed value
+
+    :return: Tuple with format (method, URL, JSON body or None), None if the body can't be rebuilt
+    """
+    if record["body_size"] and record["body"] is None:
+        return None
+
+    if record["route"] is not None:
+        path = record["route"].format(**{key: urllib.parse.quote(str(value), safe="")
+                                         for key, value in record["path_params"].items()})
+    else:
+        path = record["path"]
+    query = "&".join(f"{key}={REPLAYED_SECRET if value == SCRUBBED_VALUE else value}" for key, value in record["query"])
+    return record["method"], f"{path}?{query}" if query else path, _restore_secrets(record["body"])
+
+
+def route_key(record: Dict):
+    return f"{record['method']} {record['route'] or record['path']}"
+
+
+async def replay(app, records: List[Dict], speed: float = 1.0, headers: Dict[str, str] = None):
+    """
+    Play captured requests back against an ASGI app, keeping the original gaps between them divided by speed.
+    A speed of 0 sends every request as soon as possible
+
+    :param app: ASGI app under test
+    :param records: Captured records ordered by arrival time
+    :param speed: Time compression factor, 1 keeps the original timing and N plays N times faster
+    :param headers: Extra headers for every request, like an admin token
+    :return: A list of results, one dict per replayed request with its route, status and latency
+    """
+    results = []
+
+    async def send(client: AsyncClient, record: Dict, delay: float):
+        await asyncio.sleep(delay)
+        request = build_request(record)
+        if request is None:
+            results.append({"route": route_key(record), "status": None, "latency": None, "skipped": True})
+            return
+
+        method, url, body = request
+        started = time.perf_counter()
+        response = await client.request(method, url, json=body, headers=headers)
+        results.append({"route": route_key(record), "status": response.status_code,
+                        "latency": time.perf_counter() - started, "skipped": False})
+
+    if not records:
+        return results
+
+    first_ts = records[0]["ts"]
+    async with AsyncClient(app=app, base_url="http://replay") as client:
+        await asyncio.gather(*(send(client, record, (record["ts"] - first_ts) / speed if speed else 0)
+                               for record in records))
+
+    return results
+
+
+def _percentile(values: List[float], fraction: float):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(results: List[Dict]):
+    """
+    Aggregate replay results per route
+
+    :return: Dict indexed by route with the request count, errors (5xx), skipped requests and latency percentiles
+    """
+    summary = {}
+    for route in sorted({result["route"] for result in results}):
+        route_results = [result for result in results if result["route"] == route]
+        latencies = [result["latency"] for result in route_results if not result["skipped"]]
+        summary[route] = {
+            "count": len(route_results),
+            "errors": sum(1 for result in route_results if result["status"] is not None and result["status"] >= 500),
+            "skipped": sum(1 for result in route_results if result["skipped"]),
+            "mean": statistics.mean(latencies) if latencies else None,
+            "p50": _percentile(latencies, 0.5) if latencies else None,
+            "p95": _percentile(latencies, 0.95) if latencies else None,
+            "p99": _percentile(latencies, 0.99) if latencies else None
+        }
+    return summary
+
+
+def compare(baseline: Dict, candidate: Dict):
+    """
+    Compare the summaries of two replays of the same capture, typically from two builds
+
+    :return: Dict indexed by route with the p50/p95/p99 latencies of both builds and their ratio (candidate/baseline)
+    """
+    comparison = {}
+    for route in sorted(set(baseline) | set(candidate)):
+        comparison[route] = {}
+        for metric in ("p50", "p95", "p99"):
+            before = baseline.get(route, {}).get(metric)
+            after = candidate.get(route, {}).get(metric)
+            comparison[route][metric] = {"baseline": before, "candidate": after,
+                                         "ratio": after / before if before and after is not None else None}
+    return comparison
+
+
+async def _replay_app(capture: str, speed: float, headers: Dict[str, str]):
+    from api.app import app
+
+    await app.router.startup()
+    try:
+        return summarize(await replay(app, load_capture(capture), speed, headers))
+    finally:
+        await app.router.shutdown()
+
+
+# Command line interface: python -m api.modules.replay {run,compare} ...
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latencies between builds")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    run_parser = subparsers.add_parser("run", help="Replay a capture against the app of this checkout")
+    run_parser.add_argument("capture", help="Path of the capture file")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor, 0 for no delays")
+    run_parser.add_argument("--admin-token", help="X-Admin-Token sent with every request")
+    run_parser.add_argument("--output", help="Path where the per-route summary is written as JSON")
+    compare_parser = subparsers.add_parser("compare", help="Compare the summaries of two replays")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    arguments = parser.parse_args()
+
+    if arguments.action == "run":
+        summary = asyncio.run(_replay_app(arguments.capture, arguments.speed,
+                                          {"x-admin-token": arguments.admin_token} if arguments.admin_token else None))
+        output = json.dumps(summary, indent=2)
+        if arguments.output:
+            with open(arguments.output, "w") as output_file:
+                output_file.write(output)
+        print(output)
+    else:
+        with open(arguments.baseline) as baseline_file, open(arguments.candidate) as candidate_file:
+            comparison = compare(json.load(baseline_file), json.load(candidate_file))
+        for route, metrics in comparison.items():
+            ratios = ", ".join(f"{metric} x{values['ratio']:.2f}" if values["ratio"] is not None else f"{metric} n/a"
+                               for metric, values in metrics.items())
+            print(f"{route}: {ratios}")
@@ -0,0 +1,116 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from typing import Dict
+from fastapi import FastAPI
+from api.modules.config import CONFIG_STARTUP, ROOT_PATH
+
+# Fast cold start of worker processes: OpenAPI document built ahead of time and startup measurement-----------------
+
+# Run in a fresh interpreter by measure_startup. httpx is imported before the clock starts since only the
+# benchmark needs it
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+from httpx import AsyncClient
+
+started = time.perf_counter()
+from api.app import app
+imported = time.perf_counter()
+
+async def first_request():
+    async with AsyncClient(app=app, base_url="http://startup") as client:
+        return (await client.get(sys.argv[1])).status_code
+
+status_code = asyncio.run(first_request())
+answered = time.perf_counter()
+print(json.dumps({"status_code": status_code, "import_seconds": imported - started,
+                  "first_request_seconds": answered - imported}))
+"""
+
+
+def write_openapi_document(app: FastAPI, openapi_file: str):
+    """
+    Build the OpenAPI document of an app from its routes and store it, for use_prebuilt_openapi
+    """
+    app.openapi_schema = None  # Built again even if the app already serves a prebuilt document
+    with open(openapi_file, "w") as document:
+        json.dump(FastAPI.openapi(app), document, indent=2)
+        document.write("\n")
+
+
+def use_prebuilt_openapi(app: FastAPI, openapi_file: str):
+    """
+    Serve the OpenAPI document of an app from a file written by write_openapi_document, which is much faster to
+    read than building the document from the routes. Missing files fall back to building it
+    """
+    build_openapi = app.openapi
+
+    def prebuilt_openapi():
+        if app.openapi_schema is None:
+            try:
+                with open(openapi_file) as document:
+                    app.openapi_schema = json.load(document)
+            except FileNotFoundError:
+                return build_openapi()
+        return app.openapi_schema
+
+    app.openapi = prebuilt_openapi
+
+
+def measure_startup(optimized: bool, runs: int = 5, path: str = "/openapi.json"):
+    """
+    Start the app in fresh interpreters, run from a directory outside the repository, and time the import of the
+    app and its first request
+
+    :param optimized: Whether to start in startup-optimized mode
+    :param runs: Amount of interpreters started, the median of every measure is reported
+    :param path: Path requested by the first request
+    :return: Dict with the median import, first request and total time in seconds
+    """
+    environment = {**os.environ, "API_STARTUP_OPTIMIZED": "1" if optimized else "0",
+                   "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT_PATH), os.environ.get("PYTHONPATH")]))}
+    measures = []
+    for _ in range(runs):
+        probe = subprocess.run([sys.executable, "-c", STARTUP_PROBE, path], env=environment, cwd=tempfile.gettempdir(),
+                               capture_output=True, text=True, check=True)
+        measure = json.loads(probe.stdout.splitlines()[-1])
+        if measure["status_code"] != 200:
+            raise RuntimeError(f"First request to {path} answered with {measure['status_code']}")
+        measures.append(measure)
+
+    import_seconds = statistics.median(measure["import_seconds"] for measure in measures)
+    first_request_seconds = statistics.median(measure["first_request_seconds"] for measure in measures)
+    return {"import_seconds": import_seconds, "first_request_seconds": first_request_seconds,
+            "total_seconds": statistics.median(measure["import_seconds"] + measure["first_request_seconds"]
+                                               for measure in measures)}
+
+
+def run_benchmark(runs: int = 5, path: str = "/openapi.json") -> Dict:
+    """
+    :return: Dict with the startup measures of both modes and the configured budget
+    """
+    return {"default": measure_startup(False, runs, path), "optimized": measure_startup(True, runs, path),
+            "budget_seconds": CONFIG_STARTUP["budget_seconds"]}
+
+
+# Command line interface: python -m api.modules.startup {build-openapi,benchmark} ...
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build time steps and measures of the startup of the API")
+    parser.add_argument("action", choices=["build-openapi", "benchmark"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/openapi.json")
+    arguments = parser.parse_args()
+
+    if arguments.action == "build-openapi":
+        from api.app import app
+
+        write_openapi_document(app, CONFIG_STARTUP["openapi_file"])
+        print(f"OpenAPI document written to {CONFIG_STARTUP['openapi_file']}")
+    else:
+        print(json.dumps(run_benchmark(arguments.runs, arguments.path), indent=2))
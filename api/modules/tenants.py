@@ -0,0 +1,31 @@
+from typing import Dict
+
+# Resolution of the tenant of every request, for routing its DB calls to the tenant database-------------------
+
+
+class TenantMiddleware:
+    """
+    ASGI middleware that finds the tenant of every HTTP request, either in the tenant header or in a path prefix
+    like /tenants/{tenant_id}/users. The prefix is stripped so the request matches the same routes as without
+    tenancy, and the tenant id is stored in scope["tenant"] (None for requests without a tenant)
+    """
+
+    def __init__(self, app, config: Dict):
+        self.app = app
+        self.header = config["header"].lower().encode("latin-1")
+        self.path_prefix = config["path_prefix"].rstrip("/") + "/"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        tenant_id = dict(scope["headers"]).get(self.header, b"").decode("latin-1").strip() or None
+        path = scope["path"]
+        if path.startswith(self.path_prefix):
+            tenant_id, _, remaining_path = path[len(self.path_prefix):].partition("/")
+            prefix_length = len(self.path_prefix) + len(tenant_id)
+            scope = {**scope, "path": "/" + remaining_path,
+                     "raw_path": scope.get("raw_path", path.encode("latin-1"))[prefix_length:] or b"/",
+                     "root_path": scope.get("root_path", "") + path[:prefix_length]}
+
+        await self.app({**scope, "tenant": tenant_id}, receive, send)
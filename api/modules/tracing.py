@@ -0,0 +1,307 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import re
+import time
+
+from contextlib import contextmanager
+from typing import List, Optional
+from fastapi.routing import APIRoute
+from api.modules.buffered_writer import BufferedLineWriter
+from api.modules.config import CONFIG_TRACING
+
+# Lightweight request tracing, compatible with W3C trace context headers----------------------------------
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Span that is currently open in the running task, None when the request is not sampled
+_current_span = contextvars.ContextVar("current_span", default=None)
+# Start and end timestamps of the endpoint function of the current request, set by TracedRoute
+_endpoint_marks = contextvars.ContextVar("endpoint_marks", default=None)
+
+
+class Span:
+    """
+    Timed operation inside a trace. Spans of the same trace share the list where they are collected once finished
+    """
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "finished_spans")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, finished_spans: list, start: float = None,
+                 **attributes):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start if start is not None else time.time()
+        self.end = None
+        self.attributes = attributes
+        self.finished_spans = finished_spans
+
+    def finish(self, end: float = None):
+        self.end = end if end is not None else time.time()
+        self.finished_spans.append(self)
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                "start": self.start, "duration": self.end - self.start, "attributes": self.attributes}
+
+
+class SpanExporter:
+    """
+    Destination of finished traces. Subclasses must implement export
+    """
+
+    def export(self, spans: List[Span]):
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Deliver the spans exported so far and release the resources of the exporter
+        """
+        pass
+
+
+class JSONLinesExporter(SpanExporter):
+    """
+    Appends every span to a file as a JSON object per line. Spans are buffered in memory and written every
+    flush_interval seconds off the event loop, so requests never wait on the file
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self._writer = BufferedLineWriter(path, flush_interval)
+
+    def export(self, spans: List[Span]):
+        self._writer.write("".join(json.dumps(span.to_dict()) + "\n" for span in spans))
+
+    async def close(self):
+        await self._writer.close()
+
+
+class InMemoryExporter(SpanExporter):
+    """
+    Keeps every finished span in a list, useful for tests and debugging
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+
+def parse_traceparent(header: Optional[str]):
+    """
+    Parse a W3C traceparent header
+
+    :return: Tuple with format ("trace id", "parent span id", sampled), None if the header is missing or invalid
+    """
+    match = TRACEPARENT_PATTERN.match(header.strip().lower()) if header else None
+    if match is None or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class Tracer:
+    """
+    Creates spans for sampled requests. Unsampled requests don't hold any span, so every instrumentation
+    point costs a context variable lookup and nothing else
+    """
+
+    def __init__(self, exporter: SpanExporter = None, sample_rate: float = 0.0, honor_parent_sampling: bool = True):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.honor_parent_sampling = honor_parent_sampling
+
+    def configure(self, exporter: SpanExporter = None, sample_rate: float = None, honor_parent_sampling: bool = None):
+        if exporter is not None:
+            self.exporter = exporter
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if honor_parent_sampling is not None:
+            self.honor_parent_sampling = honor_parent_sampling
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: str = None, **attributes):
+        """
+        Open the root span of a request, continuing the trace of the caller if a traceparent header is given.
+        The whole trace is exported when the root span finishes
+
+        :param name: Name of the root span
+        :param traceparent: Value of the incoming traceparent header, if any
+        :return: Context manager yielding the root span, or None if the request is not sampled
+        """
+        parent = parse_traceparent(traceparent)
+        if parent is not None and self.honor_parent_sampling:
+            sampled = parent[2]
+        else:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled or self.exporter is None:
+            yield None
+            return
+
+        trace_id = parent[0] if parent is not None else f"{random.getrandbits(128):032x}"
+        span = Span(trace_id, parent[1] if parent is not None else None, name, [], **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self.exporter.export(span.finished_spans)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Open a child span of the current span
+
+        :return: Context manager yielding the new span, or None if there is no sampled trace in progress
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(parent.trace_id, parent.span_id, name, parent.finished_spans, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    def record(self, name: str, start: float, end: float, **attributes):
+        """
+        Add an already finished child span to the current span, for operations that are measured
+        from timestamps instead of wrapped in a context manager
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            Span(parent.trace_id, parent.span_id, name, parent.finished_spans, start, **attributes).finish(end)
+
+
+class TracedConnection:
+    """
+    Proxy of an aiosqlite connection that records a span for every statement. Any other attribute
+    is taken from the proxied connection
+    """
+
+    def __init__(self, db, tracer: Tracer):
+        self._db = db
+        self._tracer = tracer
+
+    def __getattr__(self, name: str):
+        return getattr(self._db, name)
+
+    async def execute(self, sql: str, parameters=None):
+        with self._tracer.span("sql.execute", statement=sql):
+            return await self._db.execute(sql, parameters)
+
+    async def executemany(self, sql: str, parameters):
+        with self._tracer.span("sql.executemany", statement=sql):
+            return await self._db.executemany(sql, parameters)
+
+    async def commit(self):
+        with self._tracer.span("sql.commit"):
+            return await self._db.commit()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens the root span of every sampled HTTP request
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        with self.tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent, method=scope["method"],
+                                     path=scope["path"]) as span:
+            if span is None:
+                return await self.app(scope, receive, send)
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.attributes["status_code"] = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"traceparent", f"00-{span.trace_id}-{span.span_id}-01".encode("latin-1"))]
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class that splits sampled requests in three spans: request validation (including dependencies),
+    the endpoint function and response serialization. Time of the endpoint span that isn't covered by its
+    DB spans goes to building the response models
+    """
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def traced_endpoint(**values):
+                marks = _endpoint_marks.get()
+                if marks is None:
+                    return await endpoint(**values)
+
+                marks["start"] = time.time()
+                try:
+                    with tracer.span("endpoint", function=endpoint.__name__):
+                        return await endpoint(**values)
+                finally:
+                    marks["end"] = time.time()
+
+            self.dependant.call = traced_endpoint
+
+        handler = super().get_route_handler()
+        route_path = self.path
+
+        async def traced_handler(request):
+            root_span = tracer.current_span()
+            if root_span is None:
+                return await handler(request)
+
+            root_span.attributes["route"] = route_path
+            marks = {}
+            token = _endpoint_marks.set(marks)
+            started = time.time()
+            try:
+                return await handler(request)
+            finally:
+                _endpoint_marks.reset(token)
+                if "start" in marks:
+                    tracer.record("request.validation", started, marks["start"])
+                    tracer.record("response.serialization", marks["end"], time.time())
+
+        return traced_handler
+
+
+def build_exporter(config: dict) -> Optional[SpanExporter]:
+    if config["exporter"] == "jsonl":
+        return JSONLinesExporter(config["file"], config["flush_interval"])
+    return None
+
+
+# Tracer shared by the whole app
+tracer = Tracer(build_exporter(CONFIG_TRACING), CONFIG_TRACING["sample_rate"], CONFIG_TRACING["honor_parent_sampling"])
@@ -0,0 +1,113 @@
+import gzip
+import sqlite3
+import threading
+import pytest
+
+from api.modules.database.backup import create_snapshot, list_snapshots, apply_retention, restore_snapshot, \
+    BackupManager, backup_restarts_counter, backup_single_pass_counter
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_fake_db(db_file: str):
+    db = sqlite3.connect(db_file)
+    with db:
+        db.execute("CREATE TABLE teams (id VARCHAR PRIMARY KEY, name VARCHAR)")
+        db.execute(("CREATE TABLE changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, entity VARCHAR, entity_id VARCHAR, "
+                    "operation VARCHAR, data VARCHAR, created_at REAL)"))
+        db.executemany("INSERT INTO teams VALUES (?, ?)", [(f"faketeam{i}", f"name{i}") for i in range(1000)])
+        db.execute("INSERT INTO changes (entity, entity_id, operation, created_at) VALUES ('team', 'faketeam0', 'insert', 0)")
+    db.close()
+
+
+def select_all(db_file: str, query: str):
+    db = sqlite3.connect(db_file)
+    rows = db.execute(query).fetchall()
+    db.close()
+    return rows
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_create_snapshot_and_retention(tmp_path):
+    db_file = str(tmp_path / "FakeDB.db")
+    backups_directory = str(tmp_path / "backups")
+    create_fake_db(db_file)
+
+    snapshots = [create_snapshot(db_file, backups_directory, pages_per_step=1, step_sleep=0) for _ in range(3)]
+    expired = apply_retention(db_file, backups_directory, retention=2)
+
+    assert all(snapshot.endswith(".db.gz") for snapshot in snapshots)
+    assert expired == snapshots[:1]
+    assert list_snapshots(db_file, backups_directory) == snapshots[1:]
+
+
+def test_create_snapshot_caps_restarts_under_constant_writes(tmp_path):
+    db_file = str(tmp_path / "FakeDB.db")
+    create_fake_db(db_file)
+    select_all(db_file, "PRAGMA journal_mode = WAL")  # Like the DB files of the app, writers never wait for the backup
+    writing, writes_stopped = threading.Event(), threading.Event()
+
+    def write_constantly():
+        db = sqlite3.connect(db_file)
+        index = 0
+        while not writes_stopped.is_set():
+            with db:
+                db.execute("INSERT INTO changes (entity, entity_id, operation, created_at) VALUES ('team', ?, 'update', 0)",
+                           (f"faketeam{index % 1000}",))
+            writing.set()
+            index += 1
+        db.close()
+
+    restarts, single_passes = backup_restarts_counter.value(), backup_single_pass_counter.value()
+    writer = threading.Thread(target=write_constantly)
+    writer.start()
+    writing.wait()
+    try:
+        snapshot = create_snapshot(db_file, str(tmp_path / "backups"), pages_per_step=1, step_sleep=0.001,
+                                   max_restarts=2)
+    finally:
+        writes_stopped.set()
+        writer.join()
+    restored_file = str(tmp_path / "RestoredDB.db")
+    with gzip.open(snapshot, "rb") as snapshot_file, open(restored_file, "wb") as restored:
+        restored.write(snapshot_file.read())
+
+    assert backup_restarts_counter.value() - restarts == 3
+    assert backup_single_pass_counter.value() - single_passes == 1
+    assert len(select_all(restored_file, "SELECT * FROM teams")) == 1000
+
+
+def test_restore_snapshot_keeps_change_sequence(tmp_path):
+    db_file = str(tmp_path / "FakeDB.db")
+    create_fake_db(db_file)
+    snapshot = create_snapshot(db_file, str(tmp_path / "backups"), pages_per_step=4, step_sleep=0)
+
+    db = sqlite3.connect(db_file)
+    with db:
+        db.execute("DELETE FROM teams")
+        db.execute("INSERT INTO changes (entity, entity_id, operation, created_at) VALUES ('team', 'faketeam0', 'delete', 0)")
+    db.close()
+    restore_snapshot(snapshot, db_file)
+
+    assert len(select_all(db_file, "SELECT * FROM teams")) == 1000
+    assert select_all(db_file, "SELECT seq, entity, operation FROM changes") == [(1, "team", "insert"), (3, "database", "restore")]
+
+
+@pytest.mark.asyncio
+async def test_backup_manager(tmp_path):
+    db_file = str(tmp_path / "FakeDB.db")
+    create_fake_db(db_file)
+    config = {"directory": str(tmp_path / "backups"), "pages_per_step": 2, "step_sleep": 0, "retention": 1, "interval": None,
+              "max_restarts": 3}
+    backup_manager = BackupManager(db_file, config)
+
+    task = backup_manager.start_backup()
+    assert backup_manager.start_backup() is None
+    snapshot = await task
+
+    assert backup_manager.snapshots() == [snapshot]
+    assert backup_manager.last_error is None
+    with pytest.raises(FileNotFoundError):
+        await backup_manager.restore("none_existing_snapshot.db.gz")
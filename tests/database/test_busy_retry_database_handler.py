@@ -0,0 +1,96 @@
+import pytest
+
+from sqlite3 import OperationalError
+from api.modules.data_classes import BaseTeam, InUser, UpdateUser
+from api.modules.database.busy_retry_database_handler import BusyRetryDBHandler
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.utils import encrypt_string
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class LockedDBHandler(MockDBHandler):
+    """
+    Mock handler whose team inserts fail with the given errors before succeeding
+    """
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.insert_team_calls = 0
+
+    async def insert_team(self, new_team: BaseTeam):
+        self.insert_team_calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return await super().insert_team(new_team=new_team)
+
+
+class LockedOnceSQLiteDBHandler(SQLiteDBHandler):
+    """
+    SQLite handler whose next connection fails as if the DB file was locked, once the write arguments are prepared
+    """
+
+    locked_connections = 0
+
+    def _connect(self):
+        if self.locked_connections:
+            self.locked_connections -= 1
+            raise OperationalError("database is locked")
+        return super()._connect()
+
+
+CONFIG_FAST_RETRIES = {"max_attempts": 3, "base_delay": 0.001, "max_delay": 0.002}
+FAKE_TEAM = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+
+
+async def select_password(db_handler: SQLiteDBHandler, user_id: str):
+    async with db_handler._connect() as db:
+        cursor = await db.execute("SELECT password FROM users WHERE id = :id", {"id": user_id})
+        row = await cursor.fetchone()
+        await cursor.close()
+    return row[0]
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_locked_writes_are_retried():
+    inner = LockedDBHandler(OperationalError("database is locked"), OperationalError("database is locked"))
+
+    result = await BusyRetryDBHandler(inner, CONFIG_FAST_RETRIES).insert_team(new_team=FAKE_TEAM)
+
+    assert result == ("faketeam01", "THE TEAM", "this is a description")
+    assert inner.insert_team_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_other_errors_and_exhausted_retries_are_raised():
+    other_error_inner = LockedDBHandler(OperationalError("no such table: teams"))
+    locked_inner = LockedDBHandler(*[OperationalError("database is locked")] * 3)
+
+    with pytest.raises(OperationalError, match="no such table"):
+        await BusyRetryDBHandler(other_error_inner, CONFIG_FAST_RETRIES).insert_team(new_team=FAKE_TEAM)
+    with pytest.raises(OperationalError, match="locked"):
+        await BusyRetryDBHandler(locked_inner, CONFIG_FAST_RETRIES).insert_team(new_team=FAKE_TEAM)
+
+    assert other_error_inner.insert_team_calls == 1
+    assert locked_inner.insert_team_calls == 3
+
+
+@pytest.mark.asyncio
+async def test_retried_writes_hash_passwords_once(tmp_path):
+    inner = LockedOnceSQLiteDBHandler(db_file=str(tmp_path / "RetryDB.db"))
+    db_handler = BusyRetryDBHandler(inner, CONFIG_FAST_RETRIES)
+
+    inner.locked_connections = 1
+    await db_handler.insert_user(new_user=InUser(id="fakeuser01", name="John", email="j@gmail.com", password="plain1"))
+    inserted_hash = await select_password(inner, "fakeuser01")
+    inner.locked_connections = 1
+    await db_handler.update_user(user_id="fakeuser01", new_data=UpdateUser(password="plain2"))
+    updated_hash = await select_password(inner, "fakeuser01")
+    await inner.shutdown()
+
+    assert inserted_hash == encrypt_string("plain1")
+    assert updated_hash == encrypt_string("plain2")
@@ -0,0 +1,54 @@
+import time
+import pytest
+
+from api.modules.data_classes import FaultSettings
+from api.modules.database.database_handler import DBHandlerException
+from api.modules.database.fault_injection_database_handler import FaultInjectionDBHandler, ANY_METHOD
+from api.modules.database.mock_database_handler import MockDBHandler
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_latency_errors_and_stalls_are_injected_per_method():
+    db_handler = FaultInjectionDBHandler(MockDBHandler(), {
+        "select_user": FaultSettings(latency_distribution="fixed", latency_ms=50),
+        "select_team": FaultSettings(stall_rate=1, stall_seconds=0.05),
+        ANY_METHOD: FaultSettings(error_rate=1)
+    }, seed=1)
+
+    started = time.perf_counter()
+    user_row = await db_handler.select_user(user_id="my_id")
+    user_duration = time.perf_counter() - started
+    started = time.perf_counter()
+    team_row = await db_handler.select_team(team_id="my_id")
+    team_duration = time.perf_counter() - started
+    with pytest.raises(DBHandlerException):
+        await db_handler.select_users()
+
+    db_handler.configure(ANY_METHOD, None)
+    users_rows = await db_handler.select_users()
+
+    assert user_row == ("my_id", "my_name", "my_email")
+    assert user_duration >= 0.05
+    assert team_row == ("my_id", "my_name", "my_description")
+    assert team_duration >= 0.05
+    assert users_rows == await MockDBHandler().select_users()
+    with pytest.raises(ValueError):
+        db_handler.configure("drop_everything", FaultSettings())
+
+
+@pytest.mark.asyncio
+async def test_latency_distributions():
+    db_handler = FaultInjectionDBHandler(MockDBHandler(), seed=1)
+
+    samples = {distribution: [db_handler._latency(FaultSettings(latency_distribution=distribution, latency_ms=50))
+                              for _ in range(2000)]
+               for distribution in ("none", "fixed", "uniform", "exponential", "lognormal")}
+
+    assert set(samples["none"]) == {0}
+    assert set(samples["fixed"]) == {0.05}
+    assert 0 <= min(samples["uniform"]) and max(samples["uniform"]) <= 0.05
+    assert 0.045 <= sum(samples["exponential"]) / 2000 <= 0.055
+    assert 0.045 <= sorted(samples["lognormal"])[1000] <= 0.055
@@ -0,0 +1,71 @@
+from api.modules.database.membership_index import MembershipIndex
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_load_and_lookup():
+    index = MembershipIndex()
+    index.load([("team_b", "user_1"), ("team_a", "user_2"), ("team_a", "user_1")])
+
+    assert index.loaded
+    assert index.edges == 3
+    assert index.team_members("team_a") == ["user_1", "user_2"]
+    assert index.user_teams("user_1") == ["team_a", "team_b"]
+    assert index.team_members("none_existing_id") == []
+    assert index.has("team_b", "user_1")
+    assert not index.has("team_b", "user_2")
+
+
+def test_add_and_remove():
+    index = MembershipIndex()
+    index.load([])
+
+    index.add("team_a", "user_1")
+    index.add("team_a", "user_1")
+    index.add("team_a", "user_2")
+    index.remove("team_a", "user_1")
+    index.remove("team_a", "none_existing_id")
+
+    assert index.edges == 1
+    assert index.team_members("team_a") == ["user_2"]
+    assert index.user_teams("user_1") == []
+
+
+def test_remove_user_and_team():
+    index = MembershipIndex()
+    index.load([("team_a", "user_1"), ("team_b", "user_1"), ("team_a", "user_2"), ("team_b", "user_2")])
+
+    index.remove_user("user_1")
+    assert index.edges == 2
+    assert index.team_members("team_a") == ["user_2"]
+
+    index.remove_team("team_a")
+    assert index.edges == 1
+    assert index.user_teams("user_2") == ["team_b"]
+
+
+def test_deleted_ids_are_released():
+    index = MembershipIndex()
+    index.load([("team_0", "user_0")])
+
+    for number in range(1, 100):
+        index.add(f"team_{number}", f"user_{number}")
+        index.remove_user(f"user_{number - 1}")
+        index.remove_team(f"team_{number - 1}")
+
+    assert index.edges == 1
+    assert index.team_members("team_99") == ["user_99"]
+    assert index.user_teams("user_0") == []
+    assert len(index._users.names) <= 2 and len(index._teams.names) <= 2
+
+
+def test_memory_usage():
+    index = MembershipIndex()
+    index.load([(f"team_{team}", f"user_{user}") for team in range(10) for user in range(100)])
+
+    memory_usage = index.memory_usage()
+
+    assert memory_usage["edges"] == 1000
+    assert memory_usage["bytes"] > 0
+    assert memory_usage["bytes_per_million_edges"] == memory_usage["bytes"] * 1000
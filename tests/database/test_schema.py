@@ -0,0 +1,73 @@
+import sqlite3
+import aiosqlite
+import pytest
+
+from api.modules.database.schema import ensure_schema
+from api.modules.database.sqlite_database_handler import MEMBERSHIP_IDS_QUERY
+from api.modules.database.storage_benchmark import run_benchmark
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_legacy_db(db_file: str):
+    db = sqlite3.connect(db_file)
+    with db:
+        db.execute("CREATE TABLE users (id VARCHAR PRIMARY KEY UNIQUE NOT NULL, name VARCHAR NOT NULL, "
+                   "email VARCHAR NOT NULL, password VARCHAR NOT NULL) WITHOUT ROWID")
+        db.execute("CREATE TABLE teams (id VARCHAR PRIMARY KEY UNIQUE NOT NULL, name VARCHAR UNIQUE NOT NULL, "
+                   "description NOT NULL) WITHOUT ROWID")
+        db.execute("CREATE TABLE team_members (id_user VARCHAR REFERENCES users (id) NOT NULL, "
+                   "id_team VARCHAR REFERENCES teams (id) NOT NULL, PRIMARY KEY (id_user, id_team))")
+        db.execute("INSERT INTO users VALUES ('fakeuser01', 'John', 'j@gmail.com', 'hashed123')")
+        db.execute("INSERT INTO teams VALUES ('faketeam01', 'THE TEAM', 'this is a description')")
+        db.executemany("INSERT INTO team_members VALUES (?, ?)",
+                       [("fakeuser01", "faketeam01"), ("deleteduser", "faketeam01"), ("fakeuser01", "deletedteam")])
+    db.close()
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_ensure_schema_migrates_team_members_to_cascading_integer_keys(tmp_path):
+    db_file = str(tmp_path / "LegacyDB.db")
+    create_legacy_db(db_file)
+
+    async with aiosqlite.connect(db_file) as db:
+        await ensure_schema(db)
+        await ensure_schema(db)  # Already migrated databases are left as they are
+
+        cursor = await db.execute("PRAGMA foreign_key_list(team_members)")
+        on_delete_actions = [foreign_key[6] for foreign_key in await cursor.fetchall()]
+        cursor = await db.execute("PRAGMA table_info(team_members)")
+        columns = [(column[1], column[2]) for column in await cursor.fetchall()]
+        cursor = await db.execute(MEMBERSHIP_IDS_QUERY)
+        memberships = await cursor.fetchall()
+        cursor = await db.execute("SELECT teams.id, member_count FROM team_stats "
+                                  "INNER JOIN teams ON teams.row_id = team_stats.team_row_id")
+        member_counts = await cursor.fetchall()
+
+        await db.execute("PRAGMA foreign_keys = ON")
+        await db.execute("DELETE FROM users WHERE id = 'fakeuser01'")
+        await db.commit()
+        cursor = await db.execute("SELECT COUNT(*) FROM team_members")
+        remaining_memberships = (await cursor.fetchone())[0]
+        cursor = await db.execute("SELECT member_count FROM team_stats")
+        remaining_member_counts = await cursor.fetchall()
+
+    assert on_delete_actions == ["CASCADE", "CASCADE"]
+    assert columns == [("user_row_id", "INTEGER"), ("team_row_id", "INTEGER")]
+    assert memberships == [("faketeam01", "fakeuser01")]
+    assert member_counts == [("faketeam01", 1)]
+    assert remaining_memberships == 0
+    assert remaining_member_counts == [(0,)]
+
+
+@pytest.mark.asyncio
+async def test_storage_benchmark_migrates_to_a_smaller_layout():
+    report = await run_benchmark(users=50, teams=10, teams_per_user=3, lookups=5)
+
+    assert set(report["legacy"]["membership_bytes"]) == {"team_members", "team_members_id_team",
+                                                         "sqlite_autoindex_team_members_1"}
+    assert set(report["integer_keys"]["membership_bytes"]) == {"team_members", "team_members_team"}
+    assert report["integer_keys"]["file_bytes"] <= report["legacy"]["file_bytes"]
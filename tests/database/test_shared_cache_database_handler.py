@@ -0,0 +1,102 @@
+import subprocess
+import sys
+import pytest
+
+from api.modules.config import ROOT_PATH
+from api.modules.data_classes import UpdateUser
+from api.modules.database.database_handler import DBHandlerException
+from api.modules.database.mock_database_handler import MockDBHandler, MockErrorDBHandler
+from api.modules.database.shared_cache_database_handler import SharedCacheDBHandler
+from api.modules.database.shared_record_cache import CACHE_MISS, SharedRecordCache
+
+# Bumps the generation of a cache file from another process
+INVALIDATE_SCRIPT = """
+import sys
+from api.modules.database.shared_record_cache import SharedRecordCache
+SharedRecordCache({"file": sys.argv[1], "slots": 1, "slot_size": 1}).invalidate()
+"""
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class CountingDBHandler(MockDBHandler):
+    """
+    Mock handler that counts the reads reaching it
+    """
+
+    def __init__(self):
+        self.reads = 0
+
+    async def select_user(self, user_id: str):
+        self.reads += 1
+        return await super().select_user(user_id=user_id)
+
+
+def cache_config(tmp_path, slots: int = 64, slot_size: int = 256):
+    return {"file": str(tmp_path / "Records.db.cache"), "slots": slots, "slot_size": slot_size}
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_workers_share_records_and_see_writes_of_each_other(tmp_path):
+    inner = CountingDBHandler()
+    # Two workers: separate mappings of the same file
+    worker_a = SharedCacheDBHandler(inner, SharedRecordCache(cache_config(tmp_path)))
+    worker_b = SharedCacheDBHandler(inner, SharedRecordCache(cache_config(tmp_path)))
+
+    first_row = await worker_a.select_user(user_id="my_id")
+    shared_row = await worker_b.select_user(user_id="my_id")
+    reads_before_write = inner.reads
+    await worker_b.update_user(user_id="my_id", new_data=UpdateUser(name="new_name"))
+    await worker_a.select_user(user_id="my_id")
+
+    assert first_row == shared_row == ("my_id", "my_name", "my_email")
+    assert reads_before_write == 1
+    assert inner.reads == 2
+    worker_a.cache.close()
+    worker_b.cache.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_also_invalidate(tmp_path):
+    db_handler = SharedCacheDBHandler(MockErrorDBHandler(), SharedRecordCache(cache_config(tmp_path)))
+    generation = db_handler.cache.generation
+
+    with pytest.raises(DBHandlerException):
+        await db_handler.update_user(user_id="my_id", new_data=UpdateUser(name="new_name"))
+
+    assert db_handler.cache.generation == generation + 1
+    db_handler.cache.close()
+
+
+def test_stale_and_oversized_records_are_not_stored(tmp_path):
+    cache = SharedRecordCache(cache_config(tmp_path, slot_size=64))
+    generation = cache.generation
+    cache.invalidate()  # A write committed while the record was being read
+    cache.put("user:stale", ["stale"], generation)
+    cache.put("user:big", ["x" * 64], cache.generation)
+    cache.put("user:missing", None, cache.generation)
+
+    assert cache.get("user:stale") is CACHE_MISS
+    assert cache.get("user:big") is CACHE_MISS
+    assert cache.get("user:missing") is None
+    assert cache.get("user:unknown") is CACHE_MISS
+    cache.close()
+
+
+def test_generation_is_shared_between_processes(tmp_path):
+    cache = SharedRecordCache(cache_config(tmp_path))
+    cache.put("user:my_id", ["my_id"], cache.generation)
+
+    subprocess.run([sys.executable, "-c", INVALIDATE_SCRIPT, cache.config["file"]], cwd=str(ROOT_PATH), check=True)
+    # Files keep their layout, whatever the configuration of the processes that open them
+    other_cache = SharedRecordCache(cache_config(tmp_path, slots=1, slot_size=1))
+
+    assert cache.get("user:my_id") is CACHE_MISS
+    assert cache.generation == 1
+    assert other_cache.generation == 1
+    assert (other_cache.slots, other_cache.slot_size) == (64, 256)
+    cache.close()
+    other_cache.close()
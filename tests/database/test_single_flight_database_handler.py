@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.database.single_flight_database_handler import SingleFlightDBHandler
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class SlowCountingDBHandler(MockDBHandler):
+    """
+    Mock handler whose reads take a while and count how many times they actually ran
+    """
+
+    def __init__(self):
+        self.select_user_calls = 0
+
+    async def select_user(self, user_id: str):
+        self.select_user_calls += 1
+        await asyncio.sleep(0.05)
+        return await super().select_user(user_id=user_id)
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_identical_reads_share_one_query():
+    inner = SlowCountingDBHandler()
+    db_handler = SingleFlightDBHandler(inner)
+
+    results = await asyncio.gather(*[db_handler.select_user(user_id="my_id") for _ in range(10)])
+    other_result = await db_handler.select_user(user_id="my_other_id")
+
+    assert inner.select_user_calls == 2
+    assert results == [("my_id", "my_name", "my_email")] * 10
+    assert other_result == ("my_other_id", "my_name", "my_email")
+
+
+@pytest.mark.asyncio
+async def test_write_ends_sharing():
+    inner = SlowCountingDBHandler()
+    db_handler = SingleFlightDBHandler(inner)
+
+    first_read = asyncio.ensure_future(db_handler.select_user(user_id="my_id"))
+    await asyncio.sleep(0.01)
+    await db_handler.delete_user(user_id="my_id")
+    second_read = asyncio.ensure_future(db_handler.select_user(user_id="my_id"))
+    await asyncio.gather(first_read, second_read)
+
+    assert inner.select_user_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_query():
+    inner = SlowCountingDBHandler()
+    db_handler = SingleFlightDBHandler(inner)
+
+    cancelled_read = asyncio.ensure_future(db_handler.select_user(user_id="my_id"))
+    remaining_read = asyncio.ensure_future(db_handler.select_user(user_id="my_id"))
+    await asyncio.sleep(0.01)
+    cancelled_read.cancel()
+
+    assert await remaining_read == ("my_id", "my_name", "my_email")
+    assert cancelled_read.cancelled()
+    assert inner.select_user_calls == 1
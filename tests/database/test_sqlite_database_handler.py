@@ -1,39 +1,51 @@
+import asyncio
+import shutil
 import pytest
 import aiosqlite
 
-from api.modules.database.config import CONFIG_SQLITE
-from api.modules.database import sqlite_database_handler
-from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.config import CONFIG_SQLITE, CONFIG_MEMBERSHIP_INDEX
+from api.modules.database import sqlite_database_handler, DBHandlerException
+from api.modules.database.schema import ensure_schema
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler, INSERT_MEMBERSHIP_QUERY
 from api.modules.data_classes import *
 
-# Set up connection config to test DB ------------------------------------------------------------------
-sqlite_database_handler.connection_config = CONFIG_SQLITE["test"]["db_file"]
+# Set up connection config to a copy of the test DB, so tests never modify the tracked file ------------
+
+@pytest.fixture(autouse=True)
+async def test_db_copy(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "TempDB.db")
+    shutil.copyfile(CONFIG_SQLITE["test"]["db_file"], db_file)
+    monkeypatch.setattr(sqlite_database_handler, "connection_config", db_file)
+    yield
+    await SQLiteDBHandler().shutdown()
 
 
 # Utility functions for tests --------------------------------------------------------------------------
 
 async def insert_fake_user(fake_user: InUser):
     async with aiosqlite.connect(sqlite_database_handler.connection_config) as db:
-        await db.execute("INSERT INTO users values (:id, :name, :email, :password)", fake_user.dict())
+        await db.execute("INSERT INTO users (id, name, email, password) VALUES (:id, :name, :email, :password)",
+                         fake_user.dict())
         await db.commit()
 
 
 async def insert_fake_team(fake_team: BaseTeam):
     async with aiosqlite.connect(sqlite_database_handler.connection_config) as db:
-        await db.execute("INSERT INTO teams values (:id, :name, :description)", fake_team.dict())
+        await db.execute("INSERT INTO teams (id, name, description) VALUES (:id, :name, :description)",
+                         fake_team.dict())
         await db.commit()
 
 
 async def insert_fake_team_member(fake_team_id: str, fake_user_id: str):
     async with aiosqlite.connect(sqlite_database_handler.connection_config) as db:
-        await db.execute("INSERT INTO team_members values (:id_user, :id_team)",
-                         {"id_team": fake_team_id, "id_user": fake_user_id})
+        await db.execute(INSERT_MEMBERSHIP_QUERY, {"id_team": fake_team_id, "id_user": fake_user_id})
         await db.commit()
 
 
 @pytest.fixture
 async def clean_test_db():
     async with aiosqlite.connect(sqlite_database_handler.connection_config) as db:
+        await ensure_schema(db)
         await db.execute("DELETE FROM team_members")
         await db.execute("DELETE FROM teams")
         await db.execute("DELETE FROM users")
@@ -195,6 +207,45 @@ async def test_delete_team(clean_test_db):
     assert result_row is None
 
 
+@pytest.mark.asyncio
+async def test_bulk_deletes_cascade_to_team_members(clean_test_db):
+    fake_users = [InUser(id=f"fakeuser0{i}", name=f"John {i}", email=f"j{i}@gmail.com", password="hashed123")
+                  for i in range(3)]
+    fake_teams = [BaseTeam(id=f"faketeam0{i}", name=f"THE TEAM {i}", description="this is a description")
+                  for i in range(2)]
+    for fake_user in fake_users:
+        await insert_fake_user(fake_user)
+    for fake_team in fake_teams:
+        await insert_fake_team(fake_team)
+        for fake_user in fake_users:
+            await insert_fake_team_member(fake_team_id=fake_team.id, fake_user_id=fake_user.id)
+
+    db_handler = SQLiteDBHandler()
+    since = await select_last_change_seq()
+    deleted_users = await db_handler.delete_users(user_ids=["fakeuser02", "fakeuser00", "none_existing_id", "fakeuser00"])
+    deleted_teams = await db_handler.delete_teams(team_ids=["faketeam00"])
+    changes = await db_handler.select_changes(since=since, limit=100)
+
+    assert deleted_users == [(user.id, user.name, user.email) for user in (fake_users[0], fake_users[2])]
+    assert deleted_teams == [(fake_teams[0].id, fake_teams[0].name, fake_teams[0].description)]
+    assert await db_handler.select_team_members(team_id="faketeam01") == [
+        (fake_users[1].id, fake_users[1].name, fake_users[1].email)]
+    assert await db_handler.select_member_counts(team_ids=["faketeam01"]) == {"faketeam01": 1}
+    assert sorted((change[1], change[2], change[3]) for change in changes) == [
+        ("membership", "faketeam00:fakeuser00", "delete"), ("membership", "faketeam00:fakeuser01", "delete"),
+        ("membership", "faketeam00:fakeuser02", "delete"), ("membership", "faketeam01:fakeuser00", "delete"),
+        ("membership", "faketeam01:fakeuser02", "delete"), ("team", "faketeam00", "delete"),
+        ("user", "fakeuser00", "delete"), ("user", "fakeuser02", "delete")]
+
+
+@pytest.mark.asyncio
+async def test_insert_team_member_enforces_foreign_keys(clean_test_db):
+    db_handler = SQLiteDBHandler()
+
+    with pytest.raises(DBHandlerException):
+        await db_handler.insert_team_member(team_id="none_existing_id", user_id="none_existing_id")
+
+
 @pytest.mark.asyncio
 async def test_select_user_teams(clean_test_db):
     fake_user_data = {"id": "fakeuser01", "name": "John", "email": "j@gmail.com", "password": "hashed123"}
@@ -243,6 +294,47 @@ async def test_select_team_members(clean_test_db):
     assert empty_result == []
 
 
+@pytest.mark.asyncio
+async def test_relationship_queries(clean_test_db):
+    fake_users = [InUser(id=f"fakeuser0{i}", name=f"John {i}", email=f"j{i}@gmail.com", password="hashed123")
+                  for i in range(4)]
+    fake_teams = [BaseTeam(id=f"faketeam0{i}", name=f"THE TEAM {i}", description="this is a description")
+                  for i in range(3)]
+    for fake_user in fake_users:
+        await insert_fake_user(fake_user)
+    for fake_team in fake_teams:
+        await insert_fake_team(fake_team)
+    for team_index, user_indexes in ((0, (0, 1, 2)), (1, (0, 1)), (2, (2, 3))):
+        for user_index in user_indexes:
+            await insert_fake_team_member(fake_team_id=fake_teams[team_index].id, fake_user_id=fake_users[user_index].id)
+
+    db_handler = SQLiteDBHandler()
+    teammates = await db_handler.select_teammates(user_id="fakeuser00", limit=10)
+    limited_teammates = await db_handler.select_teammates(user_id="fakeuser00", limit=1)
+    shared_teams = await db_handler.select_shared_teams(user_id="fakeuser00", other_user_id="fakeuser01", limit=10)
+    no_shared_teams = await db_handler.select_shared_teams(user_id="fakeuser00", other_user_id="fakeuser03", limit=10)
+    union_members = await db_handler.select_team_set_members(union=["faketeam01", "faketeam02"], intersect=[], exclude=[],
+                                                             limit=10)
+    intersect_members = await db_handler.select_team_set_members(union=[], intersect=["faketeam00", "faketeam02"],
+                                                                 exclude=[], limit=10)
+    except_members = await db_handler.select_team_set_members(union=["faketeam00"], intersect=[],
+                                                              exclude=["faketeam01", "none_existing_id"], limit=10)
+    limited_members = await db_handler.select_team_set_members(union=["faketeam00"], intersect=["faketeam00"],
+                                                               exclude=[], limit=2)
+
+    def user_rows(*indexes):
+        return [(fake_users[i].id, fake_users[i].name, fake_users[i].email) for i in indexes]
+
+    assert teammates == (2, [user_rows(1)[0] + (2,), user_rows(2)[0] + (1,)])
+    assert limited_teammates == (2, [user_rows(1)[0] + (2,)])
+    assert shared_teams == (2, [(team.id, team.name, team.description) for team in fake_teams[:2]])
+    assert no_shared_teams == (0, [])
+    assert union_members == (4, user_rows(0, 1, 2, 3))
+    assert intersect_members == (1, user_rows(2))
+    assert except_members == (1, user_rows(2))
+    assert limited_members == (3, user_rows(0, 1))
+
+
 @pytest.mark.asyncio
 async def test_insert_team_member(clean_test_db):
     fake_team_data = {"id": "faketeam01", "name": "THE TEAM", "description": "this is a description"}
@@ -279,3 +371,204 @@ async def test_delete_team_member(clean_test_db):
     assert result_row == []
 
 
+@pytest.mark.asyncio
+async def test_sync_team_members(clean_test_db):
+    fake_users = [InUser(id=f"fakeuser0{i}", name=f"John {i}", email=f"j{i}@gmail.com", password="hashed123")
+                  for i in range(4)]
+    fake_team = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+    await insert_fake_team(fake_team)
+    for fake_user in fake_users:
+        await insert_fake_user(fake_user)
+    for fake_user in fake_users[:2]:
+        await insert_fake_team_member(fake_team_id=fake_team.id, fake_user_id=fake_user.id)
+
+    db_handler = SQLiteDBHandler()
+    since = await select_last_change_seq()
+    result = await db_handler.sync_team_members(team_id=fake_team.id, user_ids=["fakeuser03", "fakeuser01", "fakeuser02"])
+    unchanged_result = await db_handler.sync_team_members(team_id=fake_team.id, user_ids=["fakeuser01", "fakeuser02", "fakeuser03"])
+    changes = await db_handler.select_changes(since=since, limit=100)
+    with pytest.raises(DBHandlerException):
+        await db_handler.sync_team_members(team_id=fake_team.id, user_ids=["none_existing_id"])
+
+    assert result == (["fakeuser02", "fakeuser03"], ["fakeuser00"])
+    assert unchanged_result == ([], [])
+    assert [row[0] for row in await db_handler.select_team_members(team_id=fake_team.id)] == [
+        "fakeuser01", "fakeuser02", "fakeuser03"]
+    assert await db_handler.select_member_counts(team_ids=[fake_team.id]) == {fake_team.id: 3}
+    assert sorted((change[2], change[3]) for change in changes) == [
+        ("faketeam01:fakeuser00", "delete"), ("faketeam01:fakeuser02", "insert"), ("faketeam01:fakeuser03", "insert")]
+
+
+
+
+async def select_last_change_seq():
+    async with aiosqlite.connect(sqlite_database_handler.connection_config) as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes")
+        last_seq = (await cursor.fetchone())[0]
+        await cursor.close()
+    return last_seq
+
+
+@pytest.mark.asyncio
+async def test_select_changes(clean_test_db):
+    db_handler = SQLiteDBHandler()
+    await db_handler.select_changes(since=0, limit=1)  # Ensures the change log table exists
+    last_seq = await select_last_change_seq()
+
+    fake_user = InUser(id="fakeuser01", name="John", email="j@gmail.com", password="hashed123")
+    fake_team = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+    await db_handler.insert_user(new_user=fake_user)
+    await db_handler.insert_team(new_team=fake_team)
+    await db_handler.insert_team_member(team_id=fake_team.id, user_id=fake_user.id)
+    await db_handler.delete_user(user_id=fake_user.id)
+
+    result_rows = await db_handler.select_changes(since=last_seq, limit=10)
+    limited_rows = await db_handler.select_changes(since=last_seq, limit=2)
+    empty_result = await db_handler.select_changes(since=result_rows[-1][0], limit=10, wait=0.05)
+
+    assert [row[0] for row in result_rows] == list(range(last_seq + 1, last_seq + 6))
+    assert [row[1:4] for row in result_rows] == [("user", fake_user.id, "insert"), ("team", fake_team.id, "insert"),
+                                                 ("membership", "faketeam01:fakeuser01", "insert"),
+                                                 ("membership", "faketeam01:fakeuser01", "delete"),
+                                                 ("user", fake_user.id, "delete")]
+    assert result_rows[0][4] == '{"id": "fakeuser01", "name": "John", "email": "j@gmail.com"}'
+    assert limited_rows == result_rows[:2]
+    assert empty_result == []
+
+
+@pytest.mark.asyncio
+async def test_select_changes_long_polling(clean_test_db):
+    db_handler = SQLiteDBHandler()
+    await db_handler.select_changes(since=0, limit=1)
+    last_seq = await select_last_change_seq()
+
+    fake_team = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+    waiting_consumer = asyncio.ensure_future(db_handler.select_changes(since=last_seq, limit=10, wait=5))
+    await asyncio.sleep(0.05)
+    await db_handler.insert_team(new_team=fake_team)
+    result_rows = await asyncio.wait_for(waiting_consumer, timeout=1)
+
+    assert [row[1:4] for row in result_rows] == [("team", fake_team.id, "insert")]
+
+
+@pytest.mark.asyncio
+async def test_startup_and_shutdown(clean_test_db):
+    fake_user = InUser(id="fakeuser01", name="John", email="j@gmail.com", password="hashed123")
+    await insert_fake_user(fake_user)
+
+    db_handler = SQLiteDBHandler()
+    await db_handler.startup()
+    result_row = await db_handler.select_user(user_id=fake_user.id)
+    await db_handler.shutdown()
+
+    assert result_row == (fake_user.id, fake_user.name, fake_user.email)
+
+
+@pytest.mark.asyncio
+async def test_select_membership_counts_and_stats(clean_test_db):
+    db_handler = SQLiteDBHandler()
+    await db_handler.select_stats(top=1)  # Ensures the materialized count tables exist
+
+    fake_user_a = InUser(id="fakeuser01", name="John", email="j@gmail.com", password="hashed123")
+    fake_user_b = InUser(id="fakeuser02", name="Jane", email="ja@gmail.com", password="hashedabc")
+    fake_team_a = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+    fake_team_b = BaseTeam(id="faketeam02", name="THE SECOND TEAM", description="this is another description")
+    for fake_user in (fake_user_a, fake_user_b):
+        await insert_fake_user(fake_user)
+    for fake_team in (fake_team_a, fake_team_b):
+        await insert_fake_team(fake_team)
+    await insert_fake_team_member(fake_team_id=fake_team_a.id, fake_user_id=fake_user_a.id)
+    await insert_fake_team_member(fake_team_id=fake_team_a.id, fake_user_id=fake_user_b.id)
+    await db_handler.insert_team_member(team_id=fake_team_b.id, user_id=fake_user_a.id)
+    await db_handler.delete_team_member(team_id=fake_team_a.id, user_id=fake_user_b.id)
+
+    member_counts = await db_handler.select_member_counts(team_ids=[fake_team_a.id, fake_team_b.id, "none_existing_id"])
+    team_counts = await db_handler.select_team_counts(user_ids=[fake_user_a.id, fake_user_b.id])
+    largest_teams, team_size_distribution, user_team_count_distribution = await db_handler.select_stats(top=1)
+
+    assert member_counts == {fake_team_a.id: 1, fake_team_b.id: 1}
+    assert team_counts == {fake_user_a.id: 2, fake_user_b.id: 0}
+    assert len(largest_teams) == 1 and largest_teams[0][3] == 1
+    assert team_size_distribution == [(1, 2)]
+    assert user_team_count_distribution == [(0, 1), (2, 1)]
+
+    await db_handler.delete_user(user_id=fake_user_a.id)
+    member_counts = await db_handler.select_member_counts(team_ids=[fake_team_a.id, fake_team_b.id])
+
+    assert member_counts == {fake_team_a.id: 0, fake_team_b.id: 0}
+
+
+@pytest.mark.asyncio
+async def test_membership_reads_with_index(clean_test_db, monkeypatch):
+    monkeypatch.setitem(CONFIG_MEMBERSHIP_INDEX, "enabled", True)
+    db_handler = SQLiteDBHandler()
+    monkeypatch.setattr(db_handler, "_membership_indexes", {})
+
+    fake_user_a = InUser(id="fakeuser01", name="John", email="j@gmail.com", password="hashed123")
+    fake_user_b = InUser(id="fakeuser02", name="Jane", email="ja@gmail.com", password="hashedabc")
+    fake_team = BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")
+    await insert_fake_user(fake_user_a)
+    await insert_fake_user(fake_user_b)
+    await insert_fake_team(fake_team)
+    await insert_fake_team_member(fake_team_id=fake_team.id, fake_user_id=fake_user_b.id)
+
+    loaded_rows = await db_handler.select_team_members(team_id=fake_team.id)
+    await db_handler.insert_team_member(team_id=fake_team.id, user_id=fake_user_a.id)
+    inserted_rows = await db_handler.select_team_members(team_id=fake_team.id)
+    await db_handler.delete_user(user_id=fake_user_b.id)
+    deleted_rows = await db_handler.select_team_members(team_id=fake_team.id)
+    user_teams_rows = await db_handler.select_user_teams(user_id=fake_user_a.id)
+
+    assert loaded_rows == [(fake_user_b.id, fake_user_b.name, fake_user_b.email)]
+    assert inserted_rows == [(fake_user_a.id, fake_user_a.name, fake_user_a.email),
+                             (fake_user_b.id, fake_user_b.name, fake_user_b.email)]
+    assert deleted_rows == [(fake_user_a.id, fake_user_a.name, fake_user_a.email)]
+    assert user_teams_rows == [(fake_team.id, fake_team.name, fake_team.description)]
+
+
+@pytest.mark.asyncio
+async def test_import_batch_and_export_pages(clean_test_db):
+    fake_user = InUser(id="fakeuser01", name="John", email="j@gmail.com", password="hashed123")
+    await insert_fake_user(fake_user)
+
+    db_handler = SQLiteDBHandler()
+    users = [ImportUser(id="fakeuser02", name="Jane", email="ja@gmail.com", password="abc"),
+             ImportUser(id="fakeuser01", name="Dup", email="d@gmail.com", password_hash="myhash"),
+             ImportUser(id="fakeuser03", name="Jim", email="ji@gmail.com", password_hash="myhash")]
+    teams = [BaseTeam(id="faketeam01", name="THE TEAM", description="this is a description")]
+    memberships = [("faketeam01", "fakeuser02"), ("faketeam01", "fakeuser03")]
+    user_errors, team_errors, membership_errors = await db_handler.import_batch(users=users, teams=teams,
+                                                                              memberships=memberships)
+
+    assert user_errors[0] is None and user_errors[2] is None
+    assert user_errors[1].startswith("Constraint conflict")
+    assert team_errors == [None]
+    assert membership_errors == [None, None]
+
+    first_page = await db_handler.select_export_page(entity="user", after=None, limit=2)
+    second_page = await db_handler.select_export_page(entity="user", after=first_page[-1], limit=2)
+    first_membership_page = await db_handler.select_export_page(entity="membership", after=None, limit=1)
+    second_membership_page = await db_handler.select_export_page(entity="membership", after=first_membership_page[-1],
+                                                                 limit=10)
+
+    assert [row[0] for row in first_page + second_page] == ["fakeuser01", "fakeuser02", "fakeuser03"]
+    assert second_page[0][3] == "myhash"
+    assert [row[:2] for row in first_membership_page] == [("faketeam01", "fakeuser02")]
+    assert [row[:2] for row in second_membership_page] == [("faketeam01", "fakeuser03")]
+
+
+@pytest.mark.asyncio
+async def test_export_pages_continue_after_team_of_cursor_is_deleted(clean_test_db):
+    db_handler = SQLiteDBHandler()
+    users = [ImportUser(id=f"fakeuser0{index}", name="n", email="e", password_hash="h") for index in (1, 2)]
+    teams = [BaseTeam(id=f"faketeam0{index}", name=f"n{index}", description="d") for index in (1, 2)]
+    await db_handler.import_batch(users=users, teams=teams,
+                                  memberships=[("faketeam01", "fakeuser01"), ("faketeam02", "fakeuser01"),
+                                               ("faketeam01", "fakeuser02")])
+
+    first_page = await db_handler.select_export_page(entity="membership", after=None, limit=1)
+    await db_handler.delete_team(team_id=first_page[-1][0])
+    second_page = await db_handler.select_export_page(entity="membership", after=first_page[-1], limit=10)
+
+    assert [row[:2] for row in first_page] == [("faketeam01", "fakeuser01")]
+    assert [row[:2] for row in second_page] == [("faketeam02", "fakeuser01")]
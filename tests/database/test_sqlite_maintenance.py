@@ -0,0 +1,86 @@
+import sqlite3
+import pytest
+
+from api.modules.database.config import CONFIG_SQLITE_MAINTENANCE
+from api.modules.database.sqlite_maintenance import SQLiteMaintenance
+from api.modules.database.sqlite_pool import SQLiteConnectionPool
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_churned_db(db_file: str, auto_vacuum: str):
+    db = sqlite3.connect(db_file)
+    db.execute(f"PRAGMA auto_vacuum = {auto_vacuum}")
+    db.execute("PRAGMA journal_mode = WAL")
+    with db:
+        db.execute("CREATE TABLE team_members (id_user VARCHAR, id_team VARCHAR, PRIMARY KEY (id_user, id_team))")
+        db.executemany("INSERT INTO team_members VALUES (?, ?)", [(f"user{i}" * 20, "team") for i in range(5000)])
+    with db:
+        db.execute("DELETE FROM team_members")
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    freelist_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+    db.close()
+    return freelist_pages
+
+
+def create_maintenance(db_file: str, **config):
+    pool = SQLiteConnectionPool(db_file, 2, {"journal_mode": "WAL"})
+    return pool, SQLiteMaintenance(pool, {**CONFIG_SQLITE_MAINTENANCE, "freelist_min_pages": 10,
+                                          "vacuum_step_pages": 100, "vacuum_step_sleep": 0, **config})
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_incremental_vacuum_and_checkpoint(tmp_path):
+    db_file = str(tmp_path / "ChurnDB.db")
+    freelist_pages = create_churned_db(db_file, "INCREMENTAL")
+    pool, maintenance = create_maintenance(db_file, wal_checkpoint_bytes=0)
+
+    status = await maintenance.run(force=True)
+    await pool.close(drain_timeout=1)
+
+    assert freelist_pages > 100
+    assert status["freelist_pages"] == 0
+    assert status["operations"]["incremental_vacuum"]["detail"]["released_pages"] > 100
+    assert set(status["operations"]) == {"optimize", "analyze", "wal_checkpoint", "incremental_vacuum"}
+    assert all(operation["duration"] >= 0 for operation in status["operations"].values())
+
+
+@pytest.mark.asyncio
+async def test_vacuum_converts_files_without_incremental_auto_vacuum_only_when_forced(tmp_path):
+    db_file = str(tmp_path / "ChurnDB.db")
+    freelist_pages = create_churned_db(db_file, "NONE")
+    pool, maintenance = create_maintenance(db_file)
+
+    scheduled_status = await maintenance.run()
+    scheduled_operations = set(scheduled_status["operations"])
+    scheduled_freelist_pages = scheduled_status["freelist_pages"]
+    skipped = scheduled_status["skipped"]
+    status = await maintenance.run(force=True)
+    async with pool.acquire() as db:
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        auto_vacuum = (await cursor.fetchone())[0]
+    await pool.close(drain_timeout=1)
+
+    assert scheduled_operations == {"optimize"}
+    assert scheduled_freelist_pages == freelist_pages
+    assert skipped.startswith("vacuum")
+    assert "vacuum" in status["operations"]
+    assert status["freelist_pages"] == 0
+    assert auto_vacuum == 2
+
+
+@pytest.mark.asyncio
+async def test_maintenance_is_skipped_under_load(tmp_path):
+    db_file = str(tmp_path / "ChurnDB.db")
+    create_churned_db(db_file, "INCREMENTAL")
+    pool, maintenance = create_maintenance(db_file, busy_threshold=0)
+
+    async with pool.acquire():
+        status = await maintenance.run()
+    await pool.close(drain_timeout=1)
+
+    assert status["skipped"] == "1 connections in use"
+    assert status["operations"] == {}
@@ -0,0 +1,85 @@
+import asyncio
+import shutil
+import pytest
+
+from api.modules.database.config import CONFIG_SQLITE
+from api.modules.database.sqlite_pool import SQLiteConnectionPool
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+@pytest.fixture
+def test_db_file(tmp_path):
+    """
+    Copy of the test DB, so tests never modify the tracked file
+    """
+    db_file = str(tmp_path / "TempDB.db")
+    shutil.copyfile(CONFIG_SQLITE["test"]["db_file"], db_file)
+    return db_file
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_acquire_reuses_connections(test_db_file):
+    pool = SQLiteConnectionPool(test_db_file, max_size=2, pragmas={"busy_timeout": 1000})
+
+    async with pool.acquire() as db_a:
+        cursor = await db_a.execute("PRAGMA busy_timeout")
+        busy_timeout = (await cursor.fetchone())[0]
+        await cursor.close()
+    async with pool.acquire() as db_b:
+        pass
+
+    assert busy_timeout == 1000
+    assert db_a is db_b
+    await pool.close(drain_timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_released_connection(test_db_file):
+    pool = SQLiteConnectionPool(test_db_file, max_size=1, pragmas={})
+
+    async def hold_connection():
+        async with pool.acquire():
+            await asyncio.sleep(0.05)
+
+    holder = asyncio.ensure_future(hold_connection())
+    await asyncio.sleep(0.01)
+    async with pool.acquire():
+        assert holder.done()
+
+    await pool.close(drain_timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_release_rolls_back_open_transaction(test_db_file):
+    pool = SQLiteConnectionPool(test_db_file, max_size=1, pragmas={})
+
+    async with pool.acquire() as db:
+        await db.execute("DELETE FROM users")
+        assert db.in_transaction
+
+    assert not db.in_transaction
+    await pool.close(drain_timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_close_drains_in_flight_work(test_db_file):
+    pool = SQLiteConnectionPool(test_db_file, max_size=1, pragmas={})
+    await pool.warm_up(1)
+
+    async def hold_connection():
+        async with pool.acquire():
+            await asyncio.sleep(0.05)
+
+    holder = asyncio.ensure_future(hold_connection())
+    await asyncio.sleep(0.01)
+    await pool.close(drain_timeout=1)
+
+    assert pool.in_flight == 0
+    await holder
+    with pytest.raises(RuntimeError):
+        async with pool.acquire():
+            pass
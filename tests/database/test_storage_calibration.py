@@ -0,0 +1,74 @@
+import aiosqlite
+import pytest
+
+from api.modules.data_classes import ImportUser, BaseTeam
+from api.modules.database.config import CONFIG_SQLITE_PROFILES
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.storage_calibration import calibrate, recommend
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+async def create_filled_db(db_file: str):
+    db_handler = SQLiteDBHandler(db_file=db_file)
+    users = [ImportUser(id=f"user{index:03}", name=f"User {index}", email=f"user{index}@example.com",
+                        password="password") for index in range(30)]
+    teams = [BaseTeam(id=f"team{index:02}", name=f"Team {index}", description="A team") for index in range(5)]
+    await db_handler.import_batch(users=users, teams=teams,
+                                  memberships=[(f"team{index % 5:02}", user.id) for index, user in enumerate(users)])
+    await db_handler.shutdown()
+
+
+async def read_pragma(db, name: str):
+    cursor = await db.execute(f"PRAGMA {name}")
+    value = (await cursor.fetchone())[0]
+    await cursor.close()
+    return value
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_profile_pragmas_are_applied_to_handler_connections(tmp_path):
+    db_handler = SQLiteDBHandler(db_file=str(tmp_path / "ProfileDB.db"), profile="read_heavy")
+    async with db_handler._connect() as db:
+        pragmas = {name: await read_pragma(db, name)
+                   for name in ("page_size", "mmap_size", "cache_size", "journal_mode")}
+    await db_handler.shutdown()
+
+    profile = CONFIG_SQLITE_PROFILES["read_heavy"]
+    assert pragmas == {"page_size": profile["page_size"], "mmap_size": profile["mmap_size"],
+                       "cache_size": profile["cache_size"], "journal_mode": "wal"}
+    with pytest.raises(ValueError):
+        SQLiteDBHandler(db_file=str(tmp_path / "ProfileDB.db"), profile="unknown")._get_pool()
+
+
+@pytest.mark.asyncio
+async def test_calibrate_compares_profiles_on_copies(tmp_path):
+    db_file = str(tmp_path / "CalibrationDB.db")
+    await create_filled_db(db_file)
+
+    report = await calibrate(db_file, profiles=["balanced", "read_heavy"], operations=50, concurrency=2,
+                             read_ratio=0.8)
+    async with aiosqlite.connect(db_file) as db:
+        page_size = await read_pragma(db, "page_size")
+        cursor = await db.execute("SELECT COUNT(*) FROM users WHERE name LIKE 'Calibrated%'")
+        calibrated_users = (await cursor.fetchone())[0]
+        await cursor.close()
+
+    assert set(report["profiles"]) == {"balanced", "read_heavy"}
+    assert report["recommended"] in report["profiles"]
+    assert all(result["operations_per_second"] > 0 for result in report["profiles"].values())
+    assert page_size == CONFIG_SQLITE_PROFILES["balanced"]["page_size"]  # The original file is left untouched
+    assert calibrated_users == 0
+    assert all(path.name.startswith("CalibrationDB.db") for path in tmp_path.iterdir())  # Copies are removed
+
+
+def test_recommend_respects_memory_budget():
+    results = {"fast": {"operations_per_second": 200, "memory_estimate_bytes": 100},
+               "lean": {"operations_per_second": 100, "memory_estimate_bytes": 10}}
+
+    assert recommend(results) == "fast"
+    assert recommend(results, memory_budget=50) == "lean"
+    assert recommend(results, memory_budget=1) == "lean"
@@ -0,0 +1,63 @@
+import pytest
+
+from api.modules.admission import AdmissionRejected
+from api.modules.config import CONFIG_TENANTS
+from api.modules.data_classes import BaseTeam
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.tenant_router import TenantRouter
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_tenant_router(directory: str, **config):
+    return TenantRouter({**CONFIG_TENANTS, "directory": directory, **config},
+                        lambda db_file: SQLiteDBHandler(db_file=db_file, pool_max_size=1))
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_tenants_are_isolated_in_their_own_files(tmp_path):
+    router = create_tenant_router(str(tmp_path))
+
+    await router.get("acme").insert_team(new_team=BaseTeam(id="faketeam01", name="ACME", description="d"))
+    acme_teams = await router.get("acme").select_teams()
+    globex_teams = await router.get("globex").select_teams()
+    await router.shutdown()
+
+    assert acme_teams == [("faketeam01", "ACME", "d")]
+    assert globex_teams == []
+    assert sorted(path.name for path in tmp_path.glob("*.db")) == ["acme.db", "globex.db"]
+    with pytest.raises(ValueError):
+        router.get("../escape")
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_and_idle_tenants_are_evicted(tmp_path):
+    router = create_tenant_router(str(tmp_path), max_open_tenants=2, idle_timeout=0)
+
+    for tenant_id in ("t1", "t2", "t1", "t3"):
+        await router.get(tenant_id).select_teams()
+    open_after_lru = router.open_tenants
+    async with router.lease("t1"):
+        evicted_idle = router.evict_idle()
+    open_after_idle = router.open_tenants
+    await router.shutdown()
+
+    assert open_after_lru == ["t1", "t3"]
+    assert evicted_idle == ["t3"]
+    assert open_after_idle == ["t1"]
+
+
+@pytest.mark.asyncio
+async def test_tenant_concurrency_cap(tmp_path):
+    router = create_tenant_router(str(tmp_path), max_concurrency=1, max_queue=0, queue_timeout=0.1)
+
+    async with router.lease("acme"):
+        with pytest.raises(AdmissionRejected):
+            await router.get("acme").select_teams()
+        other_tenant_teams = await router.get("globex").select_teams()
+    await router.shutdown()
+
+    assert other_tenant_teams == []
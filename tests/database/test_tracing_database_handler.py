@@ -0,0 +1,52 @@
+import shutil
+import pytest
+
+from api.modules.database.config import CONFIG_SQLITE
+from api.modules.database import sqlite_database_handler
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.tracing_database_handler import TracingDBHandler
+from api.modules.tracing import Tracer, InMemoryExporter
+
+# Set up connection config to a copy of the test DB, so tests never modify the tracked file ------------
+
+@pytest.fixture(autouse=True)
+async def test_db_copy(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "TempDB.db")
+    shutil.copyfile(CONFIG_SQLITE["test"]["db_file"], db_file)
+    monkeypatch.setattr(sqlite_database_handler, "connection_config", db_file)
+    yield
+    await SQLiteDBHandler().shutdown()
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_db_calls_are_traced_only_within_sampled_traces():
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter, sample_rate=1.0)
+    db_handler = TracingDBHandler(MockDBHandler(), tracer)
+
+    unsampled_row = await db_handler.select_team(team_id="my_id")
+    with tracer.start_trace("request"):
+        sampled_row = await db_handler.select_team(team_id="my_id")
+
+    assert unsampled_row == sampled_row == ("my_id", "my_name", "my_description")
+    assert [span.name for span in exporter.spans] == ["db.select_team", "request"]
+    assert exporter.spans[0].attributes == {"handler": "MockDBHandler"}
+
+
+@pytest.mark.asyncio
+async def test_sql_statements_are_traced(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(sqlite_database_handler, "tracer", Tracer(exporter, sample_rate=1.0))
+    db_handler = SQLiteDBHandler()
+
+    with sqlite_database_handler.tracer.start_trace("request"):
+        await db_handler.select_user(user_id="none_existing_id")
+
+    span_names = [span.name for span in exporter.spans]
+    assert span_names[0] == "sqlite.acquire"
+    assert "sql.execute" in span_names
+    assert any("FROM users" in span.attributes.get("statement", "") for span in exporter.spans)
@@ -0,0 +1,78 @@
+import os
+import pytest
+
+from typing import List
+from api.modules.data_classes import BaseTeam, ImportUser
+from api.modules.database.config import CONFIG_MEMBERSHIP_INDEX
+from api.modules.database.database_handler import DBHandlerException
+from api.modules.database.mock_database_handler import MockErrorDBHandler
+from api.modules.database.write_coordinator import CoordinatedDBHandler, decode_value, encode_value
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class RecordingDBHandler(MockErrorDBHandler):
+    """
+    Mock handler that records the teams it deletes, and fails every insert like MockErrorDBHandler
+    """
+
+    def __init__(self):
+        self.deleted_team_ids = []
+
+    async def delete_teams(self, team_ids: List[str]):
+        self.deleted_team_ids.extend(team_ids)
+        return await super().delete_teams(team_ids=team_ids)
+
+
+def create_coordinated_handler(directory: str, inner):
+    return CoordinatedDBHandler(inner, {"lock_file": os.path.join(directory, "writer.lock"),
+                                        "socket_path": os.path.join(directory, "writer.sock"),
+                                        "election_interval": 60.0, "forward_timeout": 1.0})
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_forwarded_values_keep_their_types():
+    value = {"teams": [BaseTeam(id="t", name="n", description="d")], "row": ("a", None), "ids": ["a", "b"],
+             "users": [ImportUser(id="u", name="n", email="e", password_hash="h")]}
+
+    assert decode_value(encode_value(value)) == value
+
+
+@pytest.mark.asyncio
+async def test_writes_are_forwarded_to_the_elected_writer(tmp_path):
+    writer_inner = RecordingDBHandler()
+    worker_inner = RecordingDBHandler()
+    writer = create_coordinated_handler(str(tmp_path), writer_inner)
+    worker = create_coordinated_handler(str(tmp_path), worker_inner)
+    await writer.startup()
+    await worker.startup()
+
+    roles = (writer.coordinator.is_writer, worker.coordinator.is_writer)
+    deleted_rows = await worker.delete_teams(["faketeam02", "faketeam01"])
+    with pytest.raises(DBHandlerException):
+        await worker.insert_team(new_team=BaseTeam(id="faketeam01", name="THE TEAM", description="d"))
+    selected_row = await worker.select_team(team_id="faketeam01")
+
+    await writer.shutdown()
+    await worker.delete_teams(team_ids=["faketeam03"])
+    roles_after_failover = (writer.coordinator.is_writer, worker.coordinator.is_writer)
+    await worker.shutdown()
+
+    assert roles == (True, False)
+    assert deleted_rows == [("faketeam01", "my_name", "my_description"), ("faketeam02", "my_name", "my_description")]
+    assert selected_row == ("faketeam01", "my_name", "my_description")
+    assert writer_inner.deleted_team_ids == ["faketeam02", "faketeam01"]
+    assert worker_inner.deleted_team_ids == ["faketeam03"]
+    assert roles_after_failover == (False, True)
+
+
+@pytest.mark.asyncio
+async def test_startup_fails_with_membership_index_enabled(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG_MEMBERSHIP_INDEX, "enabled", True)
+    coordinated_handler = create_coordinated_handler(str(tmp_path), RecordingDBHandler())
+
+    with pytest.raises(ValueError):
+        await coordinated_handler.startup()
+    assert not coordinated_handler.coordinator.is_writer
@@ -1,7 +1,11 @@
+import asyncio
 import pytest
 
 from httpx import AsyncClient
+from api.modules.database import DBHandlerRegistry
+from api.modules.database.job_store import SQLiteJobStore
 from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.jobs import JobManager
 from api import app
 
 
@@ -52,6 +56,15 @@ async def test_delete_user(configure_mock_dependency):
     assert response.json() == {"id": "mock_id", "name": "my_name", "email": "my_email"}
 
 
+@pytest.mark.asyncio
+async def test_delete_users(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.post("/users/bulk-delete", json={"ids": ["mock_id_2", "mock_id_1"]})
+    assert response.status_code == 200
+    assert response.json() == [{"id": "mock_id_1", "name": "my_name", "email": "my_email"},
+                               {"id": "mock_id_2", "name": "my_name", "email": "my_email"}]
+
+
 @pytest.mark.asyncio
 async def test_create_team(configure_mock_dependency):
     async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
@@ -93,6 +106,14 @@ async def test_delete_team(configure_mock_dependency):
     assert response.json() == {"id": "mock_id", "name": "my_name", "description": "my_description"}
 
 
+@pytest.mark.asyncio
+async def test_delete_teams(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.post("/teams/bulk-delete", json={"ids": ["mock_id"]})
+    assert response.status_code == 200
+    assert response.json() == [{"id": "mock_id", "name": "my_name", "description": "my_description"}]
+
+
 @pytest.mark.asyncio
 async def test_read_user_teams(configure_mock_dependency):
     async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
@@ -119,6 +140,31 @@ async def test_add_team_member(configure_mock_dependency):
     assert response.json() == {"id_team": "mock_team_id", "id_user": "mock_user_id"}
 
 
+@pytest.mark.asyncio
+async def test_sync_team_members(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.put("/teams/mock_team_id/members", json={"user_ids": ["my_id_3", "my_id_1", "my_id_3"]})
+    assert response.status_code == 200
+    assert response.json() == {"added": ["my_id_3"], "removed": ["my_id_2"]}
+
+
+@pytest.mark.asyncio
+async def test_relationship_queries(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        teammates_response = await ac.get("/users/mock_user_id/teammates?limit=1")
+        shared_teams_response = await ac.get("/users/mock_user_id/shared-teams/other_user_id")
+        set_members_response = await ac.get("/teams/members?union=team_a&intersect=team_b&except=team_c")
+    assert teammates_response.status_code == 200
+    assert teammates_response.json() == {"total": 2, "teammates": [
+        {"id": "my_id_1", "name": "my_name_1", "email": "my_email_1", "shared_teams": 2}]}
+    assert shared_teams_response.status_code == 200
+    assert shared_teams_response.json()["total"] == 2
+    assert set_members_response.status_code == 200
+    assert set_members_response.json() == {"total": 2, "users": [
+        {"id": "my_id_1", "name": "my_name_1", "email": "my_email_1"},
+        {"id": "my_id_2", "name": "my_name_2", "email": "my_email_2"}]}
+
+
 @pytest.mark.asyncio
 async def test_delete_team_member(configure_mock_dependency):
     async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
@@ -127,3 +173,122 @@ async def test_delete_team_member(configure_mock_dependency):
     assert response.json() == {"id_team": "mock_team_id", "id_user": "mock_user_id"}
 
 
+
+
+@pytest.mark.asyncio
+async def test_read_changes(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/changes", params={"since": 10, "limit": 5})
+    assert response.status_code == 200
+    assert response.json() == {"changes": [{"seq": 11, "entity": "user", "entity_id": "my_id_1", "operation": "insert",
+                                            "data": {"id": "my_id_1", "name": "my_name_1", "email": "my_email_1"},
+                                            "created_at": 1.0},
+                                           {"seq": 12, "entity": "membership", "entity_id": "my_id_2:my_id_1",
+                                            "operation": "delete", "data": None, "created_at": 2.0}],
+                               "last_seq": 12,
+                               "resync_required": False}
+
+
+@pytest.mark.asyncio
+async def test_read_metrics(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        await ac.get("/users")
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert 'admission_queue_seconds_count{endpoint_class="read"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_read_team_with_counts(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/teams/mock_id", params={"include_counts": True})
+    assert response.status_code == 200
+    assert response.json() == {"id": "mock_id", "name": "my_name", "description": "my_description", "member_count": 2}
+
+
+@pytest.mark.asyncio
+async def test_read_team_members_with_counts(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/teams/mock_id/members", params={"include_counts": True})
+    assert response.status_code == 200
+    assert response.json() == [{"id": "my_id_1", "name": "my_name_1", "email": "my_email_1", "team_count": 2},
+                               {"id": "my_id_2", "name": "my_name_2", "email": "my_email_2", "team_count": 2}]
+
+
+@pytest.mark.asyncio
+async def test_read_stats(configure_mock_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/stats", params={"top": 1})
+    assert response.status_code == 200
+    assert response.json() == {"largest_teams": [{"id": "my_id_1", "name": "my_name_1", "description": "my_description_1",
+                                                  "member_count": 2}],
+                               "team_size_distribution": {"1": 1, "2": 1},
+                               "user_team_count_distribution": {"0": 1, "1": 1, "2": 1}}
+
+
+@pytest.mark.asyncio
+async def test_import_data(configure_mock_dependency):
+    body = ('{"type": "team", "id": "mock_id", "name": "my_name", "description": "my_description"}\n'
+            '{"type": "membership", "id_team": "mock_id"}\n')
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.post("/import", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["imported"] == {"user": 0, "team": 1, "membership": 0}
+    assert response.json()["errors"] == [{"line": 2, "error": "id_team and id_user are required strings"}]
+
+
+@pytest.mark.asyncio
+async def test_export_data(configure_mock_dependency, monkeypatch):
+    monkeypatch.setitem(app.CONFIG_ADMIN, "token", "admin_token")
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/export")
+        admin_response = await ac.get("/export?include_password_hashes=true", headers={"x-admin-token": "admin_token"})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == '{"type": "user", "id": "my_id_1", "name": "my_name_1", "email": "my_email_1"}'
+    assert admin_response.status_code == 200
+    assert '"password_hash": "my_hash_1"' in admin_response.text.splitlines()[0]
+
+
+@pytest.mark.asyncio
+async def test_background_bulk_delete_job(configure_mock_dependency, tmp_path):
+    app.app.state.job_manager = JobManager(SQLiteJobStore(str(tmp_path / "JobsDB.db")), lambda db_choice: MockDBHandler(),
+                                           max_concurrency=1, chunk_pause=0)
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.post("/users/bulk-delete?background=true", json={"ids": ["mock_id_1", "mock_id_2"]})
+        job_id = response.json()["job_id"]
+        while (await ac.get(f"/jobs/{job_id}")).json()["status"] in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        job_response = await ac.get(f"/jobs/{job_id}")
+    await app.app.state.job_manager.stop()
+
+    assert response.status_code == 202
+    assert response.headers["location"] == f"/jobs/{job_id}"
+    assert job_response.status_code == 200
+    assert job_response.json()["status"] == "succeeded"
+    assert job_response.json()["result"] == {"deleted": 2}
+
+
+@pytest.mark.asyncio
+async def test_fault_injection_settings(monkeypatch):
+    monkeypatch.setitem(app.CONFIG_ADMIN, "token", "admin_token")
+    disabled_backend = app.get_backend("faults")
+    monkeypatch.setitem(app.CONFIG_FAULT_INJECTION, "enabled", True)
+    monkeypatch.setattr(app.app.state, "db_registry", DBHandlerRegistry({"sqlite": app.build_sqlite_backend,
+                                                                         "faults": app.build_fault_injection_backend}))
+    headers = {"x-admin-token": "admin_token"}
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        update_response = await ac.put("/admin/faults/select_users", headers=headers,
+                                       json={"latency_distribution": "lognormal", "latency_ms": 50, "error_rate": 0.1})
+        unknown_method_response = await ac.put("/admin/faults/drop_everything", headers=headers, json={})
+        read_response = await ac.get("/admin/faults", headers=headers)
+        clear_response = await ac.delete("/admin/faults", headers=headers)
+        monkeypatch.setitem(app.CONFIG_FAULT_INJECTION, "enabled", False)
+        disabled_response = await ac.get("/admin/faults", headers=headers)
+
+    assert disabled_backend is None
+    assert update_response.status_code == 200
+    assert unknown_method_response.status_code == 404
+    assert read_response.json()["select_users"]["latency_ms"] == 50
+    assert read_response.json()["select_users"]["error_rate"] == 0.1
+    assert list(clear_response.json()) == ["select_users"]
+    assert disabled_response.status_code == 404
@@ -1,7 +1,9 @@
 import pytest
 
 from httpx import AsyncClient
+from api.modules.database.job_store import SQLiteJobStore
 from api.modules.database.mock_database_handler import MockErrorDBHandler
+from api.modules.jobs import JobManager
 from api import app
 
 
@@ -48,3 +50,53 @@ async def test_add_team_member_error(configure_mock_error_dependency):
         response = await ac.post("/teams/mock_team_id/members", json={"user_id": "mock_user_id"})
     assert response.status_code == 400
 
+
+@pytest.mark.asyncio
+async def test_sync_team_members_error(configure_mock_error_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.put("/teams/mock_team_id/members", json={"user_ids": ["mock_user_id"]})
+    assert response.status_code == 400
+
+
+
+@pytest.mark.asyncio
+async def test_team_set_members_without_teams_error(configure_mock_error_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        only_except_response = await ac.get("/teams/members?except=mock_team_id")
+        too_many_teams_response = await ac.get("/teams/members", params={"union": [f"team_{i}" for i in range(51)]})
+    assert only_except_response.status_code == 400
+    assert too_many_teams_response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_admin_endpoint_without_token_error(configure_mock_error_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/admin/backups", headers={"x-admin-token": "wrong_token"})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_export_password_hashes_without_token_error(configure_mock_error_dependency, monkeypatch):
+    monkeypatch.setitem(app.CONFIG_ADMIN, "token", "admin_token")
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        missing_token_response = await ac.get("/export?include_password_hashes=true")
+        wrong_token_response = await ac.get("/export?include_password_hashes=true", headers={"x-admin-token": "wrong"})
+    assert missing_token_response.status_code == 403
+    assert wrong_token_response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_without_ids_error(configure_mock_error_dependency):
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.post("/users/bulk-delete", json={"ids": []})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_read_unknown_job_error(configure_mock_error_dependency, tmp_path):
+    app.app.state.job_manager = JobManager(SQLiteJobStore(str(tmp_path / "JobsDB.db")), lambda db_choice: None,
+                                           max_concurrency=1, chunk_pause=0)
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/jobs/none_existing_id")
+    await app.app.state.job_manager.stop()
+    assert response.status_code == 404
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+
+from api.modules.admission import AdmissionLimiter, AdmissionRejected, AdmissionControlMiddleware
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+async def hold_slot(limiter: AdmissionLimiter, seconds: float):
+    await limiter.acquire()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        limiter.release()
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_acquire_within_limit():
+    limiter = AdmissionLimiter("read", max_concurrency=2, max_queue=0, queue_timeout=1)
+
+    await limiter.acquire()
+    await limiter.acquire()
+    assert limiter.active == 2
+
+    limiter.release()
+    limiter.release()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_acquire_rejects_when_queue_is_full():
+    limiter = AdmissionLimiter("write", max_concurrency=1, max_queue=0, queue_timeout=1)
+    await limiter.acquire()
+
+    with pytest.raises(AdmissionRejected) as e:
+        await limiter.acquire()
+
+    assert e.value.reason == "queue_full"
+    assert e.value.retry_after == 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_rejects_after_queue_timeout():
+    limiter = AdmissionLimiter("write", max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    holder = asyncio.ensure_future(hold_slot(limiter, 0.2))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(AdmissionRejected) as e:
+        await limiter.acquire()
+
+    assert e.value.reason == "queue_timeout"
+    await holder
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_released_slot_is_handed_to_waiter():
+    limiter = AdmissionLimiter("read", max_concurrency=1, max_queue=1, queue_timeout=1)
+    holder = asyncio.ensure_future(hold_slot(limiter, 0.05))
+    await asyncio.sleep(0.01)
+
+    await limiter.acquire()
+    assert holder.done()
+    assert limiter.active == 1
+    limiter.release()
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_load_with_retry_after():
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(0.1)
+
+    config = {"enabled": True, "exempt_paths": [],
+              "classes": {"read": {"max_concurrency": 1, "max_queue": 0, "queue_timeout": 1},
+                          "write": {"max_concurrency": 1, "max_queue": 0, "queue_timeout": 1}}}
+    middleware = AdmissionControlMiddleware(slow_app, config=config)
+    scope = {"type": "http", "method": "GET", "path": "/users"}
+    sent_messages = []
+
+    async def send(message):
+        sent_messages.append(message)
+
+    first_request = asyncio.ensure_future(middleware(scope, None, send))
+    await asyncio.sleep(0.01)
+    await middleware(scope, None, send)
+    await first_request
+
+    assert sent_messages[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent_messages[0]["headers"]
+
+
+@pytest.mark.asyncio
+async def test_tenant_long_polls_are_exempt():
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(0.1)
+
+    config = {"enabled": True, "exempt_paths": ["/changes"],
+              "classes": {"read": {"max_concurrency": 1, "max_queue": 0, "queue_timeout": 1},
+                          "write": {"max_concurrency": 1, "max_queue": 0, "queue_timeout": 1}}}
+    middleware = AdmissionControlMiddleware(slow_app, config=config, tenant_path_prefix="/tenants")
+
+    long_poll = asyncio.ensure_future(middleware({"type": "http", "method": "GET", "path": "/tenants/t1/changes"},
+                                                 None, None))
+    await asyncio.sleep(0.01)
+    active_during_long_poll = middleware.limiters["read"].active
+    tenant_read = asyncio.ensure_future(middleware({"type": "http", "method": "GET", "path": "/tenants/t1/users"},
+                                                   None, None))
+    await asyncio.sleep(0.01)
+    active_during_tenant_read = middleware.limiters["read"].active
+    await asyncio.gather(long_poll, tenant_read)
+
+    assert active_during_long_poll == 0
+    assert active_during_tenant_read == 1
+    assert not middleware._is_exempt("/tenants/changes") and not middleware._is_exempt("/users")
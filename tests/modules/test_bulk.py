@@ -0,0 +1,133 @@
+import pytest
+
+from api.modules.bulk import parse_ndjson, parse_csv, validate_record, import_records, export_records, \
+    read_file_chunks, write_file_chunks
+from api.modules.database.mock_database_handler import MockDBHandler
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+async def stream_chunks(data: bytes, chunk_size: int = 7):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+async def collect(async_iterator):
+    return [item async for item in async_iterator]
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_parse_ndjson():
+    data = b'{"type": "team", "id": "t1"}\n\n[1, 2]\nnot json\r\n{"type": "user"}'
+
+    rows = await collect(parse_ndjson(stream_chunks(data)))
+
+    assert rows[0] == (1, {"type": "team", "id": "t1"}, None)
+    assert rows[1][0] == 3 and rows[1][2] == "Invalid JSON: expected an object"
+    assert rows[2][0] == 4 and rows[2][2].startswith("Invalid JSON")
+    assert rows[3] == (5, {"type": "user"}, None)
+
+
+@pytest.mark.asyncio
+async def test_parse_csv():
+    data = b'type,id,name,description\nteam,t1,"Team, One",desc\nteam,t2\nteam,t3,Team Three,\n'
+
+    rows = await collect(parse_csv(stream_chunks(data)))
+
+    assert rows[0] == (2, {"type": "team", "id": "t1", "name": "Team, One", "description": "desc"}, None)
+    assert rows[1] == (3, None, "Invalid CSV: expected 4 fields, got 2")
+    assert rows[2] == (4, {"type": "team", "id": "t3", "name": "Team Three"}, None)
+
+
+@pytest.mark.asyncio
+async def test_parse_invalid_utf8_lines():
+    ndjson_data = (b'{"type": "team", "id": "t1", "name": "n", "description": "d"}\n'
+                   b'{"type": "team", "id": "t\xff", "name": "n", "description": "d"}\n'
+                   b'{"type": "team", "id": "t3", "name": "n", "description": "d"}')
+    csv_data = b'type,id\nteam,t\xe9\nteam,t3\n'
+
+    ndjson_rows = await collect(parse_ndjson(stream_chunks(ndjson_data)))
+    csv_rows = await collect(parse_csv(stream_chunks(csv_data)))
+    summary = await import_records(parse_ndjson(stream_chunks(ndjson_data)), MockDBHandler(), batch_size=10)
+
+    assert [row[0] for row in ndjson_rows] == [1, 2, 3]
+    assert ndjson_rows[1][1] is None and ndjson_rows[1][2].startswith("Invalid UTF-8")
+    assert ndjson_rows[2] == (3, {"type": "team", "id": "t3", "name": "n", "description": "d"}, None)
+    assert csv_rows[0][0] == 2 and csv_rows[0][2].startswith("Invalid UTF-8")
+    assert csv_rows[1] == (3, {"type": "team", "id": "t3"}, None)
+    assert summary.imported["team"] == 2
+    assert [error.line for error in summary.errors] == [2]
+
+
+def test_validate_record():
+    assert validate_record({"type": "membership", "id_team": "t1", "id_user": "u1"}) == ("membership", ("t1", "u1"))
+    assert validate_record({"type": "user", "id": "u1", "name": "n", "email": "e", "password_hash": "h"})[1].password_hash == "h"
+
+    with pytest.raises(ValueError):
+        validate_record({"type": "user", "id": "u1", "name": "n", "email": "e"})
+    with pytest.raises(ValueError):
+        validate_record({"type": "team", "id": "t1"})
+    with pytest.raises(ValueError):
+        validate_record({"type": "group", "id": "g1"})
+
+
+@pytest.mark.asyncio
+async def test_import_records_in_batches():
+    data = (b'{"type": "user", "id": "u1", "name": "n", "email": "e", "password": "p"}\n'
+            b'{"type": "team", "id": "t1", "name": "n", "description": "d"}\n'
+            b'{"type": "team", "id": "t2"}\n'
+            b'{"type": "membership", "id_team": "t1", "id_user": "u1"}\n')
+
+    summary = await import_records(parse_ndjson(stream_chunks(data)), MockDBHandler(), batch_size=2)
+
+    assert summary.processed == 4
+    assert summary.imported == {"user": 1, "team": 1, "membership": 1}
+    assert summary.failed == 1
+    assert summary.errors[0].line == 3
+
+
+@pytest.mark.asyncio
+async def test_import_records_reports_last_line_of_every_batch():
+    data = (b'{"type": "membership", "id_team": "t1", "id_user": "u1"}\n'
+            b'{"type": "user", "id": "u1", "name": "n", "email": "e", "password": "p"}\n'
+            b'{"type": "team", "id": "t1", "name": "n", "description": "d"}\n'
+            b'{"type": "membership", "id_team": "t2", "id_user": "u2"}\n')
+    flushed_lines = []
+
+    async def on_flush(line_number, summary):
+        flushed_lines.append((line_number, summary.processed))
+
+    await import_records(parse_ndjson(stream_chunks(data)), MockDBHandler(), batch_size=3, on_flush=on_flush)
+
+    assert flushed_lines == [(3, 3), (4, 4)]
+
+
+@pytest.mark.asyncio
+async def test_write_file_chunks(tmp_path):
+    data = b"".join(f'{{"type": "user", "id": "user{index}"}}\n'.encode() for index in range(100))
+    path = str(tmp_path / "spooled.ndjson")
+
+    async def failing_stream():
+        yield b"partial"
+        raise ConnectionError()
+
+    await write_file_chunks(stream_chunks(data), path, buffer_size=64)
+    written = b"".join(await collect(read_file_chunks(path)))
+    with pytest.raises(ConnectionError):
+        await write_file_chunks(failing_stream(), str(tmp_path / "failed.ndjson"))
+
+    assert written == data
+    assert [file.name for file in tmp_path.iterdir()] == ["spooled.ndjson"]
+
+
+@pytest.mark.asyncio
+async def test_export_records_as_csv():
+    lines = await collect(export_records(MockDBHandler(), "csv", include_password_hashes=False))
+
+    assert lines == ["type,id,name,email,password,password_hash,description,id_team,id_user\n",
+                     "user,my_id_1,my_name_1,my_email_1,,,,,\n",
+                     "team,my_id_1,my_name_1,,,,my_description_1,,\n",
+                     "membership,,,,,,,my_id_1,my_id_1\n"]
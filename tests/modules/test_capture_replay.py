@@ -0,0 +1,59 @@
+import json
+import os
+import pytest
+
+from httpx import AsyncClient
+from api.modules.capture import CaptureMiddleware, CaptureWriter, scrub
+from api.modules.config import CONFIG_CAPTURE
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.replay import load_capture, build_request, replay, summarize, compare
+from api import app
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_scrub_nested_secrets():
+    assert scrub({"id": "u1", "password": "123", "users": [{"password_hash": "abc"}]}) == \
+           {"id": "u1", "password": "<scrubbed>", "users": [{"password_hash": "<scrubbed>"}]}
+
+
+@pytest.mark.asyncio
+async def test_capture_and_replay(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.app.dependency_overrides, app.database_dependency, MockDBHandler)
+    capture_file = str(tmp_path / "capture.jsonl")
+    capture_writer = CaptureWriter(capture_file, flush_interval=60.0)
+    capturing_app = CaptureMiddleware(app.app, {**CONFIG_CAPTURE, "enabled": True}, app.app.router, capture_writer)
+
+    async with AsyncClient(app=capturing_app, base_url="http://localhost:8000") as ac:
+        await ac.post("/users", json={"id": "u 1", "name": "John", "email": "j@gmail.com", "password": "123abc"})
+        await ac.get("/users/u 1?include_counts=true")
+        await ac.post("/import?format=ndjson", content=b'{"type": "team", "id": "t1", "name": "n", "description": "d"}\n')
+
+    written_during_requests = os.path.exists(capture_file)
+    await capture_writer.close()
+    records = load_capture(capture_file)
+    with open(capture_file) as raw_capture:
+        raw_capture_content = raw_capture.read()
+
+    assert not written_during_requests
+    assert "123abc" not in raw_capture_content
+    assert [(record["method"], record["route"], record["status"]) for record in records] == [
+        ("POST", "/users", 200), ("GET", "/users/{user_id}", 200), ("POST", "/import", 200)]
+    assert records[0]["body"]["password"] == "<scrubbed>"
+    assert records[1]["path_params"] == {"user_id": "u 1"}
+    assert records[1]["query"] == [["include_counts", "true"]]
+    assert records[2]["body"] is None and records[2]["body_size"] > 0
+    assert build_request(records[1]) == ("GET", "/users/u%201?include_counts=true", None)
+    assert build_request(records[0])[2]["password"] == "replayed-secret"
+    assert build_request(records[2]) is None
+
+    summary = summarize(await replay(app.app, records, speed=0))
+    comparison = compare(summary, {route: {**values, "p50": values["p50"] * 2} for route, values in summary.items()
+                                   if values["p50"] is not None})
+
+    assert summary["GET /users/{user_id}"]["count"] == 1 and summary["GET /users/{user_id}"]["errors"] == 0
+    assert summary["POST /import"]["skipped"] == 1
+    assert comparison["GET /users/{user_id}"]["p50"]["ratio"] == pytest.approx(2)
+    assert comparison["POST /import"]["p50"]["ratio"] is None
+    assert json.loads(json.dumps(comparison)) == comparison
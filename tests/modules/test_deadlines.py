@@ -0,0 +1,110 @@
+import asyncio
+import time
+import pytest
+
+from api import app
+from api.modules.config import CONFIG_DEADLINES
+from api.modules.deadlines import Deadline, DeadlineExceeded, DeadlineMiddleware, current_deadline, run_with_deadline
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.database.single_flight_database_handler import SingleFlightDBHandler
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler, interrupted_statements_counter
+
+# Counts to 100 million, which takes SQLite several seconds
+SLOW_QUERY = ("WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < 100000000) "
+              "SELECT COUNT(*) FROM counter")
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class BlockedDBHandler(MockDBHandler):
+    """
+    Mock handler whose user reads wait until released, recording the deadline they run under
+    """
+
+    def __init__(self):
+        self.released = asyncio.Event()
+        self.deadlines = []
+
+    async def select_user(self, user_id: str):
+        self.deadlines.append(current_deadline())
+        await self.released.wait()
+        return await super().select_user(user_id=user_id)
+
+
+async def slow_query(db_handler: SQLiteDBHandler):
+    async with db_handler._connect() as db:
+        cursor = await db.execute(SLOW_QUERY)
+        return await cursor.fetchone()
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_interrupts_the_running_statement(tmp_path):
+    db_handler = SQLiteDBHandler(db_file=str(tmp_path / "DeadlineDB.db"), pool_max_size=1)
+    await db_handler.select_teams()
+    interrupted_before = interrupted_statements_counter.value(reason="deadline")
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        await asyncio.ensure_future(run_with_deadline(Deadline(0.05), slow_query(db_handler)))
+    interrupted_after = time.perf_counter() - started
+    teams = await db_handler.select_teams()  # The only connection of the pool is free again
+    cancelled_deadline = Deadline()
+    cancelled_deadline.cancel("disconnect")
+    with pytest.raises(DeadlineExceeded):
+        await asyncio.ensure_future(run_with_deadline(cancelled_deadline, db_handler.select_teams()))
+    await db_handler.shutdown()
+
+    assert interrupted_after < 1
+    assert teams == []
+    assert interrupted_statements_counter.value(reason="deadline") == interrupted_before + 1
+
+
+@pytest.mark.asyncio
+async def test_shared_reads_are_cancelled_when_every_caller_gave_up():
+    inner = BlockedDBHandler()
+    db_handler = SingleFlightDBHandler(inner)
+
+    patient_caller = asyncio.ensure_future(db_handler.select_user(user_id="my_id"))
+    with pytest.raises(DeadlineExceeded):
+        await asyncio.ensure_future(run_with_deadline(Deadline(0.01), db_handler.select_user(user_id="my_id")))
+    inner.released.set()
+    patient_result = await patient_caller
+
+    inner.released.clear()
+    with pytest.raises(DeadlineExceeded):
+        await asyncio.ensure_future(run_with_deadline(Deadline(0.01),
+                                                        db_handler.select_user(user_id="my_other_id")))
+
+    assert patient_result == ("my_id", "my_name", "my_email")
+    assert inner.deadlines[0].reason is None
+    assert inner.deadlines[1].reason == "deadline"
+    inner.released.set()
+
+
+@pytest.mark.asyncio
+async def test_middleware_cancels_the_deadline_on_disconnect():
+    reasons = []
+
+    async def endpoint(scope, receive, send):
+        cancelled = asyncio.get_running_loop().create_future()
+        current_deadline().on_cancel(cancelled.set_result)
+        reasons.append(await cancelled)
+
+    async def receive():
+        if not reasons and not messages:
+            await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+        return messages.pop(0)
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    middleware = DeadlineMiddleware(endpoint, CONFIG_DEADLINES, app.app.router)
+    scope = {"type": "http", "method": "GET", "path": "/users", "headers": [], "query_string": b""}
+    await middleware(scope, receive, None)
+
+    assert reasons == ["disconnect"]
+    assert middleware._timeout(scope) == 10.0
+    assert middleware._timeout({**scope, "path": "/changes"}) is None
+    assert middleware._timeout({**scope, "path": "/users/my_id"}) == CONFIG_DEADLINES["default"]
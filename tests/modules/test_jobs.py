@@ -0,0 +1,197 @@
+import asyncio
+import pytest
+
+from api.modules.data_classes import BaseTeam, ImportUser
+from api.modules.database.job_store import SQLiteJobStore
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.database.sqlite_database_handler import SQLiteDBHandler
+from api.modules.database.wrapper_database_handler import DBHandlerWrapper
+from api.modules.jobs import JobManager
+
+
+# Utility classes for tests ----------------------------------------------------------------------------
+
+class InterruptedImportDBHandler(MockDBHandler):
+    """
+    Mock handler that records the ids of every imported team, hanging on the second batch until released
+    """
+
+    def __init__(self):
+        self.imported_ids = []
+        self.release = asyncio.Event()
+
+    async def import_batch(self, users, teams, memberships):
+        if self.imported_ids and not self.release.is_set():
+            await asyncio.sleep(3600)  # Simulates a long import interrupted by a restart
+        self.imported_ids.extend(team.id for team in teams)
+        return await super().import_batch(users=users, teams=teams, memberships=memberships)
+
+
+class RecordingDBHandler(DBHandlerWrapper):
+    """
+    Wrapper that records the amount of memberships deleted by every call to delete_team_members
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.deleted_member_chunks = []
+
+    async def delete_team_members(self, team_id: str, limit: int):
+        deleted_rows = await self.inner.delete_team_members(team_id=team_id, limit=limit)
+        self.deleted_member_chunks.append(len(deleted_rows))
+        return deleted_rows
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_job_manager(db_file: str, handlers: dict = None):
+    return JobManager(SQLiteJobStore(db_file), lambda db_choice: MockDBHandler(), max_concurrency=2, chunk_pause=0,
+                      handlers=handlers)
+
+
+async def wait_for_job(job_manager: JobManager, job_id: str):
+    for _ in range(200):
+        job = await job_manager.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_delete_records_job_in_chunks(tmp_path):
+    job_manager = create_job_manager(str(tmp_path / "JobsDB.db"))
+
+    job_id = await job_manager.submit("delete_records", {"entity": "team", "ids": [f"id{i}" for i in range(5)],
+                                                         "chunk_size": 2}, db_choice="mock")
+    job = await wait_for_job(job_manager, job_id)
+    await job_manager.stop()
+
+    assert job["status"] == "succeeded"
+    assert (job["progress_done"], job["progress_total"]) == (5, 5)
+    assert job["result"] == {"deleted": 5}
+    assert job["parameters"]["db_choice"] == "mock"
+
+
+@pytest.mark.asyncio
+async def test_import_job_removes_spooled_file(tmp_path):
+    spooled_file = tmp_path / "import.ndjson"
+    spooled_file.write_bytes(b'{"type": "team", "id": "t1", "name": "THE TEAM", "description": "d"}\n{"type": "nope"}\n')
+    job_manager = create_job_manager(str(tmp_path / "JobsDB.db"))
+
+    job_id = await job_manager.submit("import", {"path": str(spooled_file), "format": "ndjson", "batch_size": 1},
+                                      db_choice="mock")
+    job = await wait_for_job(job_manager, job_id)
+    await job_manager.stop()
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["imported"]["team"] == 1 and job["result"]["failed"] == 1
+    assert not spooled_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_and_unknown_kind(tmp_path):
+    async def failing_job(db_handler, parameters, state, checkpoint):
+        raise RuntimeError("boom")
+
+    job_manager = create_job_manager(str(tmp_path / "JobsDB.db"), {"fail": failing_job})
+
+    job = await wait_for_job(job_manager, await job_manager.submit("fail", {}, db_choice="mock"))
+    with pytest.raises(ValueError):
+        await job_manager.submit("unknown", {}, db_choice="mock")
+    await job_manager.stop()
+
+    assert job["status"] == "failed"
+    assert "boom" in job["error"]
+
+
+@pytest.mark.asyncio
+async def test_jobs_resume_from_last_checkpoint_after_restart(tmp_path):
+    db_file = str(tmp_path / "JobsDB.db")
+    seen_states = []
+    release = asyncio.Event()
+
+    async def counting_job(db_handler, parameters, state, checkpoint):
+        seen_states.append(state)
+        position = state["position"] if state else 0
+        while position < parameters["total"]:
+            position += 1
+            await checkpoint({"position": position}, position, parameters["total"])
+            if position == 2 and not release.is_set():
+                await asyncio.sleep(3600)  # Simulates a long job interrupted by a restart
+        return {"position": position}
+
+    job_manager = create_job_manager(db_file, {"count": counting_job})
+    job_id = await job_manager.submit("count", {"total": 4}, db_choice="mock")
+    while (await job_manager.get(job_id))["progress_done"] < 2:
+        await asyncio.sleep(0.01)
+    await job_manager.stop()
+
+    release.set()
+    job_manager = create_job_manager(db_file, {"count": counting_job})
+    interrupted_job = await job_manager.get(job_id)
+    await job_manager.start()
+    job = await wait_for_job(job_manager, job_id)
+    await job_manager.stop()
+
+    assert interrupted_job["status"] == "running"
+    assert seen_states == [None, {"position": 2}]
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"position": 4}
+
+
+@pytest.mark.asyncio
+async def test_import_job_resumes_after_restart(tmp_path):
+    db_file = str(tmp_path / "JobsDB.db")
+    spooled_file = tmp_path / "import.ndjson"
+    spooled_file.write_bytes(b"".join(b'{"type": "team", "id": "t%d", "name": "Team %d", "description": "d"}\n'
+                                      % (index, index) for index in range(4)))
+    db_handler = InterruptedImportDBHandler()
+
+    job_manager = JobManager(SQLiteJobStore(db_file), lambda db_choice: db_handler, max_concurrency=1, chunk_pause=0)
+    job_id = await job_manager.submit("import", {"path": str(spooled_file), "format": "ndjson", "batch_size": 2},
+                                      db_choice="mock")
+    while (await job_manager.get(job_id))["progress_done"] < 2:
+        await asyncio.sleep(0.01)
+    await job_manager.stop()
+    kept_after_stop = spooled_file.exists()
+
+    db_handler.release.set()
+    job_manager = JobManager(SQLiteJobStore(db_file), lambda db_choice: db_handler, max_concurrency=1, chunk_pause=0)
+    await job_manager.start()
+    job = await wait_for_job(job_manager, job_id)
+    await job_manager.stop()
+
+    assert kept_after_stop
+    assert job["status"] == "succeeded"
+    assert job["result"]["imported"]["team"] == 4 and job["result"]["failed"] == 0
+    assert db_handler.imported_ids == ["t0", "t1", "t2", "t3"]
+    assert not spooled_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_delete_records_job_empties_large_teams_in_chunks(tmp_path):
+    sqlite_handler = SQLiteDBHandler(db_file=str(tmp_path / "LargeTeamDB.db"))
+    users = [ImportUser(id=f"user{index}", name="n", email="e", password="p") for index in range(5)]
+    await sqlite_handler.import_batch(users=users, teams=[BaseTeam(id="big", name="Big team", description="d")],
+                                      memberships=[("big", user.id) for user in users])
+    db_handler = RecordingDBHandler(sqlite_handler)
+
+    job_manager = JobManager(SQLiteJobStore(str(tmp_path / "JobsDB.db")), lambda db_choice: db_handler,
+                             max_concurrency=1, chunk_pause=0)
+    job_id = await job_manager.submit("delete_records", {"entity": "team", "ids": ["big"], "chunk_size": 2},
+                                      db_choice="sqlite")
+    job = await wait_for_job(job_manager, job_id)
+    await job_manager.stop()
+    team_row = await sqlite_handler.select_team(team_id="big")
+    changes = await sqlite_handler.select_changes(since=0, limit=100)
+    await sqlite_handler.shutdown()
+
+    assert job["result"] == {"deleted": 1}
+    assert db_handler.deleted_member_chunks == [2, 2, 1, 0]
+    assert team_row is None
+    assert sorted(change[2] for change in changes if change[1] == "membership" and change[3] == "delete") == \
+        [f"big:user{index}" for index in range(5)]
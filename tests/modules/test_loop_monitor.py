@@ -0,0 +1,45 @@
+import asyncio
+import time
+import pytest
+
+from api.modules.loop_monitor import LoopLagMonitor, loop_lag_histogram
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def blocking_call(duration: float):
+    time.sleep(duration)
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_reported_with_its_stack():
+    monitor = LoopLagMonitor({"enabled": True, "interval": 0.01, "block_threshold": 0.05, "stack_limit": 30,
+                              "max_reports": 5})
+    observed_before = loop_lag_histogram.count()
+
+    monitor.start()
+    await asyncio.sleep(0.05)
+    blocking_call(0.2)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    status = monitor.status()
+    assert len(status["reports"]) == 1
+    assert status["reports"][0]["blocked_for"] >= 0.05
+    assert "blocking_call" in status["reports"][0]["stack"]
+    assert status["last_lag"] < 0.2
+    assert loop_lag_histogram.count() > observed_before
+
+
+@pytest.mark.asyncio
+async def test_disabled_monitor_does_not_start():
+    monitor = LoopLagMonitor({"enabled": False, "interval": 0.01, "block_threshold": 0.05, "stack_limit": 30,
+                              "max_reports": 5})
+
+    monitor.start()
+    await monitor.stop()
+
+    assert monitor.status()["reports"] == []
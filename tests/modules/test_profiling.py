@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+
+from httpx import AsyncClient
+from api.modules.config import CONFIG_ADMIN, CONFIG_PROFILING
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules import profiling
+from api.modules.profiling import StackSampler
+from api import app
+
+ADMIN_HEADERS = {"x-admin-token": "admin_token"}
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+@pytest.fixture
+def configure_profiling(monkeypatch, tmp_path):
+    monkeypatch.setitem(CONFIG_ADMIN, "token", "admin_token")
+    monkeypatch.setitem(CONFIG_PROFILING, "directory", str(tmp_path))
+    monkeypatch.setitem(app.app.dependency_overrides, app.database_dependency, MockDBHandler)
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_profiled_requests(configure_profiling, monkeypatch):
+    write_profile = profiling._write_profile
+    writer_threads = []
+
+    def recording_write_profile(*args):
+        writer_threads.append(threading.get_ident())
+        write_profile(*args)
+
+    monkeypatch.setattr(profiling, "_write_profile", recording_write_profile)
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        cpu_response = await ac.get("/users", headers={**ADMIN_HEADERS, "x-profile": "cpu"})
+        alloc_response = await ac.get("/users", headers={**ADMIN_HEADERS, "x-profile": "alloc"})
+        unauthorized_response = await ac.get("/users", headers={"x-admin-token": "wrong_token", "x-profile": "cpu"})
+        profiles = (await ac.get("/admin/profiles", headers=ADMIN_HEADERS)).json()
+        cpu_profile = await ac.get(f"/admin/profiles/{cpu_response.headers['x-profile-file']}", headers=ADMIN_HEADERS)
+        missing_profile = await ac.get("/admin/profiles/none_existing_profile", headers=ADMIN_HEADERS)
+
+    assert cpu_response.status_code == 200 and alloc_response.status_code == 200
+    assert cpu_response.headers["x-profile-file"].startswith("cpu-")
+    assert alloc_response.headers["x-profile-file"].startswith("alloc-")
+    assert "x-profile-file" not in unauthorized_response.headers
+    assert sorted(profiles) == sorted([cpu_response.headers["x-profile-file"], alloc_response.headers["x-profile-file"]])
+    assert cpu_profile.text.startswith("GET /users")
+    assert "Ordered by: cumulative time" in cpu_profile.text
+    assert missing_profile.status_code == 404
+    assert len(writer_threads) == 2 and threading.get_ident() not in writer_threads  # Written off the event loop
+
+
+def test_stack_sampler_writes_folded_stacks(tmp_path):
+    sampler = StackSampler({**CONFIG_PROFILING, "directory": str(tmp_path), "sampler_interval": 0.005})
+
+    def busy_function():
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            pass
+
+    sampler.start()
+    busy_function()
+    written_file = sampler.stop()
+
+    lines = (tmp_path / written_file).read_text().splitlines()
+    assert written_file.endswith(".folded")
+    assert any("busy_function" in line.rsplit(" ", 1)[0].split(";")[-1] for line in lines)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert sampler.stop() is None
@@ -0,0 +1,53 @@
+import json
+
+from fastapi import FastAPI
+from api import app
+from api.modules.config import CONFIG_STARTUP
+from api.modules.startup import measure_startup, use_prebuilt_openapi, write_openapi_document
+
+
+# Utility functions for tests --------------------------------------------------------------------------
+
+def create_app():
+    example_app = FastAPI(title="Example")
+
+    @example_app.get("/example")
+    async def example():
+        return {}
+
+    return example_app
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_prebuilt_openapi_document_is_up_to_date():
+    """
+    Fails when the routes changed without running python -m api.modules.startup build-openapi
+    """
+    with open(CONFIG_STARTUP["openapi_file"]) as document:
+        prebuilt = json.load(document)
+
+    assert prebuilt == json.loads(json.dumps(FastAPI.openapi(app.app)))
+
+
+def test_prebuilt_openapi_is_read_from_file(tmp_path):
+    openapi_file = str(tmp_path / "openapi.json")
+    write_openapi_document(create_app(), openapi_file)
+    with open(openapi_file) as document:
+        written = json.load(document)
+    served_app = create_app()
+    served_app.title = "Changed after the build"
+    use_prebuilt_openapi(served_app, openapi_file)
+    missing_file_app = create_app()
+    use_prebuilt_openapi(missing_file_app, str(tmp_path / "missing.json"))
+
+    assert "/example" in written["paths"]
+    assert served_app.openapi() == written
+    assert missing_file_app.openapi()["info"]["title"] == "Example"
+
+
+def test_startup_within_budget():
+    measures = measure_startup(optimized=True, runs=3)
+
+    assert measures["total_seconds"] < CONFIG_STARTUP["budget_seconds"]
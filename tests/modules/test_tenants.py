@@ -0,0 +1,29 @@
+import pytest
+
+from httpx import AsyncClient
+from api.modules.config import CONFIG_TENANTS
+from api import app
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+@pytest.mark.asyncio
+async def test_tenant_from_path_prefix_and_header(monkeypatch, tmp_path):
+    monkeypatch.setitem(CONFIG_TENANTS, "directory", str(tmp_path))
+    monkeypatch.delitem(app.app.dependency_overrides, app.database_dependency, raising=False)
+    new_team = {"id": "faketeam01", "name": "ACME", "description": "d"}
+
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        created_response = await ac.post("/tenants/acme/teams", json=new_team)
+        acme_response = await ac.get("/teams", headers={"x-tenant-id": "acme"})
+        globex_response = await ac.get("/tenants/globex/teams")
+        invalid_response = await ac.get("/teams", headers={"x-tenant-id": "not a tenant"})
+        mock_response = await ac.get("/tenants/acme/teams?db_choice=mock")
+    await app.app.state.tenant_router.shutdown()
+
+    assert created_response.status_code == 200
+    assert acme_response.json() == [new_team]
+    assert globex_response.json() == []
+    assert invalid_response.status_code == 400
+    assert mock_response.status_code == 400
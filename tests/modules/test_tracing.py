@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+
+from httpx import AsyncClient
+from api.modules.database.mock_database_handler import MockDBHandler
+from api.modules.tracing import Tracer, InMemoryExporter, JSONLinesExporter, parse_traceparent, tracer
+from api import app
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+# Actual tests -----------------------------------------------------------------------------------------
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(TRACEPARENT) == ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True)
+    assert parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00")[2] is False
+    assert parse_traceparent("00-00000000000000000000000000000000-b7ad6b7169203331-01") is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+def test_sampling_and_span_hierarchy():
+    exporter = InMemoryExporter()
+    local_tracer = Tracer(exporter, sample_rate=0.0)
+
+    with local_tracer.start_trace("unsampled") as root_span:
+        with local_tracer.span("child") as child_span:
+            assert root_span is None and child_span is None
+
+    with local_tracer.start_trace("continued", TRACEPARENT) as root_span:
+        with local_tracer.span("child", key="value"):
+            local_tracer.record("recorded", 1.0, 2.0)
+
+    spans = {span.name: span for span in exporter.spans}
+    assert list(spans) == ["recorded", "child", "continued"]
+    assert {span.trace_id for span in exporter.spans} == {"0af7651916cd43dd8448eb211c80319c"}
+    assert spans["continued"].parent_id == "b7ad6b7169203331"
+    assert spans["child"].parent_id == spans["continued"].span_id
+    assert spans["recorded"].parent_id == spans["child"].span_id
+    assert spans["child"].attributes == {"key": "value"}
+    assert spans["recorded"].to_dict()["duration"] == 1.0
+
+
+def test_json_lines_exporter(tmp_path):
+    path = tmp_path / "traces" / "traces.jsonl"
+    local_tracer = Tracer(JSONLinesExporter(str(path)), sample_rate=1.0)
+
+    for _ in range(2):
+        with local_tracer.start_trace("request"):
+            with local_tracer.span("child"):
+                pass
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["child", "request", "child", "request"]
+    assert lines[0]["parent_id"] == lines[1]["span_id"]
+
+
+@pytest.mark.asyncio
+async def test_json_lines_exporter_writes_off_the_event_loop(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JSONLinesExporter(str(path), flush_interval=0.01)
+    local_tracer = Tracer(exporter, sample_rate=1.0)
+
+    with local_tracer.start_trace("first"):
+        pass
+    written_during_request = path.exists()
+    await asyncio.sleep(0.1)
+    flushed_lines = path.read_text().splitlines()
+    with local_tracer.start_trace("second"):
+        pass
+    await exporter.close()
+
+    assert not written_during_request
+    assert [json.loads(line)["name"] for line in flushed_lines] == ["first"]
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_traced_request(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setitem(app.app.dependency_overrides, app.database_dependency, MockDBHandler)
+
+    async with AsyncClient(app=app.app, base_url="http://localhost:8000") as ac:
+        response = await ac.get("/users/mock_id", headers={"traceparent": TRACEPARENT})
+        unsampled_response = await ac.get("/users/mock_id")
+
+    spans = {span.name: span for span in exporter.spans}
+    root_span = spans["GET /users/mock_id"]
+    assert response.status_code == 200
+    assert response.headers["traceparent"] == f"00-{root_span.trace_id}-{root_span.span_id}-01"
+    assert "traceparent" not in unsampled_response.headers
+    assert set(spans) == {"GET /users/mock_id", "request.validation", "endpoint", "response.serialization"}
+    assert root_span.attributes["route"] == "/users/{user_id}"
+    assert root_span.attributes["status_code"] == 200
+    assert all(span.parent_id == root_span.span_id for span in exporter.spans if span is not root_span)